@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, InstructorVehicle, InstructorProfile, StudentProfile
+from .models import User, InstructorVehicle, InstructorProfile, StudentProfile, AccountDeletion
 
 
 @admin.register(User)
@@ -71,3 +71,12 @@ class InstructorVehicleAdmin(admin.ModelAdmin):
     list_display = ['instructor', 'plate', 'make', 'model', 'year', 'dual_control', 'adapted_pcd']
     search_fields = ['plate', 'renavam', 'make', 'model', 'instructor__full_name']
     list_filter = ['dual_control', 'adapted_pcd', 'year']
+
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ['username', 'status', 'step', 'deleted_lessons', 'total_lessons', 'attempts', 'requested_at', 'finished_at']
+    list_filter = ['status', 'step']
+    search_fields = ['username']
+    readonly_fields = [field.name for field in AccountDeletion._meta.fields]
@@ -1,12 +1,16 @@
-from django.http import JsonResponse
+from core.renderers import JsonResponse
 from django.contrib.auth import login, logout, authenticate
 from django.views.decorators.csrf import csrf_exempt
-from .models import User, InstructorProfile, EmployeeProfile
+from .models import User, InstructorProfile, EmployeeProfile, placeholder_document
+from .bloom import known_documents
+from .ratelimit import ratelimit, client_ip, account_email
+from .usernames import create_user_with_unique_username
 from datetime import date
 import json
 
 
 @csrf_exempt
+@ratelimit('register', rate='10/h', key=client_ip, methods=('POST',))
 def register_api_instrutor(request):
     """API para cadastro de instrutor via JSON ou FormData"""
     if request.method != 'POST':
@@ -36,7 +40,7 @@ def register_api_instrutor(request):
     
     if not email:
         errors['email'] = 'Email é obrigatório'
-    elif User.objects.filter(email=email).exists():
+    elif User.objects.filter_by_email(email).exists():
         errors['email'] = 'Este email já está cadastrado'
     
     if not password:
@@ -70,15 +74,9 @@ def register_api_instrutor(request):
     
     # Cria o usuário
     try:
-        # Gera username único
-        username = email.split('@')[0]
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{email.split('@')[0]}{counter}"
-            counter += 1
-        
-        user = User.objects.create_user(
-            username=username,
+        # Gera username único a partir do prefixo do email
+        user = create_user_with_unique_username(
+            email.split('@')[0],
             email=email,
             password=password,
             full_name=full_name,
@@ -91,8 +89,8 @@ def register_api_instrutor(request):
             phone=phone,
             status='pendente',
             # Dados mínimos obrigatórios
-            cpf=f'{user.id:011d}',  # CPF único baseado no ID do usuário
-            rg=f'{user.id:011d}',  # RG único baseado no ID
+            cpf=placeholder_document(user.id),  # CPF provisório baseado no ID do usuário
+            rg=placeholder_document(user.id),  # RG provisório baseado no ID
             cnh=f'{user.id:011d}',  # CNH única baseada no ID
             birth_date=date(1990, 1, 1),  # Data de nascimento mínima
             cnh_emission_date=date(2010, 1, 1),  # Data de emissão mínima
@@ -114,6 +112,7 @@ def register_api_instrutor(request):
 
 
 @csrf_exempt
+@ratelimit('register', rate='10/h', key=client_ip, methods=('POST',))
 def register_api_funcionario(request):
     """API para cadastro de funcionário via JSON ou FormData"""
     if request.method != 'POST':
@@ -143,7 +142,7 @@ def register_api_funcionario(request):
     
     if not email:
         errors['email'] = 'Email é obrigatório'
-    elif User.objects.filter(email=email).exists():
+    elif User.objects.filter_by_email(email).exists():
         errors['email'] = 'Este email já está cadastrado'
     
     if not password:
@@ -177,15 +176,9 @@ def register_api_funcionario(request):
     
     # Cria o usuário
     try:
-        # Gera username único
-        username = email.split('@')[0]
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{email.split('@')[0]}{counter}"
-            counter += 1
-        
-        user = User.objects.create_user(
-            username=username,
+        # Gera username único a partir do prefixo do email
+        user = create_user_with_unique_username(
+            email.split('@')[0],
             email=email,
             password=password,
             full_name=full_name,
@@ -210,6 +203,8 @@ def register_api_funcionario(request):
 
 
 @csrf_exempt
+@ratelimit('login-ip', rate='20/m', key=client_ip, methods=('POST',))
+@ratelimit('login-account', rate='5/m', key=account_email, methods=('POST',))
 def login_api(request):
     """API para login via JSON"""
     if request.method != 'POST':
@@ -229,8 +224,8 @@ def login_api(request):
         }, status=400)
     
     try:
-        user = User.objects.get(email=email)
-        user_auth = authenticate(username=user.username, password=password)
+        # EmailBackend busca e autentica pelo email em uma única consulta
+        user_auth = authenticate(request, email=email, password=password)
         
         if user_auth:
             login(request, user_auth)
@@ -243,10 +238,6 @@ def login_api(request):
                 'error': 'Email ou senha inválidos'
             }, status=401)
     
-    except User.DoesNotExist:
-        return JsonResponse({
-            'error': 'Email ou senha inválidos'
-        }, status=401)
     except Exception as e:
         return JsonResponse({
             'error': f'Erro ao fazer login: {str(e)}'
@@ -268,6 +259,7 @@ def me_api(request):
 
 
 @csrf_exempt
+@ratelimit('register', rate='10/h', key=client_ip, methods=('POST',))
 def register_api_aluno(request):
     """API para cadastro de aluno via JSON ou FormData"""
     if request.method != 'POST':
@@ -297,7 +289,7 @@ def register_api_aluno(request):
     
     if not email:
         errors['email'] = 'Email é obrigatório'
-    elif User.objects.filter(email=email).exists():
+    elif User.objects.filter_by_email(email).exists():
         errors['email'] = 'Este email já está cadastrado'
     
     if not password:
@@ -331,15 +323,9 @@ def register_api_aluno(request):
     
     # Cria o usuário
     try:
-        # Gera username único
-        username = email.split('@')[0]
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{email.split('@')[0]}{counter}"
-            counter += 1
-        
-        user = User.objects.create_user(
-            username=username,
+        # Gera username único a partir do prefixo do email
+        user = create_user_with_unique_username(
+            email.split('@')[0],
             email=email,
             password=password,
             full_name=full_name,
@@ -352,8 +338,8 @@ def register_api_aluno(request):
             user=user,
             phone=phone,
             # Dados mínimos obrigatórios
-            cpf=f'{user.id:011d}',  # CPF único baseado no ID do usuário
-            rg=f'{user.id:011d}',  # RG único baseado no ID
+            cpf=placeholder_document(user.id),  # CPF provisório baseado no ID do usuário
+            rg=placeholder_document(user.id),  # RG provisório baseado no ID
             cep='00000000',  # Placeholder
             address='Não informado',
             address_number='0',
@@ -382,7 +368,7 @@ def logout_api(request):
 
 
 @csrf_exempt
-@csrf_exempt
+@ratelimit('document-check', rate='60/m', key=client_ip)
 def check_cpf_api(request):
     """API para verificar se CPF já está cadastrado"""
     if request.method != 'GET':
@@ -393,23 +379,8 @@ def check_cpf_api(request):
     if not cpf:
         return JsonResponse({'error': 'CPF não fornecido'}, status=400)
     
-    # Remove caracteres não numéricos
-    cpf_numeros = ''.join(filter(str.isdigit, cpf))
-    
-    # Formata para o padrão 000.000.000-00
-    if len(cpf_numeros) == 11:
-        cpf_formatado = f"{cpf_numeros[:3]}.{cpf_numeros[3:6]}.{cpf_numeros[6:9]}-{cpf_numeros[9:]}"
-    else:
-        cpf_formatado = cpf
-    
-    # Verifica se existe em algum perfil
-    from .models import StudentProfile, InstructorProfile, EmployeeProfile
-    
-    exists = (
-        StudentProfile.objects.filter(cpf=cpf_formatado).exists() or
-        InstructorProfile.objects.filter(cpf=cpf_formatado).exists() or
-        EmployeeProfile.objects.filter(cpf=cpf_formatado).exists()
-    )
+    # Filtro de Bloom descarta documentos inéditos sem consultar o banco
+    exists = known_documents.is_taken('cpf', cpf)
     
     return JsonResponse({
         'exists': exists,
@@ -418,6 +389,7 @@ def check_cpf_api(request):
 
 
 @csrf_exempt
+@ratelimit('document-check', rate='60/m', key=client_ip)
 def check_rg_api(request):
     """API para verificar se RG já está cadastrado"""
     if request.method != 'GET':
@@ -428,18 +400,8 @@ def check_rg_api(request):
     if not rg:
         return JsonResponse({'error': 'RG não fornecido'}, status=400)
     
-    # Remove caracteres indesejados, mantendo apenas letras, números, pontos e hífens
-    import re
-    rg_limpo = re.sub(r'[^A-Za-z0-9.-]', '', rg)
-    
-    # Verifica se existe em algum perfil
-    from .models import StudentProfile, InstructorProfile, EmployeeProfile
-    
-    exists = (
-        StudentProfile.objects.filter(rg=rg_limpo).exists() or
-        InstructorProfile.objects.filter(rg=rg_limpo).exists() or
-        EmployeeProfile.objects.filter(rg=rg_limpo).exists()
-    )
+    # Filtro de Bloom descarta documentos inéditos sem consultar o banco
+    exists = known_documents.is_taken('rg', rg)
     
     return JsonResponse({
         'exists': exists,
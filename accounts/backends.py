@@ -0,0 +1,22 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class EmailBackend(ModelBackend):
+    """Autentica pelo email (case-insensitive) com uma única consulta indexada"""
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        email = email or username
+        if not email or password is None:
+            return None
+        try:
+            user = User.objects.get_by_email(email)
+        except User.DoesNotExist:
+            # Executa o hasher mesmo sem usuário para não revelar, pelo tempo
+            # de resposta, se o email existe (mesmo cuidado do ModelBackend)
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,112 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .models import IdentityDocument
+
+
+class BloomFilter:
+    """Filtro de Bloom simples em memória (bytearray + hashing duplo)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownDocuments:
+    """Pré-filtro dos CPFs/RGs cadastrados para as verificações ao vivo.
+
+    Uma resposta negativa do filtro é definitiva e dispensa o banco; uma
+    positiva pode ser falso positivo e é confirmada no IdentityDocument.
+    O filtro é construído no primeiro uso de cada processo, recebe os
+    documentos salvos por este processo e é reconstruído periodicamente
+    para incorporar cadastros feitos por outros workers. A unicidade
+    continua garantida pelo índice único do banco.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._built_at = 0.0
+        self._added_during_build = None
+
+    @staticmethod
+    def _key(kind, number):
+        return f'{kind}:{number}'
+
+    def _is_stale(self):
+        max_age = getattr(settings, 'IDENTITY_BLOOM_REBUILD_SECONDS', 300)
+        return self._filter is None or time.monotonic() - self._built_at > max_age
+
+    def rebuild(self):
+        """Reconstrói o filtro a partir do registro de documentos"""
+        with self._lock:
+            self._build()
+
+    def _rebuild_if_stale(self):
+        # Verifica de novo com o lock: requests que esperaram enquanto outro
+        # reconstruía usam o filtro novo em vez de varrer a tabela outra vez
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._build()
+
+    def _build(self):
+        self._added_during_build = []
+        try:
+            capacity = max(10000, IdentityDocument.objects.count() * 2)
+            bloom = BloomFilter(capacity)
+            rows = IdentityDocument.objects.values_list('kind', 'number').iterator(chunk_size=2000)
+            for kind, number in rows:
+                bloom.add(self._key(kind, number))
+            self._filter = bloom
+            self._built_at = time.monotonic()
+            # Documentos salvos por este processo durante a varredura podem ter ficado de fora dela
+            for key in self._added_during_build:
+                bloom.add(key)
+        finally:
+            self._added_during_build = None
+
+    def add(self, kind, number):
+        if not number:
+            return
+        key = self._key(kind, number)
+        if self._added_during_build is not None:
+            self._added_during_build.append(key)
+        if self._filter is not None:
+            self._filter.add(key)
+
+    def might_exist(self, kind, value):
+        """False se o documento certamente não está cadastrado"""
+        number = IdentityDocument.NORMALIZERS[kind](value)
+        if not number:
+            return False
+        self._rebuild_if_stale()
+        return self._key(kind, number) in self._filter
+
+    def is_taken(self, kind, value):
+        """Verificação com pré-filtro: só consulta o banco quando o filtro não descarta"""
+        if not self.might_exist(kind, value):
+            return False
+        return IdentityDocument.is_taken(kind, value)
+
+
+known_documents = KnownDocuments()
@@ -0,0 +1,298 @@
+"""Utilitários para importação em lote de cadastros.
+
+Os arquivos são lidos em streaming (CSV ou JSONL) e processados em blocos:
+cada bloco é validado de uma vez com expressões pré-compiladas e conjuntos,
+e as duplicidades contra o banco são resolvidas com uma consulta por bloco.
+"""
+import csv
+import json
+import os
+import re
+from datetime import date, datetime
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db.models import CharField, Value
+from django.db.models.functions import Lower
+
+from .models import User, IdentityDocument, InstructorProfile, normalize_cpf, normalize_plate, normalize_rg, validar_cpf
+from .usernames import next_free_usernames
+
+
+CEP_RE = re.compile(r'^\d{5}-?\d{3}$')
+RG_CLEAN_RE = re.compile(r'[^A-Za-z0-9.-]')
+NON_DIGITS_RE = re.compile(r'\D')
+PLATE_RE = re.compile(r'^[A-Z]{3}-?(?:\d{4}|[0-9][A-Z][0-9]{2})$')
+RENAVAM_RE = re.compile(r'^\d{11}$')
+TRUE_VALUES = {'1', 'true', 'sim', 's', 'yes', 'y', 'on'}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+def read_rows(path):
+    """Gera (número da linha, dict) de um arquivo CSV ou JSONL sem carregá-lo inteiro"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = {'__raw__': line.rstrip('\n'), '__error__': 'JSON inválido'}
+                yield line_number, row
+        else:
+            # Linha 1 é o cabeçalho
+            for line_number, row in enumerate(csv.DictReader(handle), start=2):
+                yield line_number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def clean_text(row, field):
+    value = row.get(field)
+    return str(value).strip() if value is not None else ''
+
+
+def parse_date(value):
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def age_on(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def validate_person(row, errors):
+    """Valida os campos pessoais comuns e devolve os valores normalizados"""
+    data = {
+        'full_name': clean_text(row, 'full_name'),
+        'email': clean_text(row, 'email'),
+        'phone': clean_text(row, 'phone'),
+        'address': clean_text(row, 'address'),
+        'address_number': clean_text(row, 'address_number'),
+        'address_complement': clean_text(row, 'address_complement'),
+    }
+
+    if len(data['full_name']) < 2:
+        errors['full_name'] = 'Nome completo é obrigatório'
+    try:
+        validate_email(data['email'])
+    except ValidationError:
+        errors['email'] = 'Email inválido'
+    if len(NON_DIGITS_RE.sub('', data['phone'])) < 10:
+        errors['phone'] = 'Telefone inválido'
+    if not data['address']:
+        errors['address'] = 'Endereço é obrigatório'
+    if not data['address_number']:
+        errors['address_number'] = 'Número é obrigatório'
+
+    cpf_digits = normalize_cpf(clean_text(row, 'cpf'))
+    if not validar_cpf(cpf_digits):
+        errors['cpf'] = 'CPF inválido'
+    data['cpf'] = f"{cpf_digits[:3]}.{cpf_digits[3:6]}.{cpf_digits[6:9]}-{cpf_digits[9:]}"
+    data['cpf_key'] = cpf_digits
+
+    rg = RG_CLEAN_RE.sub('', clean_text(row, 'rg'))
+    if not 8 <= len(rg) <= 20:
+        errors['rg'] = 'RG deve ter entre 8 e 20 caracteres válidos'
+    data['rg'] = rg
+    data['rg_key'] = normalize_rg(rg)
+
+    cep = clean_text(row, 'cep')
+    if not CEP_RE.match(cep):
+        errors['cep'] = 'CEP deve conter exatamente 8 dígitos'
+    cep_digits = NON_DIGITS_RE.sub('', cep)
+    data['cep'] = f"{cep_digits[:5]}-{cep_digits[5:]}"
+
+    birth_date = parse_date(clean_text(row, 'birth_date'))
+    if birth_date is None:
+        errors['birth_date'] = 'Data de nascimento inválida (use AAAA-MM-DD ou DD/MM/AAAA)'
+    elif birth_date > date.today():
+        errors['birth_date'] = 'Data de nascimento não pode ser futura'
+    data['birth_date'] = birth_date
+    return data
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def validate_vehicle(row, errors):
+    """Valida e normaliza um veículo (mesmas regras de InstructorVehicle.clean)"""
+    plate = clean_text(row, 'plate').upper()
+    if not PLATE_RE.match(plate):
+        errors['plate'] = 'Placa inválida. Use formatos AAA-1234 ou ABC1D23.'
+    renavam = NON_DIGITS_RE.sub('', clean_text(row, 'renavam'))
+    if not RENAVAM_RE.match(renavam):
+        errors['renavam'] = 'RENAVAM deve conter exatamente 11 dígitos.'
+
+    today = date.today()
+    last_license = clean_text(row, 'last_license_exercise')
+    last_license_date = parse_date(last_license) if last_license else None
+    if last_license and last_license_date is None:
+        errors['last_license_exercise'] = 'Data do último licenciamento inválida.'
+    elif last_license_date and last_license_date > today:
+        errors['last_license_exercise'] = 'A data do último licenciamento não pode ser futura.'
+
+    year = clean_text(row, 'year')
+    year = int(year) if year.isdigit() else 0
+    if year < 1960 or year > today.year + 1:
+        errors['year'] = f"Ano deve estar entre 1960 e {today.year + 1}."
+
+    data = {
+        'plate': normalize_plate(plate),
+        'renavam': renavam,
+        'last_license_exercise': last_license_date,
+        'model': clean_text(row, 'model'),
+        'make': clean_text(row, 'make'),
+        'color': clean_text(row, 'color'),
+        'year': year,
+        'dual_control': parse_bool(row.get('dual_control')),
+        'adapted_pcd': parse_bool(row.get('adapted_pcd')),
+    }
+    for field, message in (('model', 'Informe o modelo do veículo.'),
+                           ('make', 'Informe a marca do veículo.'),
+                           ('color', 'Informe a cor do veículo.')):
+        if not data[field]:
+            errors[field] = message
+    return data
+
+
+def mark_duplicates(valid, seen, errors_by_line):
+    """Rejeita CPF/RG/email (e credencial) repetidos no próprio arquivo (conjuntos acumulados)"""
+    kept = []
+    for line_number, data in valid:
+        keys = {
+            'cpf': ('cpf', data['cpf_key']),
+            'rg': ('rg', data['rg_key']),
+            'email': ('email', data['email'].lower()),
+        }
+        if data.get('credential'):
+            keys['credential'] = ('credential', data['credential'])
+        duplicated = {field: 'Duplicado no arquivo' for field, key in keys.items() if key in seen}
+        if duplicated:
+            errors_by_line[line_number] = duplicated
+            continue
+        seen.update(keys.values())
+        kept.append((line_number, data))
+    return kept
+
+
+def existing_identities(cpfs, rgs, emails, credentials=None):
+    """Retorna {(tipo, valor)} já cadastrados, numa única consulta (UNION)"""
+    documents = IdentityDocument.objects.filter(kind='cpf', number__in=cpfs).values_list('kind', 'number')
+    others = [
+        IdentityDocument.objects.filter(kind='rg', number__in=rgs).values_list('kind', 'number'),
+        User.objects.annotate(
+            kind=Value('email', output_field=CharField()),
+            email_lower=Lower('email'),
+        ).filter(email_lower__in=emails).order_by().values_list('kind', 'email_lower'),
+    ]
+    if credentials:
+        others.append(
+            InstructorProfile.objects.annotate(
+                kind=Value('credential', output_field=CharField()),
+            ).filter(credential__in=credentials).order_by().values_list('kind', 'credential')
+        )
+    return set(documents.union(*others, all=True))
+
+
+def reject_existing(valid, errors_by_line):
+    """Rejeita linhas cujo CPF/RG/email (e credencial, se houver) já existe no banco"""
+    if not valid:
+        return valid
+    taken = existing_identities(
+        [data['cpf_key'] for _, data in valid],
+        [data['rg_key'] for _, data in valid],
+        [data['email'].lower() for _, data in valid],
+        [data['credential'] for _, data in valid if data.get('credential')],
+    )
+    kept = []
+    for line_number, data in valid:
+        errors = {}
+        if ('cpf', data['cpf_key']) in taken:
+            errors['cpf'] = 'CPF já cadastrado'
+        if ('rg', data['rg_key']) in taken:
+            errors['rg'] = 'RG já cadastrado'
+        if ('email', data['email'].lower()) in taken:
+            errors['email'] = 'Email já cadastrado'
+        if data.get('credential') and ('credential', data['credential']) in taken:
+            errors['credential'] = 'Credencial já cadastrada'
+        if errors:
+            errors_by_line[line_number] = errors
+        else:
+            kept.append((line_number, data))
+    return kept
+
+
+def allocate_usernames(valid):
+    """Usernames a partir do email, com o mesmo sufixo numérico dos cadastros pela API"""
+    usernames = next_free_usernames(data['email'].split('@')[0] for _, data in valid)
+    return {line_number: username for (line_number, _), username in zip(valid, usernames)}
+
+
+def identity_documents_for(users_with_data):
+    return [
+        IdentityDocument(user=user, kind=kind, number=data[f'{kind}_key'])
+        for user, data in users_with_data
+        for kind in ('cpf', 'rg')
+    ]
+
+
+class RejectWriter:
+    """Grava as linhas rejeitadas no mesmo formato do arquivo de entrada, com a coluna `errors`"""
+
+    def __init__(self, path, fieldnames=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.count = 0
+        self._handle = None
+        self._writer = None
+
+    @staticmethod
+    def default_path(source):
+        root, ext = os.path.splitext(source)
+        return f'{root}.rejects{ext or ".csv"}'
+
+    def _is_jsonl(self):
+        return self.path.lower().endswith(('.jsonl', '.ndjson'))
+
+    def write(self, line_number, row, errors):
+        if self._handle is None:
+            self._handle = open(self.path, 'w', newline='', encoding='utf-8')
+        self.count += 1
+        message = '; '.join(f'{field}: {msg}' for field, msg in errors.items())
+        if self._is_jsonl():
+            self._handle.write(json.dumps({**row, 'line': line_number, 'errors': errors}, ensure_ascii=False, default=str) + '\n')
+            return
+        if self._writer is None:
+            fieldnames = list(self.fieldnames or row.keys()) + ['line', 'errors']
+            self._writer = csv.DictWriter(self._handle, fieldnames=fieldnames, extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow({**row, 'line': line_number, 'errors': message})
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
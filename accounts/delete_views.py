@@ -3,12 +3,16 @@ from django.contrib.auth import logout
 from django.http import JsonResponse
 from django.urls import reverse
 
+from .deletion import schedule_account_deletion, status_token, job_from_token
+
 
 @login_required
 def delete_account_view(request):
     """Permite exclusão de cadastro com dupla confirmação.
     Requer: senha atual válida, texto de confirmação 'EXCLUIR' e ciência de irreversibilidade.
     Retorna JSON com instruções de redirecionamento.
+    A conta é desativada na hora e os dados são removidos em segundo plano;
+    `status_url` permite acompanhar o progresso.
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Método não permitido.'}, status=405)
@@ -29,21 +33,40 @@ def delete_account_view(request):
     if errors:
         return JsonResponse({'success': False, 'message': 'Validação falhou.', 'errors': errors}, status=400)
 
-    # Encerrar sessão antes de excluir para evitar estado inconsistente
+    # Desativa a conta e agenda a exclusão (aulas, veículos, arquivos) em lotes
+    try:
+        job = schedule_account_deletion(user)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Erro ao excluir: {str(e)}'}, status=500)
+
+    # Encerrar sessão; a conta já está inativa e não pode mais entrar
     try:
         logout(request)
     except Exception:
-        # Mesmo se falhar, continuamos com exclusão do usuário
+        # Mesmo se falhar, a exclusão já foi agendada
         pass
 
-    # Excluir usuário (perfis relacionados serão removidos via CASCADE)
-    try:
-        user.delete()
-    except Exception as e:
-        return JsonResponse({'success': False, 'message': f'Erro ao excluir: {str(e)}'}, status=500)
-
     return JsonResponse({
         'success': True,
         'message': 'Cadastro excluído com sucesso. Esta ação é irreversível.',
-        'redirect_url': reverse('login')
+        'redirect_url': reverse('login'),
+        'status_url': reverse('delete_account_status', args=[status_token(job)]),
+    })
+
+
+def delete_account_status_view(request, token):
+    """Progresso da exclusão em segundo plano (acesso pelo token assinado)"""
+    job = job_from_token(token)
+    if job is None:
+        return JsonResponse({'success': False, 'message': 'Exclusão não encontrada.'}, status=404)
+    return JsonResponse({
+        'success': True,
+        'status': job.status,
+        'step': job.step,
+        'percent': job.percent,
+        'total_lessons': job.total_lessons,
+        'deleted_lessons': job.deleted_lessons,
+        'deleted_vehicles': job.deleted_vehicles,
+        'deleted_files': job.deleted_files,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
     })
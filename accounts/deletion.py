@@ -0,0 +1,186 @@
+"""Exclusão de contas em segundo plano.
+
+`schedule_account_deletion` desativa a conta e registra um AccountDeletion
+na mesma transação da requisição. O trabalho pesado roda depois, em lotes
+curtos (cada um na sua transação, para não segurar o lock de escrita do
+SQLite): aulas, veículos, arquivos e por fim o usuário.
+
+Uma thread é disparada após o commit; se o processo cair no meio, o comando
+`process_account_deletions` (agendado via cron) retoma os jobs pendentes,
+com falha ou abandonados, garantindo a conclusão. Cada etapa é idempotente.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import User, AccountDeletion, InstructorVehicle
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'accounts.deletion'
+MEDIA_FIELDS = ('photo', 'cnh_document', 'support_document_1', 'support_document_2')
+
+
+def batch_size():
+    return getattr(settings, 'ACCOUNT_DELETION_BATCH_SIZE', 500)
+
+
+def status_token(job):
+    """Token assinado para consultar o progresso sem sessão (o usuário já saiu)"""
+    return signing.dumps(job.pk, salt=TOKEN_SALT)
+
+
+def job_from_token(token):
+    try:
+        pk = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    return AccountDeletion.objects.filter(pk=pk).first()
+
+
+def schedule_account_deletion(user):
+    """Desativa a conta imediatamente e agenda a exclusão dos dados"""
+    from lessons.models import Lesson
+
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False, updated_at=timezone.now())
+        job, _ = AccountDeletion.objects.get_or_create(
+            user_pk=user.pk,
+            defaults={
+                'username': user.username,
+                'total_lessons': Lesson.objects.filter(Q(student=user) | Q(instructor=user)).count(),
+            },
+        )
+        if getattr(settings, 'ACCOUNT_DELETION_RUN_IN_THREAD', True):
+            transaction.on_commit(lambda: start_in_background(job.pk))
+    return job
+
+
+def start_in_background(job_pk):
+    thread = threading.Thread(
+        target=_run_in_thread, args=(job_pk,), name=f'account-deletion-{job_pk}', daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _run_in_thread(job_pk):
+    try:
+        run_account_deletion(job_pk)
+    finally:
+        # A thread abre conexões próprias; fecha para não vazá-las
+        connections.close_all()
+
+
+def resumable_jobs():
+    """Jobs que precisam ser (re)processados: pendentes, com falha ou abandonados"""
+    stale = timezone.now() - timedelta(seconds=getattr(settings, 'ACCOUNT_DELETION_STALE_SECONDS', 600))
+    return AccountDeletion.objects.filter(
+        Q(status__in=('pending', 'failed')) | Q(status='running', updated_at__lt=stale)
+    )
+
+
+def claim(job_pk):
+    """Marca o job como em andamento se ninguém mais estiver processando (UPDATE atômico)"""
+    return resumable_jobs().filter(pk=job_pk).update(
+        status='running', attempts=F('attempts') + 1, updated_at=timezone.now(),
+    ) == 1
+
+
+def run_account_deletion(job_pk, size=None):
+    """Executa (ou retoma) a exclusão até o fim; retorna True se concluiu"""
+    if not claim(job_pk):
+        return False
+    job = AccountDeletion.objects.get(pk=job_pk)
+    size = size or batch_size()
+    try:
+        while job.step != 'finished':
+            STEPS[job.step](job, size)
+    except Exception as e:
+        logger.exception('Falha na exclusão da conta %s (job %s)', job.username, job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        return False
+
+    job.status = 'done'
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    logger.info('Conta %s excluída (%s aulas, %s veículos, %s arquivos)',
+                job.username, job.deleted_lessons, job.deleted_vehicles, job.deleted_files)
+    return True
+
+
+def _advance(job, step):
+    job.step = step
+    job.save(update_fields=['step', 'updated_at'])
+
+
+def _delete_lessons(job, size):
+    from lessons.models import Lesson, LessonEvent
+
+    lessons = list(
+        Lesson.objects.filter(Q(student_id=job.user_pk) | Q(instructor_id=job.user_pk)).order_by()[:size]
+    )
+    if not lessons:
+        return _advance(job, 'vehicles')
+    with transaction.atomic():
+        # Tombstones para a outra parte de cada aula (sync incremental e SSE)
+        LessonEvent.publish_many(lessons, 'lesson.deleted', exclude_user_id=job.user_pk)
+        Lesson.objects.filter(pk__in=[lesson.pk for lesson in lessons]).delete()
+        job.deleted_lessons += len(lessons)
+        job.save(update_fields=['deleted_lessons', 'updated_at'])
+
+
+def _delete_vehicles(job, size):
+    ids = list(
+        InstructorVehicle.objects.filter(instructor__user_id=job.user_pk)
+        .order_by().values_list('pk', flat=True)[:size]
+    )
+    if not ids:
+        return _advance(job, 'media')
+    with transaction.atomic():
+        InstructorVehicle.objects.filter(pk__in=ids).delete()
+        job.deleted_vehicles += len(ids)
+        job.save(update_fields=['deleted_vehicles', 'updated_at'])
+
+
+def _delete_media(job, size):
+    user = User.objects.filter(pk=job.user_pk).first()
+    profile = user.get_profile() if user else None
+    deleted = 0
+    if profile is not None:
+        for field_name in MEDIA_FIELDS:
+            file = getattr(profile, field_name, None)
+            # Apagar arquivo inexistente não é erro: a etapa pode ser repetida
+            if file and file.name:
+                file.storage.delete(file.name)
+                deleted += 1
+    job.deleted_files = deleted
+    job.step = 'account'
+    job.save(update_fields=['deleted_files', 'step', 'updated_at'])
+
+
+def _delete_account(job, size):
+    # Sem aulas e veículos, o CASCADE restante (perfil, documentos) é pequeno
+    with transaction.atomic():
+        User.objects.filter(pk=job.user_pk).delete()
+        job.step = 'finished'
+        job.save(update_fields=['step', 'updated_at'])
+
+
+STEPS = {
+    'lessons': _delete_lessons,
+    'vehicles': _delete_vehicles,
+    'media': _delete_media,
+    'account': _delete_account,
+}
+
@@ -3,8 +3,16 @@ from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
 import json
+import logging
 import re
-from .models import User, StudentProfile, InstructorProfile, EmployeeProfile, InstructorVehicle
+from .bulk_import import validate_vehicle
+from .models import (
+    User, StudentProfile, InstructorProfile, EmployeeProfile, InstructorVehicle, IdentityDocument,
+    normalize_plate, validar_cpf,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class BaseRegistrationForm(UserCreationForm):
@@ -106,7 +114,7 @@ class BaseRegistrationForm(UserCreationForm):
     def clean_email(self):
         """Valida que o email é único"""
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exists():
+        if email and User.objects.filter_by_email(email).exists():
             raise ValidationError('Este email já está cadastrado')
         return email
     
@@ -129,9 +137,7 @@ class BaseRegistrationForm(UserCreationForm):
         cpf_formatado = f"{cpf_numeros[:3]}.{cpf_numeros[3:6]}.{cpf_numeros[6:9]}-{cpf_numeros[9:]}"
         
         # Verifica se já existe no banco de dados
-        if (StudentProfile.objects.filter(cpf=cpf_formatado).exists() or
-            InstructorProfile.objects.filter(cpf=cpf_formatado).exists() or
-            EmployeeProfile.objects.filter(cpf=cpf_formatado).exists()):
+        if IdentityDocument.is_taken('cpf', cpf_numeros):
             raise ValidationError('Este CPF já está cadastrado no sistema')
         
         return cpf_formatado
@@ -151,9 +157,7 @@ class BaseRegistrationForm(UserCreationForm):
             raise ValidationError('RG deve ter entre 8 e 20 caracteres válidos')
         
         # Verifica se já existe no banco de dados
-        if (StudentProfile.objects.filter(rg=rg_limpo).exists() or
-            InstructorProfile.objects.filter(rg=rg_limpo).exists() or
-            EmployeeProfile.objects.filter(rg=rg_limpo).exists()):
+        if IdentityDocument.is_taken('rg', rg_limpo):
             raise ValidationError('Este RG já está cadastrado no sistema')
         
         return rg_limpo
@@ -203,47 +207,8 @@ class BaseRegistrationForm(UserCreationForm):
         
         return birth_date
     
-    @staticmethod
-    def validar_cpf(cpf):
-        """Valida o CPF usando o algoritmo oficial"""
-        # Remove caracteres não numéricos
-        cpf = ''.join(filter(str.isdigit, cpf))
-        
-        # Verifica se tem 11 dígitos
-        if len(cpf) != 11:
-            return False
-        
-        # Verifica se é uma sequência de números iguais
-        if cpf == cpf[0] * len(cpf):
-            return False
-        
-        # Calcula o primeiro dígito verificador
-        soma = 0
-        peso = 10
-        for i in range(9):
-            soma += int(cpf[i]) * peso
-            peso -= 1
-        
-        resto = soma % 11
-        digito1 = 0 if resto < 2 else 11 - resto
-        
-        if digito1 != int(cpf[9]):
-            return False
-        
-        # Calcula o segundo dígito verificador
-        soma = 0
-        peso = 11
-        for i in range(10):
-            soma += int(cpf[i]) * peso
-            peso -= 1
-        
-        resto = soma % 11
-        digito2 = 0 if resto < 2 else 11 - resto
-        
-        if digito2 != int(cpf[10]):
-            return False
-        
-        return True
+    # Algoritmo oficial em models.validar_cpf (também usado pela importação em lote)
+    validar_cpf = staticmethod(validar_cpf)
 
 
 class StudentRegistrationForm(BaseRegistrationForm):
@@ -616,22 +581,15 @@ class InstructorRegistrationForm(BaseRegistrationForm):
         return document
     
     def save(self, commit=True):
-        print("\n=== DEBUG InstructorRegistrationForm.save() ===")
         user = super().save(commit=False)
         user.role = 'instrutor'
-        print(f"Usuário preparado: {user.username}")
         
         if commit:
             try:
-                print("Salvando usuário...")
                 user.save()
-                print(f"Usuário salvo com ID: {user.pk}")
                 
                 # Cria o perfil do instrutor
-                print("Criando perfil do instrutor...")
-                print(f"Dados: full_name={self.cleaned_data.get('full_name')}, cpf={self.cleaned_data.get('cpf')}")
-                
-                profile = InstructorProfile.objects.create(
+                profile = InstructorProfile(
                     user=user,
                     full_name=self.cleaned_data['full_name'],
                     email=self.cleaned_data['email'],
@@ -659,18 +617,12 @@ class InstructorRegistrationForm(BaseRegistrationForm):
                     total_students=0,
                     total_lessons=0
                 )
-                print(f"Perfil criado com ID: {profile.pk}")
-
                 # Mapeia identidade para gênero binário usado nos filtros
-                print("Mapeando gênero...")
                 profile.set_gender_from_identity()
-                profile.save(update_fields=['gender'])
-                print(f"Gênero mapeado: {profile.gender}")
+                profile.save()
 
-                # Cria o veículo associado
-                print("Criando veículo...")
-                # InstructorVehicle já está importado no topo do arquivo
-                vehicle = InstructorVehicle.objects.create(
+                # Veículo principal + veículos adicionais (opcionais) num único INSERT
+                vehicles = [InstructorVehicle(
                     instructor=profile,
                     plate=self.cleaned_data['vehicle_plate'],
                     renavam=self.cleaned_data['vehicle_renavam'],
@@ -681,55 +633,44 @@ class InstructorRegistrationForm(BaseRegistrationForm):
                     year=self.cleaned_data['vehicle_year'],
                     dual_control=self.cleaned_data.get('vehicle_dual_control', False),
                     adapted_pcd=self.cleaned_data.get('vehicle_adapted_pcd', False),
-                )
-                print(f"Veículo criado com ID: {vehicle.pk}")
-
-                # Cria veículos adicionais (opcionais)
-                extra_raw = self.cleaned_data.get('extra_vehicles') or ''
-                if extra_raw.strip():
-                    try:
-                        extras = json.loads(extra_raw)
-                    except json.JSONDecodeError:
-                        extras = []
-
-                    for idx, ev in enumerate(extras, start=1):
-                        try:
-                            # Normaliza dados recebidos do hidden
-                            last_license = ev.get('last_license_exercise')
-                            if isinstance(last_license, str) and last_license:
-                                last_license = date.fromisoformat(last_license)
-                            extra_vehicle = InstructorVehicle(
-                                instructor=profile,
-                                plate=ev.get('plate', ''),
-                                renavam=ev.get('renavam', ''),
-                                last_license_exercise=last_license,
-                                model=ev.get('model', ''),
-                                make=ev.get('make', ''),
-                                color=ev.get('color', ''),
-                                year=int(ev.get('year') or 0),
-                                dual_control=bool(ev.get('dual_control')),
-                                adapted_pcd=bool(ev.get('adapted_pcd')),
-                            )
-                            extra_vehicle.full_clean()
-                            extra_vehicle.save()
-                            print(f"Veículo extra #{idx} salvo: {extra_vehicle}")
-                        except Exception as extra_err:
-                            print(f"Falha ao salvar veículo extra #{idx}: {extra_err}")
-
-                print("=== FIM save() - SUCESSO ===\n")
+                )]
+                vehicles.extend(self._extra_vehicles(profile, {normalize_plate(vehicles[0].plate)}))
+                InstructorVehicle.objects.bulk_create(vehicles)
                 
-            except Exception as e:
+            except Exception:
                 # Se algo falhar, deleta o usuário criado
-                print(f"\n!!! ERRO no save(): {e} !!!")
-                import traceback
-                traceback.print_exc()
+                logger.exception('Falha ao cadastrar instrutor %s', user.username)
                 if user.pk:
-                    print(f"Deletando usuário {user.pk}...")
                     user.delete()
                 raise
         
         return user
 
+    def _extra_vehicles(self, profile, plates):
+        """Valida os veículos adicionais enviados via JS; inválidos são ignorados"""
+        extra_raw = self.cleaned_data.get('extra_vehicles') or ''
+        if not extra_raw.strip():
+            return []
+        try:
+            extras = json.loads(extra_raw)
+        except json.JSONDecodeError:
+            return []
+
+        vehicles = []
+        for idx, ev in enumerate(extras, start=1):
+            if not isinstance(ev, dict):
+                continue
+            errors = {}
+            data = validate_vehicle(ev, errors)
+            if not errors and data['plate'] in plates:
+                errors['plate'] = 'Placa repetida'
+            if errors:
+                logger.warning('Veículo extra #%s ignorado: %s', idx, errors)
+                continue
+            plates.add(data['plate'])
+            vehicles.append(InstructorVehicle(instructor=profile, **data))
+        return vehicles
+
 
 class EmployeeRegistrationForm(BaseRegistrationForm):
     """Formulário específico para funcionários"""
@@ -825,49 +766,38 @@ class UserLoginForm(forms.Form):
             'inactive_account': 'Sua conta está inativa. Entre em contato com o administrador.',
         }
     
-    def clean_email(self):
-        """Valida se o email existe no sistema"""
-        email = self.cleaned_data.get('email')
-        
-        if email:
-            try:
-                user = User.objects.get(email=email)
-                
-                # Verifica se o usuário está ativo
-                if not user.is_active:
-                    raise ValidationError(self.error_messages['inactive_account'])
-                
-            except User.DoesNotExist:
-                # Salva o erro no campo email
-                self.add_error('email', self.error_messages['email_not_found'])
-        
-        return email
-    
     def clean(self):
-        """Validação cruzada de email e senha"""
+        """Valida email e senha com uma única busca (case-insensitive) pelo usuário"""
         cleaned_data = super().clean()
         email = cleaned_data.get('email')
         password = cleaned_data.get('password')
+        self.user_cache = None
         
-        # Se o email não existe, já paramos aqui
-        if self.errors.get('email'):
+        if not email:
             return cleaned_data
         
-        # Se temos email e senha, valida a senha
-        if email and password:
-            try:
-                user = User.objects.get(email=email)
-                
-                # Verifica a senha
-                if not user.check_password(password):
-                    # Adiciona erro específico no campo password
-                    self.add_error('password', self.error_messages['incorrect_password'])
-                
-            except User.DoesNotExist:
-                # Isso não deveria acontecer se clean_email() passou
-                pass
+        try:
+            user = User.objects.get_by_email(email)
+        except User.DoesNotExist:
+            self.add_error('email', self.error_messages['email_not_found'])
+            return cleaned_data
         
+        # Verifica se o usuário está ativo
+        if not user.is_active:
+            self.add_error('email', self.error_messages['inactive_account'])
+            return cleaned_data
+        
+        # Verifica a senha
+        if password and not user.check_password(password):
+            self.add_error('password', self.error_messages['incorrect_password'])
+            return cleaned_data
+        
+        self.user_cache = user
         return cleaned_data
+    
+    def get_user(self):
+        """Usuário autenticado durante a validação"""
+        return self.user_cache
 
 
 # Formulário simplificado para a view genérica (não será mais usado diretamente)
@@ -1137,7 +1067,7 @@ class InstructorPersonalEditForm(forms.Form):
     def clean_email(self):
         """Valida que o email é único"""
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exclude(pk=self.user.pk).exists():
+        if email and User.objects.filter_by_email(email).exclude(pk=self.user.pk).exists():
             raise ValidationError('Este email já está cadastrado')
         return email
     
@@ -1329,7 +1259,7 @@ class StudentPersonalEditForm(forms.Form):
     def clean_email(self):
         """Valida que o email é único"""
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exclude(pk=self.user.pk).exists():
+        if email and User.objects.filter_by_email(email).exclude(pk=self.user.pk).exists():
             raise ValidationError('Este email já está cadastrado')
         return email
     
@@ -1413,15 +1343,21 @@ class StudentPersonalEditForm(forms.Form):
             
             # Se o CEP mudou, cancela todas as aulas agendadas do aluno
             if old_cep_clean and new_cep_clean and old_cep_clean != new_cep_clean:
-                from lessons.models import Lesson
+                from django.db import transaction
+                from lessons.models import Lesson, LessonEvent
                 
                 # Busca aulas pendentes e agendadas (não concluídas)
-                result = Lesson.objects.filter(
+                lessons = list(Lesson.objects.filter(
                     student=self.user,
                     status__in=['pending', 'scheduled']
-                ).delete()
+                ))
+                with transaction.atomic():
+                    # O delete em lote não passa por Lesson.delete: grava os tombstones
+                    # do aluno e do instrutor (sync incremental e SSE) antes de excluir
+                    LessonEvent.publish_many(lessons, 'lesson.deleted')
+                    Lesson.objects.filter(pk__in=[lesson.pk for lesson in lessons]).delete()
                 
-                cancelled_lessons_count = result[0] if result else 0
+                cancelled_lessons_count = len(lessons)
             
             self.profile.cep = self.cleaned_data['cep']
             self.profile.save(update_fields=['cep'])
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.bloom import KnownDocuments
+from accounts.models import User, IdentityDocument
+
+
+class Command(BaseCommand):
+    help = 'Mede consultas ao banco por 1.000 verificações de CPF, com e sem o filtro de Bloom'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-documents', type=int, default=5000,
+                            help='Quantidade de CPFs cadastrados simulados')
+        parser.add_argument('--checks', type=int, default=1000,
+                            help='Quantidade de verificações executadas')
+        parser.add_argument('--hit-ratio', type=float, default=0.1,
+                            help='Fração das verificações que usam CPF já cadastrado')
+        parser.add_argument('--random-seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+
+        # Tudo roda dentro de uma transação desfeita ao final
+        with transaction.atomic():
+            existing = self._seed(rng, options['seed_documents'])
+            checks = [
+                rng.choice(existing) if rng.random() < options['hit_ratio'] else self._random_cpf(rng)
+                for _ in range(options['checks'])
+            ]
+
+            direct = self._measure(lambda cpf: IdentityDocument.is_taken('cpf', cpf), checks)
+
+            prefilter = KnownDocuments()
+            prefilter.rebuild()
+            bloom = self._measure(lambda cpf: prefilter.is_taken('cpf', cpf), checks)
+
+            if direct['results'] != bloom['results']:
+                self.stderr.write(self.style.ERROR('Resultados divergentes entre os métodos!'))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{options['checks']} verificações, {options['seed_documents']} CPFs cadastrados, "
+                          f"{options['hit_ratio']:.0%} já existentes")
+        for label, result in (('Registro (IdentityDocument)', direct), ('Filtro de Bloom + registro', bloom)):
+            self.stdout.write(
+                f"  {label:<30} {result['queries']:>6} consultas  {result['elapsed'] * 1000:>8.1f} ms"
+            )
+        self.stdout.write('  Antes (3 tabelas de perfil)    até 3 consultas por verificação')
+
+    @staticmethod
+    def _random_cpf(rng):
+        return ''.join(rng.choice('0123456789') for _ in range(11))
+
+    def _seed(self, rng, amount):
+        users = User.objects.bulk_create(
+            [User(username=f'bench_doc_{i}', password='!') for i in range(amount)],
+            batch_size=500,
+        )
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__startswith='bench_doc_'))
+        numbers = set()
+        while len(numbers) < amount:
+            numbers.add(self._random_cpf(rng))
+        numbers = list(numbers)
+        IdentityDocument.objects.bulk_create(
+            [IdentityDocument(user=user, kind='cpf', number=number) for user, number in zip(users, numbers)],
+            batch_size=500,
+        )
+        return numbers
+
+    @staticmethod
+    def _measure(check, values):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            results = [check(value) for value in values]
+            elapsed = time.perf_counter() - start
+        return {'queries': len(ctx.captured_queries), 'elapsed': elapsed, 'results': results}
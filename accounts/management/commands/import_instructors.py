@@ -0,0 +1,228 @@
+import logging
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.bloom import known_documents
+from accounts.bulk_import import (
+    CEP_RE, NON_DIGITS_RE, RejectWriter, allocate_usernames, chunked, clean_text,
+    identity_documents_for, mark_duplicates, parse_date, read_rows, reject_existing,
+    validate_person, validate_vehicle,
+)
+from accounts.models import User, InstructorProfile, InstructorVehicle, IdentityDocument, normalize_cpf
+
+
+logger = logging.getLogger(__name__)
+
+GENDER_IDENTITIES = {choice for choice, _ in InstructorProfile.GENDER_IDENTITY_CHOICES}
+VEHICLE_CATEGORIES = {'A', 'B', 'AB'}
+
+
+class Command(BaseCommand):
+    help = 'Importa instrutores e veículos de uma autoescola parceira (CSV ou JSONL) em uma transação'
+
+    def add_arguments(self, parser):
+        parser.add_argument('instructors', nargs='?', help='Arquivo de instrutores (.csv ou .jsonl)')
+        parser.add_argument('--vehicles', help='Arquivo de veículos; a coluna instructor_cpf liga ao instrutor')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Valida e desfaz a transação ao final')
+
+    def handle(self, *args, **options):
+        if not options['instructors'] and not options['vehicles']:
+            raise CommandError('Informe o arquivo de instrutores e/ou --vehicles.')
+
+        documents = []
+        try:
+            with transaction.atomic():
+                if options['instructors']:
+                    created, rejected = self._import_instructors(options['instructors'], options['chunk_size'], documents)
+                    self.stdout.write(f'Instrutores: {created} importado(s), {rejected} rejeitado(s)')
+                if options['vehicles']:
+                    created, rejected = self._import_vehicles(options['vehicles'], options['chunk_size'])
+                    self.stdout.write(f'Veículos: {created} importado(s), {rejected} rejeitado(s)')
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+        except IntegrityError as e:
+            raise CommandError(f'Importação desfeita, nada foi gravado: {e}')
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o arquivo: {e}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry-run: nenhuma alteração gravada.'))
+        else:
+            for document in documents:
+                known_documents.add(document.kind, document.number)
+            self.stdout.write(self.style.SUCCESS('Importação concluída.'))
+
+    def _report(self, rejects, source, chunk, errors_by_line):
+        raw_by_line = dict(chunk)
+        for line_number, errors in sorted(errors_by_line.items()):
+            rejects.write(line_number, raw_by_line[line_number], errors)
+            logger.warning('%s linha %s rejeitada: %s', source, line_number, errors)
+
+    # ==========================
+    # Instrutores
+    # ==========================
+    def _import_instructors(self, path, chunk_size, documents):
+        seen = set()
+        created = 0
+        with RejectWriter(RejectWriter.default_path(path)) as rejects:
+            for chunk in chunked(read_rows(path), chunk_size):
+                errors_by_line = {}
+                valid = self._validate_instructors(chunk, errors_by_line)
+                valid = mark_duplicates(valid, seen, errors_by_line)
+                valid = reject_existing(valid, errors_by_line)
+                if valid:
+                    documents.extend(self._create_instructors(valid))
+                created += len(valid)
+                self._report(rejects, path, chunk, errors_by_line)
+        if rejects.count:
+            self.stdout.write(self.style.WARNING(f'Rejeitados gravados em {rejects.path}'))
+        return created, rejects.count
+
+    def _validate_instructors(self, chunk, errors_by_line):
+        valid = []
+        for line_number, row in chunk:
+            if '__error__' in row:
+                errors_by_line[line_number] = {'__all__': row['__error__']}
+                continue
+            errors = {}
+            data = validate_person(row, errors)
+
+            data['cnh'] = clean_text(row, 'cnh')
+            if len(NON_DIGITS_RE.sub('', data['cnh'])) < 9:
+                errors['cnh'] = 'CNH deve conter pelo menos 9 dígitos'
+            data['cnh_emission_date'] = parse_date(clean_text(row, 'cnh_emission_date'))
+            if data['cnh_emission_date'] is None:
+                errors['cnh_emission_date'] = 'Data de emissão da CNH inválida'
+            elif data['birth_date'] and data['cnh_emission_date'] <= data['birth_date']:
+                errors['cnh_emission_date'] = 'Data de emissão da CNH deve ser posterior à data de nascimento'
+            data['credential'] = clean_text(row, 'credential')
+            if len(data['credential']) < 5:
+                errors['credential'] = 'Credencial deve conter pelo menos 5 caracteres'
+
+            data['gender_identity'] = clean_text(row, 'gender_identity').upper()
+            if data['gender_identity'] and data['gender_identity'] not in GENDER_IDENTITIES:
+                errors['gender_identity'] = 'Identidade de gênero inválida'
+            data['vehicle_categories'] = clean_text(row, 'vehicle_categories').upper() or 'B'
+            if data['vehicle_categories'] not in VEHICLE_CATEGORIES:
+                errors['vehicle_categories'] = 'Categoria deve ser A, B ou AB'
+            cep_base = clean_text(row, 'cep_base')
+            if cep_base and not CEP_RE.match(cep_base):
+                errors['cep_base'] = 'CEP da base deve conter exatamente 8 dígitos'
+            digits = NON_DIGITS_RE.sub('', cep_base)
+            data['cep_base'] = f'{digits[:5]}-{digits[5:]}' if digits else ''
+            data['password'] = clean_text(row, 'password')
+
+            if errors:
+                errors_by_line[line_number] = errors
+            else:
+                valid.append((line_number, data))
+        return valid
+
+    def _create_instructors(self, valid):
+        usernames = allocate_usernames(valid)
+        users = User.objects.bulk_create([
+            User(
+                username=usernames[line_number],
+                email=data['email'],
+                full_name=data['full_name'],
+                phone=data['phone'],
+                role='instrutor',
+                password=make_password(data['password'] or None),
+            )
+            for line_number, data in valid
+        ])
+
+        pairs = list(zip(users, (data for _, data in valid)))
+        profiles = []
+        for user, data in pairs:
+            profile = InstructorProfile(
+                user=user,
+                full_name=data['full_name'],
+                email=data['email'],
+                phone=data['phone'],
+                birth_date=data['birth_date'],
+                cpf=data['cpf'],
+                rg=data['rg'],
+                cep=data['cep'],
+                address=data['address'],
+                address_number=data['address_number'],
+                address_complement=data['address_complement'],
+                cnh=data['cnh'],
+                cnh_emission_date=data['cnh_emission_date'],
+                credential=data['credential'],
+                gender_identity=data['gender_identity'],
+                cep_base=data['cep_base'],
+                vehicle_categories=data['vehicle_categories'],
+                status='pendente',
+            )
+            profile.set_gender_from_identity()
+            profiles.append(profile)
+        InstructorProfile.objects.bulk_create(profiles)
+        return IdentityDocument.objects.bulk_create(identity_documents_for(pairs))
+
+    # ==========================
+    # Veículos
+    # ==========================
+    def _import_vehicles(self, path, chunk_size):
+        seen = set()
+        created = 0
+        with RejectWriter(RejectWriter.default_path(path)) as rejects:
+            for chunk in chunked(read_rows(path), chunk_size):
+                errors_by_line = {}
+                valid = self._validate_vehicles(chunk, seen, errors_by_line)
+                InstructorVehicle.objects.bulk_create([vehicle for _, vehicle in valid])
+                created += len(valid)
+                self._report(rejects, path, chunk, errors_by_line)
+        if rejects.count:
+            self.stdout.write(self.style.WARNING(f'Rejeitados gravados em {rejects.path}'))
+        return created, rejects.count
+
+    def _validate_vehicles(self, chunk, seen, errors_by_line):
+        parsed = []
+        for line_number, row in chunk:
+            if '__error__' in row:
+                errors_by_line[line_number] = {'__all__': row['__error__']}
+                continue
+            errors = {}
+            data = validate_vehicle(row, errors)
+            cpf = normalize_cpf(clean_text(row, 'instructor_cpf'))
+            if len(cpf) != 11:
+                errors['instructor_cpf'] = 'CPF do instrutor inválido'
+            if errors:
+                errors_by_line[line_number] = errors
+            else:
+                parsed.append((line_number, cpf, data))
+        if not parsed:
+            return []
+
+        # Uma consulta para resolver os instrutores pelo CPF
+        instructor_ids = dict(
+            IdentityDocument.objects.filter(
+                kind='cpf', number__in={cpf for _, cpf, _ in parsed}, user__role='instrutor',
+            ).values_list('number', 'user__instructorprofile_profile__id')
+        )
+        # Uma consulta para placas já cadastradas para esses instrutores
+        existing = set(
+            InstructorVehicle.objects.filter(
+                instructor_id__in={pk for pk in instructor_ids.values() if pk},
+                plate__in={data['plate'] for _, _, data in parsed},
+            ).values_list('instructor_id', 'plate')
+        )
+
+        valid = []
+        for line_number, cpf, data in parsed:
+            instructor_id = instructor_ids.get(cpf)
+            key = (instructor_id, data['plate'])
+            if not instructor_id:
+                errors_by_line[line_number] = {'instructor_cpf': 'Instrutor não encontrado'}
+            elif key in existing:
+                errors_by_line[line_number] = {'plate': 'Placa já cadastrada para este instrutor'}
+            elif key in seen:
+                errors_by_line[line_number] = {'plate': 'Duplicado no arquivo'}
+            else:
+                seen.add(key)
+                valid.append((line_number, InstructorVehicle(instructor_id=instructor_id, **data)))
+        return valid
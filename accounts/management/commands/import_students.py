@@ -0,0 +1,142 @@
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.bloom import known_documents
+from accounts.bulk_import import (
+    RejectWriter, allocate_usernames, age_on, chunked, clean_text, identity_documents_for,
+    mark_duplicates, read_rows, reject_existing, validate_person,
+)
+from accounts.models import User, StudentProfile, IdentityDocument
+
+
+GENDER_IDENTITIES = {choice for choice, _ in StudentProfile.GENDER_IDENTITY_CHOICES}
+LICENSE_CATEGORIES = {'A', 'B', 'AB'}
+
+
+class Command(BaseCommand):
+    help = 'Importa alunos em lote a partir de um arquivo CSV ou JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo .csv ou .jsonl com um aluno por linha')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--rejects', help='Arquivo de rejeitados (padrão: <arquivo>.rejects.<ext>)')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas valida, sem gravar')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            rows = read_rows(path)
+            first = next(rows, None)
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler {path}: {e}')
+        if first is None:
+            raise CommandError('Arquivo vazio.')
+
+        def all_rows():
+            yield first
+            yield from rows
+
+        rejects_path = options['rejects'] or RejectWriter.default_path(path)
+        seen = set()
+        imported = 0
+        today = date.today()
+
+        with RejectWriter(rejects_path) as rejects:
+            for number, chunk in enumerate(chunked(all_rows(), options['chunk_size']), start=1):
+                errors_by_line = {}
+                valid = self._validate_chunk(chunk, today, errors_by_line)
+                valid = mark_duplicates(valid, seen, errors_by_line)
+                valid = reject_existing(valid, errors_by_line)
+
+                if valid and not options['dry_run']:
+                    try:
+                        self._create_chunk(valid)
+                    except IntegrityError as e:
+                        # Outro processo cadastrou algum documento no meio do caminho
+                        for line_number, _ in valid:
+                            errors_by_line[line_number] = {'__all__': f'Bloco não gravado: {e}'}
+                        valid = []
+
+                imported += len(valid)
+                raw_by_line = dict(chunk)
+                for line_number, errors in sorted(errors_by_line.items()):
+                    rejects.write(line_number, raw_by_line[line_number], errors)
+                    self.stderr.write(f'Linha {line_number}: ' + '; '.join(f'{k}: {v}' for k, v in errors.items()))
+                self.stdout.write(f'Bloco {number}: {len(valid)} importado(s), {len(errors_by_line)} rejeitado(s)')
+
+        action = 'validado(s)' if options['dry_run'] else 'importado(s)'
+        self.stdout.write(self.style.SUCCESS(f'{imported} aluno(s) {action}.'))
+        if rejects.count:
+            self.stdout.write(self.style.WARNING(f'{rejects.count} linha(s) rejeitada(s) em {rejects_path}'))
+
+    def _validate_chunk(self, chunk, today, errors_by_line):
+        valid = []
+        for line_number, row in chunk:
+            if '__error__' in row:
+                errors_by_line[line_number] = {'__all__': row['__error__']}
+                continue
+            errors = {}
+            data = validate_person(row, errors)
+            if data['birth_date'] and 'birth_date' not in errors and age_on(data['birth_date'], today) < 18:
+                errors['birth_date'] = 'Aluno deve ter pelo menos 18 anos'
+
+            data['gender_identity'] = clean_text(row, 'gender_identity').upper()
+            if data['gender_identity'] and data['gender_identity'] not in GENDER_IDENTITIES:
+                errors['gender_identity'] = 'Identidade de gênero inválida'
+            data['license_categories'] = clean_text(row, 'license_categories').upper() or 'B'
+            if data['license_categories'] not in LICENSE_CATEGORIES:
+                errors['license_categories'] = 'Categoria deve ser A, B ou AB'
+            data['password'] = clean_text(row, 'password')
+
+            if errors:
+                errors_by_line[line_number] = errors
+            else:
+                valid.append((line_number, data))
+        return valid
+
+    @transaction.atomic
+    def _create_chunk(self, valid):
+        usernames = allocate_usernames(valid)
+        users = []
+        for line_number, data in valid:
+            user = User(
+                username=usernames[line_number],
+                email=data['email'],
+                full_name=data['full_name'],
+                phone=data['phone'],
+                role='aluno',
+            )
+            # Sem senha no arquivo o aluno define a sua pela recuperação de senha
+            user.password = make_password(data['password'] or None)
+            users.append(user)
+        users = User.objects.bulk_create(users)
+
+        pairs = list(zip(users, (data for _, data in valid)))
+        StudentProfile.objects.bulk_create([
+            StudentProfile(
+                user=user,
+                full_name=data['full_name'],
+                email=data['email'],
+                phone=data['phone'],
+                birth_date=data['birth_date'],
+                cpf=data['cpf'],
+                rg=data['rg'],
+                cep=data['cep'],
+                address=data['address'],
+                address_number=data['address_number'],
+                address_complement=data['address_complement'],
+                gender_identity=data['gender_identity'],
+                license_categories=data['license_categories'],
+                status='ativo',
+            )
+            for user, data in pairs
+        ])
+        documents = IdentityDocument.objects.bulk_create(identity_documents_for(pairs))
+
+        def update_prefilter():
+            for document in documents:
+                known_documents.add(document.kind, document.number)
+        transaction.on_commit(update_prefilter)
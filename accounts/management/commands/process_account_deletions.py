@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts.deletion import resumable_jobs, run_account_deletion
+
+
+class Command(BaseCommand):
+    help = 'Processa exclusões de conta pendentes, com falha ou abandonadas (agende via cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Registros removidos por transação')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Não retoma jobs que já falharam este número de vezes')
+
+    def handle(self, *args, **options):
+        jobs = resumable_jobs().filter(attempts__lt=options['max_attempts']).order_by('requested_at')
+        done = failed = 0
+        for job_pk in jobs.values_list('pk', flat=True):
+            if run_account_deletion(job_pk, size=options['batch_size']):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(f'{done} exclusão(ões) concluída(s), {failed} não concluída(s)')
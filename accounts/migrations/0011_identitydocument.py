@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-19 14:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_identity_documents(apps, schema_editor):
+    """Popula o registro a partir dos perfis existentes (primeiro cadastro vence em duplicatas)."""
+    import re
+    IdentityDocument = apps.get_model('accounts', 'IdentityDocument')
+    normalizers = {
+        'cpf': lambda value: ''.join(filter(str.isdigit, value or '')),
+        'rg': lambda value: re.sub(r'[^A-Za-z0-9]', '', value or '').upper(),
+    }
+    seen_numbers = set()
+    seen_users = set()
+    documents = []
+    for model_name in ('StudentProfile', 'InstructorProfile', 'EmployeeProfile'):
+        Profile = apps.get_model('accounts', model_name)
+        for user_id, cpf, rg in Profile.objects.order_by('created_at').values_list('user_id', 'cpf', 'rg'):
+            for kind, value in (('cpf', cpf), ('rg', rg)):
+                number = normalizers[kind](value)
+                if not number or (kind, number) in seen_numbers or (user_id, kind) in seen_users:
+                    continue
+                seen_numbers.add((kind, number))
+                seen_users.add((user_id, kind))
+                documents.append(IdentityDocument(user_id=user_id, kind=kind, number=number))
+    IdentityDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_instructorvehicle_instructor_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentityDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('cpf', 'CPF'), ('rg', 'RG')], max_length=3, verbose_name='Tipo')),
+                ('number', models.CharField(max_length=20, verbose_name='Número normalizado')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identity_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Documento de Identificação',
+                'verbose_name_plural': 'Documentos de Identificação',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'number'), name='unique_identity_document'), models.UniqueConstraint(fields=('user', 'kind'), name='unique_identity_document_per_user')],
+            },
+        ),
+        migrations.RunPython(backfill_identity_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-19 14:29
+
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """Interrompe a migração listando os emails repetidos sem diferenciar maiúsculas.
+
+    Até aqui 'Ana@x.com' e 'ana@x.com' podiam coexistir; o índice único
+    falharia com um IntegrityError sem dizer quais contas conflitam. Qual
+    conta manter é decisão de quem administra, então nada é alterado aqui.
+    """
+    User = apps.get_model('accounts', 'User')
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias).exclude(email='')
+        .annotate(email_lower=Lower('email')).values('email_lower')
+        .annotate(total=Count('pk')).filter(total__gt=1).values_list('email_lower', flat=True)
+        .order_by('email_lower')
+    )
+    if not duplicates:
+        return
+    accounts = User.objects.using(schema_editor.connection.alias).annotate(email_lower=Lower('email')).filter(
+        email_lower__in=duplicates,
+    ).order_by('email_lower', 'pk').values_list('email_lower', 'pk', 'username', 'email')
+    lines = [f'  {email_lower}: id={pk} username={username} email={email}'
+             for email_lower, pk, username, email in accounts]
+    raise RuntimeError(
+        f'{len(duplicates)} email(s) usados por mais de uma conta (sem diferenciar maiúsculas). '
+        'Altere ou remova as contas repetidas e rode o migrate de novo:\n' + '\n'.join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_identitydocument'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.UserManager()),
+            ],
+        ),
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='unique_user_email_ci'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_user_unique_email_ci'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_pk', models.BigIntegerField(unique=True, verbose_name='ID do usuário')),
+                ('username', models.CharField(max_length=150, verbose_name='Usuário')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em andamento'), ('done', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=10)),
+                ('step', models.CharField(choices=[('lessons', 'Aulas'), ('vehicles', 'Veículos'), ('media', 'Arquivos'), ('account', 'Conta'), ('finished', 'Finalizado')], default='lessons', max_length=10)),
+                ('total_lessons', models.PositiveIntegerField(default=0)),
+                ('deleted_lessons', models.PositiveIntegerField(default=0)),
+                ('deleted_vehicles', models.PositiveIntegerField(default=0)),
+                ('deleted_files', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Exclusão de Conta',
+                'verbose_name_plural': 'Exclusões de Conta',
+                'ordering': ['-requested_at'],
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='accountdeletion_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instructorvehicle',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='instructorvehicle',
+            index=models.Index(fields=['instructor', 'updated_at'], name='vehicle_instructor_updated_idx'),
+        ),
+    ]
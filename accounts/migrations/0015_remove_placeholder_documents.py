@@ -0,0 +1,21 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, LPad
+
+
+def remove_placeholder_documents(apps, schema_editor):
+    """Remove do registro os CPF/RG provisórios (ID do usuário com zeros) dos cadastros pela API"""
+    IdentityDocument = apps.get_model('accounts', 'IdentityDocument')
+    IdentityDocument.objects.filter(
+        number=LPad(Cast('user_id', models.CharField()), 11, models.Value('0')),
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_instructorvehicle_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_placeholder_documents, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.core.exceptions import ValidationError
 import os
 import re
@@ -23,6 +24,23 @@ def upload_profile_photo(instance, filename):
     return os.path.join('profiles/photos/', safe_name)
 
 
+class UserManager(BaseUserManager):
+    """Manager com busca de usuário por email sem diferenciar maiúsculas"""
+
+    def filter_by_email(self, email):
+        """Filtra por LOWER(email) no índice único parcial `unique_user_email_ci`.
+
+        O `exclude(email='')` repete o predicado do índice: sem ele o banco
+        não pode usar um índice parcial e varre a tabela inteira.
+        """
+        return self.annotate(email_lower=Lower('email')).filter(
+            email_lower=(email or '').strip().lower()
+        ).exclude(email='')
+
+    def get_by_email(self, email):
+        return self.filter_by_email(email).get()
+
+
 class User(AbstractUser):
     """Custom user model with role support"""
     ROLE_CHOICES = (
@@ -36,11 +54,22 @@ class User(AbstractUser):
     full_name = models.CharField(max_length=255, blank=True)
     registration_date = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Validador das respostas que mostram dados do usuário (ETag das buscas e da API de aulas)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserManager()
     
     class Meta:
         verbose_name = "Usuário"
         verbose_name_plural = "Usuários"
         ordering = ['-registration_date']
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~models.Q(email=''),
+                name='unique_user_email_ci',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.full_name or self.username} ({self.get_role_display()})"
@@ -56,17 +85,152 @@ class User(AbstractUser):
         return self.role == 'funcionario'
     
     def get_profile(self):
-        """Retorna o perfil específico do usuário"""
+        """Retorna o perfil específico do usuário.
+
+        Usa o cache da relação quando o perfil já veio no select_related
+        (ex.: 'student__studentprofile_profile') ou numa chamada anterior:
+        view e context processor não repetem a consulta.
+        """
         if self.is_aluno():
-            return StudentProfile.objects.filter(user=self).first()
+            model = StudentProfile
         elif self.is_instrutor():
-            return InstructorProfile.objects.filter(user=self).first()
+            model = InstructorProfile
         elif self.is_funcionario():
-            return EmployeeProfile.objects.filter(user=self).first()
-        return None
+            model = EmployeeProfile
+        else:
+            return None
+        relation = self._meta.get_field(f'{model._meta.model_name}_profile')
+        if relation.is_cached(self):
+            return relation.get_cached_value(self)
+        profile = model.objects.filter(user=self).first()
+        if profile is not None:
+            relation.set_cached_value(self, profile)
+        return profile
+
+
+def normalize_cpf(value):
+    """Normaliza o CPF para apenas dígitos (chave do registro de documentos)"""
+    return ''.join(filter(str.isdigit, value or ''))
+
+
+def normalize_rg(value):
+    """Normaliza o RG para letras maiúsculas e dígitos, sem pontuação"""
+    return re.sub(r'[^A-Za-z0-9]', '', value or '').upper()
+
+
+def normalize_plate(value):
+    """Normaliza a placa para letras maiúsculas e dígitos (AAA-1234 e aaa1234 são a mesma)"""
+    return re.sub(r'[^A-Za-z0-9]', '', value or '').upper()
+
+
+def placeholder_document(user_id):
+    """CPF/RG provisório dos cadastros pela API, até o perfil ser completado.
+
+    Não é um documento real e fica fora do registro de documentos.
+    """
+    return f'{user_id:011d}'
+
+
+class IdentityDocument(models.Model):
+    """Registro unificado de CPF/RG de todos os perfis.
+
+    Cada documento normalizado aparece uma única vez, independente da tabela
+    de perfil (aluno, instrutor ou funcionário). As verificações de unicidade
+    viram uma consulta pontual no índice único, garantido pelo banco.
+    """
+    KIND_CHOICES = (
+        ('cpf', 'CPF'),
+        ('rg', 'RG'),
+    )
+    NORMALIZERS = {
+        'cpf': normalize_cpf,
+        'rg': normalize_rg,
+    }
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identity_documents')
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES, verbose_name="Tipo")
+    number = models.CharField(max_length=20, verbose_name="Número normalizado")
+
+    class Meta:
+        verbose_name = "Documento de Identificação"
+        verbose_name_plural = "Documentos de Identificação"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'number'], name='unique_identity_document'),
+            models.UniqueConstraint(fields=['user', 'kind'], name='unique_identity_document_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.number}"
+
+    @classmethod
+    def is_taken(cls, kind, value, exclude_user=None):
+        """Verifica se o documento já está cadastrado (uma consulta indexada)"""
+        number = cls.NORMALIZERS[kind](value)
+        if not number:
+            return False
+        qs = cls.objects.filter(kind=kind, number=number)
+        if exclude_user is not None:
+            qs = qs.exclude(user=exclude_user)
+        return qs.exists()
+
+    @classmethod
+    def sync_profile(cls, profile):
+        """Grava o CPF/RG atuais do perfil no registro (documentos provisórios ficam de fora)"""
+        from .bloom import known_documents
+        placeholder = placeholder_document(profile.user_id)
+        for kind in ('cpf', 'rg'):
+            value = getattr(profile, kind)
+            number = cls.NORMALIZERS[kind](value)
+            if number and value != placeholder:
+                cls.objects.update_or_create(
+                    user_id=profile.user_id, kind=kind, defaults={'number': number}
+                )
+                known_documents.add(kind, number)
 
 
 # Validadores
+def validar_cpf(cpf):
+    """Valida o CPF usando o algoritmo oficial"""
+    # Remove caracteres não numéricos
+    cpf = ''.join(filter(str.isdigit, cpf))
+
+    # Verifica se tem 11 dígitos
+    if len(cpf) != 11:
+        return False
+
+    # Verifica se é uma sequência de números iguais
+    if cpf == cpf[0] * len(cpf):
+        return False
+
+    # Calcula o primeiro dígito verificador
+    soma = 0
+    peso = 10
+    for i in range(9):
+        soma += int(cpf[i]) * peso
+        peso -= 1
+
+    resto = soma % 11
+    digito1 = 0 if resto < 2 else 11 - resto
+
+    if digito1 != int(cpf[9]):
+        return False
+
+    # Calcula o segundo dígito verificador
+    soma = 0
+    peso = 11
+    for i in range(10):
+        soma += int(cpf[i]) * peso
+        peso -= 1
+
+    resto = soma % 11
+    digito2 = 0 if resto < 2 else 11 - resto
+
+    if digito2 != int(cpf[10]):
+        return False
+
+    return True
+
+
 def validate_image_extension(value):
     """Valida a extensão da imagem"""
     ext = os.path.splitext(value.name)[1].lower()
@@ -129,33 +293,80 @@ class BaseProfile(models.Model):
     def __str__(self):
         return f"{self.full_name}"
     
+    # Campos com validação própria, na ordem em que clean() os verifica.
+    # Cada um tem um método _clean_<campo>; subclasses estendem a tupla.
+    validated_fields = ('cpf', 'rg', 'cep', 'birth_date')
+    # Validações que também leem outros campos: {campo validado: campos lidos}
+    validation_dependencies = {}
+
     def clean(self):
         """Validações comuns para todos os perfis"""
         super().clean()
-        
+        self.clean_written_fields(self.validated_fields)
+
+    def clean_written_fields(self, fields):
+        """Executa apenas as validações afetadas pelos campos informados"""
+        fields = set(fields)
+        for field, depends_on in self.validation_dependencies.items():
+            if fields & depends_on:
+                fields.add(field)
+        for field in self.validated_fields:
+            if field in fields:
+                getattr(self, f'_clean_{field}')()
+
+    def _clean_cpf(self):
         # Validação do CPF (11 dígitos)
         cpf_digits = ''.join(filter(str.isdigit, self.cpf))
         if len(cpf_digits) != 11:
             raise ValidationError({'cpf': 'CPF deve conter exatamente 11 dígitos'})
-        
+
+    def _clean_rg(self):
         # Validação do RG (8-20 caracteres)
         rg_clean = ''.join(filter(lambda x: x.isalnum() or x in '.-', self.rg))
         if len(rg_clean) < 8 or len(rg_clean) > 20:
             raise ValidationError({'rg': 'RG deve ter entre 8 e 20 caracteres válidos'})
-        
+
+    def _clean_cep(self):
         # Validação do CEP (8 dígitos)
         cep_digits = ''.join(filter(str.isdigit, self.cep))
         if len(cep_digits) != 8:
             raise ValidationError({'cep': 'CEP deve conter exatamente 8 dígitos'})
-        
+
+    def _clean_birth_date(self):
         # Validação da data de nascimento (não pode ser futura)
         from datetime import date
         if self.birth_date > date.today():
             raise ValidationError({'birth_date': 'Data de nascimento não pode ser futura'})
-    
-    def save(self, *args, **kwargs):
-        self.clean()  # Executa validações antes de salvar
-        super().save(*args, **kwargs)
+
+    def save(self, *args, validate=True, **kwargs):
+        """Valida e salva o perfil.
+
+        Com `update_fields` só as validações dos campos gravados são executadas
+        e `updated_at` entra sempre na lista; `validate=False` pula a validação
+        em atualizações internas (contadores, campos desnormalizados) cujos
+        valores não vêm do usuário.
+        """
+        update_fields = kwargs.get('update_fields')
+        if validate:
+            if update_fields is None:
+                self.clean()
+            else:
+                self.clean_written_fields(update_fields)
+        if update_fields is not None and 'updated_at' not in update_fields:
+            # auto_now só é gravado se estiver na lista; sem ele o /api/sync/
+            # incremental não enxerga a alteração
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Mantém o registro de documentos em sincronia; um CPF/RG duplicado
+            # dispara IntegrityError e desfaz o save do perfil
+            if update_fields is None or {'cpf', 'rg'} & set(update_fields):
+                IdentityDocument.sync_profile(self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            IdentityDocument.objects.filter(user_id=self.user_id).delete()
+            return super().delete(*args, **kwargs)
 
 
 class StudentProfile(BaseProfile):
@@ -242,10 +453,12 @@ class StudentProfile(BaseProfile):
         verbose_name = "Perfil de Aluno"
         verbose_name_plural = "Perfis de Alunos"
     
-    def clean(self):
-        """Validações específicas para aluno"""
-        super().clean()
-        
+    validated_fields = BaseProfile.validated_fields + ('progress', 'completed_lessons')
+    validation_dependencies = {'completed_lessons': {'total_lessons'}}
+
+    def _clean_birth_date(self):
+        super()._clean_birth_date()
+
         # Validação de idade mínima para aluno (18 anos)
         from datetime import date
         today = date.today()
@@ -255,11 +468,13 @@ class StudentProfile(BaseProfile):
         
         if age < 18:
             raise ValidationError({'birth_date': f'Aluno deve ter pelo menos 18 anos. Idade atual: {age} anos'})
-        
+
+    def _clean_progress(self):
         # Validação do progresso (0-100%)
         if self.progress < 0 or self.progress > 100:
             raise ValidationError({'progress': 'Progresso deve estar entre 0% e 100%'})
-        
+
+    def _clean_completed_lessons(self):
         # Validação das aulas
         if self.completed_lessons > self.total_lessons:
             raise ValidationError({'completed_lessons': 'Aulas concluídas não podem ser maiores que o total de aulas'})
@@ -270,7 +485,8 @@ class StudentProfile(BaseProfile):
             self.progress = int((self.completed_lessons / self.total_lessons) * 100)
         else:
             self.progress = 0
-        self.save()
+        # Só contadores: valida apenas eles, sem revalidar CPF/RG/CEP
+        self.save(update_fields=['total_lessons', 'completed_lessons', 'progress', 'updated_at'])
 
 
 class InstructorProfile(BaseProfile):
@@ -404,19 +620,21 @@ class InstructorProfile(BaseProfile):
         verbose_name = "Perfil de Instrutor"
         verbose_name_plural = "Perfis de Instrutores"
     
-    def clean(self):
-        """Validações específicas para instrutor"""
-        super().clean()
-        
+    validated_fields = BaseProfile.validated_fields + ('cnh', 'credential', 'cnh_emission_date', 'rating')
+    validation_dependencies = {'cnh_emission_date': {'birth_date'}}
+
+    def _clean_cnh(self):
         # Validação da CNH (mínimo 9 dígitos)
         cnh_digits = ''.join(filter(str.isdigit, self.cnh))
         if len(cnh_digits) < 9:
             raise ValidationError({'cnh': 'CNH deve conter pelo menos 9 dígitos'})
-        
+
+    def _clean_credential(self):
         # Validação da credencial (mínimo 5 caracteres)
         if len(self.credential.strip()) < 5:
             raise ValidationError({'credential': 'Credencial deve conter pelo menos 5 caracteres'})
-        
+
+    def _clean_cnh_emission_date(self):
         # Validação da data de emissão da CNH
         from datetime import date
         if self.cnh_emission_date > date.today():
@@ -424,7 +642,8 @@ class InstructorProfile(BaseProfile):
         
         if self.cnh_emission_date <= self.birth_date:
             raise ValidationError({'cnh_emission_date': 'Data de emissão da CNH deve ser posterior à data de nascimento'})
-        
+
+    def _clean_rating(self):
         # Validação da avaliação (0-5)
         if self.rating < 0 or self.rating > 5:
             raise ValidationError({'rating': 'Avaliação deve estar entre 0 e 5'})
@@ -466,11 +685,16 @@ class InstructorVehicle(models.Model):
     year = models.PositiveIntegerField(verbose_name="Ano")
     dual_control = models.BooleanField(default=False, verbose_name="Acionamento Duplo")
     adapted_pcd = models.BooleanField(default=False, verbose_name="Adaptado para PCD")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Veículo do Instrutor"
         verbose_name_plural = "Veículos dos Instrutores"
         unique_together = ('instructor', 'plate')
+        indexes = [
+            # Sincronização incremental (updated_since)
+            models.Index(fields=['instructor', 'updated_at'], name='vehicle_instructor_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.plate} - {self.make} {self.model} ({self.year})"
@@ -589,18 +813,75 @@ class EmployeeProfile(BaseProfile):
         verbose_name = "Perfil de Funcionário"
         verbose_name_plural = "Perfis de Funcionários"
     
-    def clean(self):
-        """Validações específicas para funcionário"""
-        super().clean()
-        
+    validated_fields = BaseProfile.validated_fields + ('position', 'salary')
+
+    def _clean_position(self):
         # Validação do cargo
         if len(self.position.strip()) < 2:
             raise ValidationError({'position': 'Cargo deve conter pelo menos 2 caracteres'})
-        
+
+    def _clean_salary(self):
         # Validação do salário (se informado)
         if self.salary and self.salary < 0:
             raise ValidationError({'salary': 'Salário não pode ser negativo'})
     
     def is_active_employee(self):
         """Verifica se o funcionário está ativo"""
-        return self.status == 'ativo'
\ No newline at end of file
+        return self.status == 'ativo'
+
+class AccountDeletion(models.Model):
+    """Exclusão de conta executada em segundo plano, em lotes.
+
+    A conta é desativada na hora; aulas, veículos, arquivos e por fim o
+    usuário são removidos aos poucos. O registro guarda o progresso e
+    sobrevive ao usuário para que a exclusão possa ser retomada.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pendente'),
+        ('running', 'Em andamento'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    )
+    STEP_CHOICES = (
+        ('lessons', 'Aulas'),
+        ('vehicles', 'Veículos'),
+        ('media', 'Arquivos'),
+        ('account', 'Conta'),
+        ('finished', 'Finalizado'),
+    )
+
+    # Sem FK: o usuário deixa de existir ao final da exclusão
+    user_pk = models.BigIntegerField(unique=True, verbose_name="ID do usuário")
+    username = models.CharField(max_length=150, verbose_name="Usuário")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    step = models.CharField(max_length=10, choices=STEP_CHOICES, default='lessons')
+    total_lessons = models.PositiveIntegerField(default=0)
+    deleted_lessons = models.PositiveIntegerField(default=0)
+    deleted_vehicles = models.PositiveIntegerField(default=0)
+    deleted_files = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    # Atualizado a cada lote; serve de heartbeat para retomar jobs abandonados
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Exclusão de Conta"
+        verbose_name_plural = "Exclusões de Conta"
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='accountdeletion_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Exclusão de {self.username} ({self.get_status_display()})"
+
+    @property
+    def percent(self):
+        """Progresso aproximado (aulas pesam quase tudo)"""
+        if self.status == 'done':
+            return 100
+        if not self.total_lessons:
+            return 0 if self.step == 'lessons' else 90
+        return min(90, int(self.deleted_lessons * 90 / self.total_lessons))
@@ -2,14 +2,16 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib import messages
 from django.http import JsonResponse
 import json
+from core.outbox import enqueue_email
 from .models import User
+from .ratelimit import ratelimit, client_ip, account_email
 
 
+@ratelimit('password-reset-ip', rate='10/h', key=client_ip, methods=('POST',))
+@ratelimit('password-reset-account', rate='3/h', key=account_email, methods=('POST',))
 def password_reset_request(request):
     """API endpoint para solicitar reset de senha via email"""
     if request.method == 'POST':
@@ -21,7 +23,7 @@ def password_reset_request(request):
                 return JsonResponse({'success': False, 'error': 'Email é obrigatório.'}, status=400)
             
             try:
-                user = User.objects.get(email=email)
+                user = User.objects.get_by_email(email)
             except User.DoesNotExist:
                 return JsonResponse({'success': True})
             
@@ -49,21 +51,9 @@ Atenciosamente,
 Equipe AutoEscola
             """
             
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                )
-                return JsonResponse({'success': True})
-            except Exception as e:
-                print(f"Erro ao enviar email: {e}")
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Erro ao enviar email. Tente novamente.'
-                }, status=500)
+            # Vai para a caixa de saída; o worker `send_outbox` faz o envio SMTP
+            enqueue_email(subject, message, [user.email or email])
+            return JsonResponse({'success': True})
                 
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'error': 'Dados inválidos.'}, status=400)
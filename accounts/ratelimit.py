@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.utils.module_loading import import_string
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Converte '10/m' em (capacidade, tokens repostos por segundo)"""
+    amount, period = rate.split('/')
+    return int(amount), int(amount) / PERIODS[period]
+
+
+class LocalMemoryBackend:
+    """Baldes de tokens em memória do processo (um worker só).
+
+    Um balde que voltou a encher equivale a um balde novo e é descartado na
+    varredura periódica. Acima de RATELIMIT_MAX_KEYS os baldes usados há
+    mais tempo saem primeiro: emails inventados no login não fazem a
+    memória crescer sem limite.
+    """
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, max_keys=None):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.max_keys = max_keys or getattr(settings, 'RATELIMIT_MAX_KEYS', 100000)
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+
+    def consume(self, key, capacity, refill_rate):
+        """Consome um token; retorna (permitido, segundos até o próximo token)"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            # pop + reinserção mantém o OrderedDict do menos ao mais recente
+            tokens, updated, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, (1 - tokens) / refill_rate
+
+    def _sweep(self, now):
+        """Descarta os baldes que já voltaram a encher"""
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+        self._next_sweep = now + self.SWEEP_INTERVAL
+
+
+class CacheBackend:
+    """Baldes de tokens no cache do Django, compartilhados entre workers.
+
+    Use com um cache compartilhado (Redis, Memcached ou DatabaseCache via
+    `createcachetable`). A leitura/escrita não é atômica: sob concorrência
+    alta alguns pedidos extras podem passar, o que é aceitável para limitar
+    abuso sem serializar os workers.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        cache_key = f'ratelimit:{key}'
+        tokens, updated = self.cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        timeout = int(capacity / refill_rate) + 1
+        if tokens >= 1:
+            self.cache.set(cache_key, (tokens - 1, now), timeout)
+            return True, 0
+        self.cache.set(cache_key, (tokens, now), timeout)
+        return False, (1 - tokens) / refill_rate
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'RATELIMIT_BACKEND', 'accounts.ratelimit.LocalMemoryBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def client_ip(request):
+    """IP do cliente; X-Forwarded-For só é usado atrás de proxy confiável"""
+    if getattr(settings, 'RATELIMIT_USE_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def account_email(request):
+    """Email informado no login (form ou JSON), normalizado para minúsculas"""
+    email = request.POST.get('email') if request.method == 'POST' else None
+    if not email and request.content_type and 'application/json' in request.content_type:
+        try:
+            data = json.loads(request.body)
+            email = data.get('email') if isinstance(data, dict) else None
+        except (ValueError, UnicodeDecodeError):
+            email = None
+    return (email or '').strip().lower() or None
+
+
+def too_many_requests(request, retry_after):
+    message = 'Muitas tentativas. Aguarde alguns instantes e tente novamente.'
+    wants_json = request.content_type and 'application/json' in request.content_type
+    if wants_json or request.path.startswith('/auth/api/'):
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def ratelimit(scope, rate, key=client_ip, methods=('GET', 'POST')):
+    """Limita a view por balde de tokens antes de qualquer hashing ou consulta.
+
+    `rate` no formato '10/m' pode ser sobrescrito em settings.RATELIMIT_RATES[scope].
+    `key` extrai do request a identidade limitada (IP, email da conta...);
+    quando retorna None o limite não se aplica.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if getattr(settings, 'RATELIMIT_ENABLED', True) and request.method in methods:
+                identity = key(request)
+                if identity:
+                    capacity, refill_rate = parse_rate(
+                        getattr(settings, 'RATELIMIT_RATES', {}).get(scope, rate)
+                    )
+                    allowed, retry_after = get_backend().consume(f'{scope}:{identity}', capacity, refill_rate)
+                    if not allowed:
+                        return too_many_requests(request, retry_after)
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
@@ -1,3 +1,617 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+from datetime import date, time as dt_time, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from lessons.models import Lesson, LessonEvent
+
+from . import deletion
+from .bloom import KnownDocuments
+from .bulk_import import RejectWriter
+from .deletion import run_account_deletion, schedule_account_deletion
+from .forms import InstructorRegistrationForm, StudentPersonalEditForm
+from .models import (
+    AccountDeletion, IdentityDocument, InstructorProfile, InstructorVehicle, StudentProfile, User, normalize_plate,
+    placeholder_document,
+)
+from .ratelimit import LocalMemoryBackend, parse_rate
+from .usernames import create_user_with_unique_username, next_free_username
+
+
+class UsernameAllocationTests(TestCase):
+    def test_free_base_is_used_as_is(self):
+        self.assertEqual(next_free_username('maria'), 'maria')
+
+    def test_next_suffix_after_the_highest(self):
+        for username in ('maria', 'maria2', 'maria10', 'mariana', 'maria_3'):
+            User.objects.create_user(username)
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free_username('maria'), 'maria11')
+
+    def test_suffixes_only_count_when_base_is_taken(self):
+        User.objects.create_user('joao7')
+        self.assertEqual(next_free_username('joao'), 'joao')
+
+    def test_collisions_get_sequential_usernames(self):
+        users = [create_user_with_unique_username('ana', email=f'ana{i}@teste.com') for i in range(3)]
+        self.assertEqual([user.username for user in users], ['ana', 'ana1', 'ana2'])
+
+    def test_concurrent_allocation_retries_on_username_collision(self):
+        User.objects.create_user('pedro')
+        # Outro request levou "pedro1" entre o cálculo e o INSERT
+        with mock.patch('accounts.usernames.next_free_username', side_effect=['pedro', 'pedro1']):
+            user = create_user_with_unique_username('pedro', email='pedro@teste.com')
+        self.assertEqual(user.username, 'pedro1')
+
+    def test_email_collision_is_not_retried(self):
+        User.objects.create_user('carla', email='carla@teste.com')
+        with mock.patch('accounts.usernames.next_free_username', wraps=next_free_username) as allocate:
+            with self.assertRaises(IntegrityError):
+                create_user_with_unique_username('carla', email='CARLA@teste.com')
+        self.assertEqual(allocate.call_count, 1)
+
+
+class IdentityDocumentRegistryTests(TestCase):
+    def profile(self, username, cpf, rg):
+        user = User.objects.create_user(username, role='aluno')
+        profile = StudentProfile(
+            user=user, full_name=username, email=f'{username}@teste.com', phone='11999999999',
+            birth_date=date(1990, 1, 1), cpf=cpf, rg=rg, cep='01001-000', address='Rua A', address_number='1',
+        )
+        profile.save(validate=False)
+        return profile
+
+    def test_profile_documents_are_registered_normalized(self):
+        profile = self.profile('registro', '529.982.247-25', '12.345.678-X')
+        self.assertEqual(
+            set(IdentityDocument.objects.filter(user=profile.user).values_list('kind', 'number')),
+            {('cpf', '52998224725'), ('rg', '12345678X')},
+        )
+        self.assertTrue(IdentityDocument.is_taken('cpf', '52998224725'))
+        self.assertFalse(IdentityDocument.is_taken('cpf', '52998224725', exclude_user=profile.user))
+
+    def test_document_is_unique_across_profile_tables(self):
+        self.profile('primeiro', '529.982.247-25', '111111111')
+        user = User.objects.create_user('instrutor_dup', role='instrutor')
+        instructor = InstructorProfile(
+            user=user, full_name='Dup', email='dup@teste.com', phone='11999999999', birth_date=date(1980, 1, 1),
+            cpf='52998224725', rg='222222222', cep='01001-000', address='Rua A', address_number='1',
+            cnh='123456789', cnh_emission_date=date(2000, 1, 1), credential='CRED-DUP',
+        )
+        with self.assertRaises(IntegrityError):
+            instructor.save(validate=False)
+        self.assertFalse(InstructorProfile.objects.filter(user=user).exists())
+
+    def test_changed_document_replaces_the_registered_one(self):
+        profile = self.profile('troca', '529.982.247-25', '111111111')
+        profile.cpf = '111.444.777-35'
+        profile.save(update_fields=['cpf'], validate=False)
+        self.assertFalse(IdentityDocument.is_taken('cpf', '52998224725'))
+        self.assertTrue(IdentityDocument.is_taken('cpf', '11144477735'))
+
+    def test_api_placeholder_documents_are_not_registered(self):
+        response = self.client.post('/auth/api/register/aluno/', json.dumps({
+            'email': 'api@teste.com', 'password': 'senha123', 'full_name': 'Aluno API', 'phone': '(11) 99999-9999',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        user = User.objects.get(email='api@teste.com')
+        self.assertEqual(user.studentprofile_profile.cpf, placeholder_document(user.pk))
+        self.assertFalse(IdentityDocument.objects.filter(user=user).exists())
+
+        profile = user.studentprofile_profile
+        profile.cpf = '529.982.247-25'
+        profile.save(update_fields=['cpf'], validate=False)
+        self.assertEqual(list(IdentityDocument.objects.filter(user=user).values_list('kind', flat=True)), ['cpf'])
+
+
+@override_settings(IDENTITY_BLOOM_REBUILD_SECONDS=300)
+class KnownDocumentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('bloom')
+        IdentityDocument.objects.create(user=user, kind='cpf', number='52998224725')
+
+    def setUp(self):
+        self.documents = KnownDocuments()
+
+    def test_absent_document_skips_the_database(self):
+        self.documents.rebuild()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.documents.is_taken('cpf', '111.444.777-35'))
+
+    def test_registered_document_is_confirmed_in_the_database(self):
+        self.documents.rebuild()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.documents.is_taken('cpf', '529.982.247-25'))
+
+    def test_first_use_builds_the_filter(self):
+        self.assertTrue(self.documents.is_taken('cpf', '52998224725'))
+
+    def test_documents_saved_by_this_process_are_added(self):
+        self.documents.rebuild()
+        self.documents.add('rg', '12345678X')
+        self.assertTrue(self.documents.might_exist('rg', '12.345.678-x'))
+
+    def test_stale_filter_picks_up_other_workers_documents(self):
+        self.documents.rebuild()
+        # Cadastro feito por outro worker: não passa pelo add deste processo
+        IdentityDocument.objects.create(user=User.objects.create_user('outro'), kind='cpf', number='11144477735')
+        self.assertFalse(self.documents.might_exist('cpf', '11144477735'))
+        with override_settings(IDENTITY_BLOOM_REBUILD_SECONDS=0):
+            self.assertTrue(self.documents.might_exist('cpf', '11144477735'))
+
+    def test_waiting_requests_reuse_a_concurrent_rebuild(self):
+        builds = []
+        build = self.documents._build
+        self.documents._build = lambda: (builds.append(1), build())
+        checked = threading.Event()
+        is_stale = self.documents._is_stale
+
+        def signalling_is_stale():
+            checked.set()
+            return is_stale()
+
+        self.documents._is_stale = signalling_is_stale
+        with self.documents._lock:
+            waiting = threading.Thread(target=self.documents._rebuild_if_stale)
+            waiting.start()
+            checked.wait(5)
+            # Outro request reconstrói enquanto este espera pelo lock
+            self.documents._build()
+        waiting.join(5)
+        self.assertEqual(len(builds), 1)
+
+
+class EmailLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('email', email='Maria.Silva@Teste.com', password='senha123')
+        User.objects.create_user('sem_email')
+
+    def test_lookup_ignores_case_and_whitespace(self):
+        self.assertEqual(User.objects.get_by_email('  maria.silva@TESTE.com '), self.user)
+
+    def test_blank_email_matches_nobody(self):
+        self.assertFalse(User.objects.filter_by_email('').exists())
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plano de execução no formato do SQLite')
+    def test_lookup_uses_the_partial_unique_index(self):
+        plan = User.objects.filter_by_email('maria.silva@teste.com').explain()
+        self.assertIn('USING INDEX unique_user_email_ci', plan)
+        self.assertNotIn('SCAN accounts_user', plan)
+
+    def test_login_by_email(self):
+        response = self.client.post('/auth/api/login/', json.dumps({
+            'email': 'MARIA.SILVA@teste.com', 'password': 'senha123',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+
+class UniqueEmailMigrationTests(TransactionTestCase):
+    """0012 para com a lista de contas antes de criar o índice único de email"""
+
+    before = [('accounts', '0011_identitydocument')]
+    after = [('accounts', '0012_user_unique_email_ci')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_case_insensitive_duplicates_stop_the_migration(self):
+        OldUser = self.migrate(self.before).get_model('accounts', 'User')
+        OldUser.objects.create(username='ana', email='Ana@Teste.com')
+        OldUser.objects.create(username='ana2', email='ana@teste.com')
+        OldUser.objects.create(username='bia', email='bia@teste.com')
+        OldUser.objects.create(username='sem_email_1', email='')
+        OldUser.objects.create(username='sem_email_2', email='')
+
+        with self.assertRaises(RuntimeError) as raised:
+            self.migrate(self.after)
+        message = str(raised.exception)
+        self.assertIn('1 email(s)', message)
+        self.assertIn('username=ana email=Ana@Teste.com', message)
+        self.assertIn('username=ana2 email=ana@teste.com', message)
+        self.assertNotIn('bia', message)
+
+        OldUser.objects.filter(username='ana2').update(email='ana.2@teste.com')
+        NewUser = self.migrate(self.after).get_model('accounts', 'User')
+        with self.assertRaises(IntegrityError):
+            NewUser.objects.create(username='ana3', email='ANA@teste.com')
+
+
+class LocalMemoryBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('accounts.ratelimit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = LocalMemoryBackend(max_keys=3)
+
+    def test_bucket_empties_and_refills(self):
+        capacity, refill_rate = parse_rate('3/m')
+        self.assertEqual([self.backend.consume('k', capacity, refill_rate)[0] for _ in range(4)],
+                         [True, True, True, False])
+        self.assertAlmostEqual(self.backend.consume('k', capacity, refill_rate)[1], 20)
+        self.now += 20
+        self.assertTrue(self.backend.consume('k', capacity, refill_rate)[0])
+        self.assertFalse(self.backend.consume('k', capacity, refill_rate)[0])
+
+    def test_keys_are_independent(self):
+        self.backend.consume('a', 1, 1 / 60)
+        self.assertFalse(self.backend.consume('a', 1, 1 / 60)[0])
+        self.assertTrue(self.backend.consume('b', 1, 1 / 60)[0])
+
+    def test_refilled_buckets_are_swept(self):
+        self.backend.consume('curto', 1, 1)
+        self.backend.consume('longo', 5, 1 / 600)
+        self.now += LocalMemoryBackend.SWEEP_INTERVAL
+        self.backend.consume('novo', 1, 1)
+        self.assertEqual(list(self.backend._buckets), ['longo', 'novo'])
+
+    def test_key_count_is_capped_least_recently_used_first(self):
+        for key in ('a', 'b', 'c'):
+            self.backend.consume(key, 5, 1 / 60)
+        self.backend.consume('a', 5, 1 / 60)
+        self.backend.consume('d', 5, 1 / 60)
+        self.assertEqual(list(self.backend._buckets), ['c', 'a', 'd'])
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_RATES={},
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginRateLimitTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('accounts.ratelimit._backend', LocalMemoryBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, email):
+        return self.client.post('/auth/api/login/', json.dumps({'email': email, 'password': 'errada'}),
+                                content_type='application/json')
+
+    def test_account_scope_answers_429_with_retry_after(self):
+        statuses = [self.login('Alvo@teste.com').status_code for _ in range(5)]
+        self.assertNotIn(429, statuses)
+        response = self.login('alvo@TESTE.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('error', response.json())
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Outra conta a partir do mesmo IP continua liberada
+        self.assertNotEqual(self.login('outra@teste.com').status_code, 429)
+
+    @override_settings(RATELIMIT_RATES={'login-ip': '3/m'})
+    def test_ip_scope_limits_across_accounts(self):
+        statuses = [self.login(f'conta{i}@teste.com').status_code for i in range(4)]
+        self.assertEqual(statuses.count(429), 1)
+        self.assertEqual(statuses[-1], 429)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_disabled(self):
+        self.assertFalse(any(self.login('alvo@teste.com').status_code == 429 for _ in range(8)))
+
+
+STUDENT_COLUMNS = ('full_name', 'email', 'phone', 'birth_date', 'cpf', 'rg', 'cep', 'address', 'address_number')
+
+
+def student_row(email, cpf, rg, **fields):
+    row = {'full_name': 'Aluno Importado', 'email': email, 'phone': '(11) 98888-7777', 'birth_date': '15/03/1995',
+           'cpf': cpf, 'rg': rg, 'cep': '01001-000', 'address': 'Rua A', 'address_number': '10'}
+    row.update(fields)
+    return row
+
+
+class ImportStudentsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def run_import(self, rows, name='alunos.csv', **options):
+        path = self.directory / name
+        if name.endswith('.jsonl'):
+            path.write_text(''.join(json.dumps(row) + '\n' for row in rows), encoding='utf-8')
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as handle:
+                writer = csv.DictWriter(handle, fieldnames=STUDENT_COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+        call_command('import_students', str(path), stdout=io.StringIO(), stderr=io.StringIO(), **options)
+        return path
+
+    def rejects(self, path):
+        with open(RejectWriter.default_path(str(path)), newline='', encoding='utf-8') as handle:
+            return {int(row['line']): row['errors'] for row in csv.DictReader(handle)}
+
+    def test_imports_profiles_and_documents(self):
+        self.run_import([student_row('ana@teste.com', '529.982.247-25', '12.345.678-9')])
+        user = User.objects.get(email='ana@teste.com')
+        self.assertEqual(user.role, 'aluno')
+        self.assertEqual(user.studentprofile_profile.cpf, '529.982.247-25')
+        self.assertEqual(set(user.identity_documents.values_list('kind', 'number')),
+                         {('cpf', '52998224725'), ('rg', '123456789')})
+
+    def test_duplicates_in_the_file_and_in_the_database_are_rejected(self):
+        existing = User.objects.create_user('existente', email='ja@teste.com', role='funcionario')
+        IdentityDocument.objects.create(user=existing, kind='cpf', number='11144477735')
+        path = self.run_import([
+            student_row('ana@teste.com', '529.982.247-25', '111111111'),
+            student_row('ana2@teste.com', '52998224725', '222222222'),   # CPF repetido no arquivo
+            student_row('bia@teste.com', '111.444.777-35', '333333333'),  # CPF já cadastrado
+            student_row('JA@teste.com', '935.411.347-80', '444444444'),   # email já cadastrado
+            student_row('cpf@teste.com', '123.456.789-00', '555555555'),  # CPF inválido
+        ], chunk_size=2)
+        self.assertEqual(list(User.objects.filter(role='aluno').values_list('email', flat=True)), ['ana@teste.com'])
+        rejects = self.rejects(path)
+        self.assertEqual(sorted(rejects), [3, 4, 5, 6])
+        self.assertIn('cpf: Duplicado no arquivo', rejects[3])
+        self.assertIn('CPF já cadastrado', rejects[4])
+        self.assertIn('Email já cadastrado', rejects[5])
+        self.assertIn('CPF inválido', rejects[6])
+
+    def test_jsonl_with_broken_line(self):
+        path = self.directory / 'alunos.jsonl'
+        path.write_text(json.dumps(student_row('ana@teste.com', '529.982.247-25', '111111111')) + '\n{quebrada\n',
+                        encoding='utf-8')
+        call_command('import_students', str(path), stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertTrue(User.objects.filter(email='ana@teste.com').exists())
+        rejected = [json.loads(line) for line in Path(RejectWriter.default_path(str(path))).read_text().splitlines()]
+        self.assertEqual([(row['line'], row['errors']) for row in rejected], [(2, {'__all__': 'JSON inválido'})])
+
+    def test_dry_run_writes_nothing(self):
+        self.run_import([student_row('ana@teste.com', '529.982.247-25', '111111111')], dry_run=True)
+        self.assertFalse(User.objects.filter(email='ana@teste.com').exists())
+
+    def test_usernames_follow_the_api_scheme(self):
+        User.objects.create_user('ana', role='funcionario')
+        User.objects.create_user('ana4', role='funcionario')
+        self.run_import([
+            student_row('ana@teste.com', '529.982.247-25', '111111111'),
+            student_row('ana@outro.com', '111.444.777-35', '222222222'),
+            student_row('bia@teste.com', '935.411.347-80', '333333333'),
+        ])
+        self.assertEqual(
+            list(User.objects.filter(role='aluno').order_by('email').values_list('email', 'username')),
+            [('ana@outro.com', 'ana6'), ('ana@teste.com', 'ana5'), ('bia@teste.com', 'bia')],
+        )
+
+
+class ImportInstructorsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, rows):
+        path = self.directory / name
+        path.write_text(''.join(json.dumps(row) + '\n' for row in rows), encoding='utf-8')
+        return str(path)
+
+    def test_instructors_and_fleet(self):
+        instructors = self.write('instrutores.jsonl', [
+            student_row('carlos@teste.com', '529.982.247-25', '111111111', birth_date='1980-01-01',
+                        cnh='123456789', cnh_emission_date='2000-01-01', credential='CRED-001'),
+            student_row('dani@teste.com', '111.444.777-35', '222222222', birth_date='1980-01-01',
+                        cnh='123456789', cnh_emission_date='2000-01-01', credential='CRED-001'),
+        ])
+        vehicle = {'model': 'Onix', 'make': 'GM', 'color': 'Prata', 'year': '2022', 'renavam': '12345678901',
+                   'instructor_cpf': '529.982.247-25'}
+        vehicles = self.write('veiculos.jsonl', [
+            {**vehicle, 'plate': 'abc-1d23'},
+            {**vehicle, 'plate': 'ABC1D23'},                               # mesma placa normalizada
+            {**vehicle, 'plate': 'XYZ1234', 'instructor_cpf': '111.444.777-35'},  # instrutor rejeitado
+        ])
+        with self.assertLogs('accounts.management.commands.import_instructors', 'WARNING') as logs:
+            call_command('import_instructors', instructors, vehicles=vehicles, stdout=io.StringIO())
+        self.assertEqual(len(logs.records), 3)
+
+        profile = InstructorProfile.objects.get()
+        self.assertEqual((profile.user.username, profile.status), ('carlos', 'pendente'))
+        self.assertEqual(list(profile.vehicles.values_list('plate', flat=True)), ['ABC1D23'])
+        rejects = [json.loads(line) for line in Path(RejectWriter.default_path(vehicles)).read_text().splitlines()]
+        self.assertEqual([row['errors'] for row in rejects], [
+            {'plate': 'Duplicado no arquivo'}, {'instructor_cpf': 'Instrutor não encontrado'},
+        ])
+
+    def test_dry_run_rolls_back(self):
+        instructors = self.write('instrutores.jsonl', [
+            student_row('carlos@teste.com', '529.982.247-25', '111111111', birth_date='1980-01-01',
+                        cnh='123456789', cnh_emission_date='2000-01-01', credential='CRED-001'),
+        ])
+        call_command('import_instructors', instructors, dry_run=True, stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(email='carlos@teste.com').exists())
+
+
+class InstructorExtraVehiclesTests(SimpleTestCase):
+    def test_extra_vehicle_repeating_the_primary_plate_is_ignored(self):
+        form = InstructorRegistrationForm()
+        vehicle = {'model': 'Onix', 'make': 'GM', 'color': 'Prata', 'year': '2022', 'renavam': '12345678901'}
+        form.cleaned_data = {'extra_vehicles': json.dumps([
+            {**vehicle, 'plate': 'abc-1d23'}, {**vehicle, 'plate': 'XYZ-1234'},
+        ])}
+        with self.assertLogs('accounts.forms', 'WARNING'):
+            extras = form._extra_vehicles(InstructorProfile(), {normalize_plate('ABC-1D23')})
+        self.assertEqual([vehicle.plate for vehicle in extras], ['XYZ1234'])
+
+
+@override_settings(ACCOUNT_DELETION_RUN_IN_THREAD=False)
+class ProfileSaveValidationTests(TestCase):
+    """save(update_fields=...) só executa as validações dos campos gravados"""
+
+    def setUp(self):
+        user = User.objects.create_user('aluno_validacao', role='aluno')
+        self.profile = StudentProfile(
+            user=user, full_name='Aluno', email='aluno_validacao@teste.com', phone='11999999999',
+            birth_date=date(2000, 1, 1), cpf='529.982.247-25', rg='111', cep='01001-000',
+            address='Rua A', address_number='1', total_lessons=4, completed_lessons=2,
+        )
+        # RG inválido gravado sem validação (ex.: dado legado)
+        self.profile.save(validate=False)
+
+    def test_full_save_validates_every_field(self):
+        with self.assertRaises(ValidationError) as raised:
+            self.profile.save()
+        self.assertIn('rg', raised.exception.message_dict)
+
+    def test_partial_save_skips_unrelated_validations(self):
+        self.profile.cep = '20040020'
+        with mock.patch.object(StudentProfile, '_clean_rg') as clean_rg:
+            self.profile.save(update_fields=['cep'])
+        clean_rg.assert_not_called()
+        self.assertEqual(StudentProfile.objects.get(pk=self.profile.pk).cep, '20040020')
+
+    def test_partial_save_validates_written_fields(self):
+        self.profile.cep = '123'
+        with self.assertRaises(ValidationError) as raised:
+            self.profile.save(update_fields=['cep'])
+        self.assertIn('cep', raised.exception.message_dict)
+        self.assertEqual(StudentProfile.objects.get(pk=self.profile.pk).cep, '01001-000')
+
+    def test_partial_save_runs_dependent_validations(self):
+        # completed_lessons lê total_lessons: gravar só total_lessons ainda o valida
+        self.profile.total_lessons = 1
+        with self.assertRaises(ValidationError) as raised:
+            self.profile.save(update_fields=['total_lessons'])
+        self.assertIn('completed_lessons', raised.exception.message_dict)
+
+    def test_validate_false_skips_validation(self):
+        self.profile.cep = '123'
+        self.profile.save(update_fields=['cep'], validate=False)
+        self.assertEqual(StudentProfile.objects.get(pk=self.profile.pk).cep, '123')
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('aluno_exclusao', role='aluno')
+        self.instructor = User.objects.create_user('instrutor_exclusao', role='instrutor')
+        profile = InstructorProfile(
+            user=self.instructor, full_name='Instrutor', email='instrutor@teste.com', phone='11999999999',
+            birth_date=date(1980, 1, 1), cpf='529.982.247-25', rg='111111111', cep='01001-000', address='Rua A',
+            address_number='1', cnh='123456789', cnh_emission_date=date(2000, 1, 1), credential='CRED-EXC',
+        )
+        profile.save(validate=False)
+        for plate in ('ABC1D23', 'XYZ1234'):
+            InstructorVehicle.objects.create(instructor=profile, plate=plate, renavam='12345678901', model='Onix',
+                                             make='GM', color='Prata', year=2022)
+        Lesson.objects.bulk_create([
+            Lesson(student=self.student, instructor=self.instructor, numero='1', status='scheduled',
+                   date=date(2030, 1, 1) + timedelta(days=i), time=dt_time(9))
+            for i in range(5)
+        ])
+
+    def test_schedule_deactivates_and_records_the_job(self):
+        job = schedule_account_deletion(self.instructor)
+        self.instructor.refresh_from_db()
+        self.assertFalse(self.instructor.is_active)
+        self.assertEqual((job.status, job.step, job.total_lessons), ('pending', 'lessons', 5))
+        self.assertEqual(schedule_account_deletion(self.instructor).pk, job.pk)
+
+    def test_runs_in_batches_until_the_account_is_gone(self):
+        job = schedule_account_deletion(self.instructor)
+        self.assertTrue(run_account_deletion(job.pk, size=2))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.step), ('done', 'finished'))
+        self.assertEqual((job.deleted_lessons, job.deleted_vehicles), (5, 2))
+        self.assertFalse(User.objects.filter(pk=self.instructor.pk).exists())
+        self.assertFalse(IdentityDocument.objects.filter(user_id=self.instructor.pk).exists())
+        # A outra parte recebe os tombstones das aulas removidas
+        self.assertEqual(LessonEvent.objects.filter(user=self.student, type='lesson.deleted').count(), 5)
+
+    def test_failed_job_resumes_where_it_stopped(self):
+        job = schedule_account_deletion(self.instructor)
+        with mock.patch.dict(deletion.STEPS, vehicles=mock.Mock(side_effect=OSError('disco cheio'))), \
+                self.assertLogs('accounts.deletion', 'ERROR'):
+            self.assertFalse(run_account_deletion(job.pk, size=2))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.step, job.error), ('failed', 'vehicles', 'disco cheio'))
+        self.assertEqual(job.deleted_lessons, 5)
+        self.assertTrue(User.objects.filter(pk=self.instructor.pk).exists())
+
+        output = io.StringIO()
+        call_command('process_account_deletions', stdout=output)
+        self.assertIn('1 exclusão(ões) concluída(s)', output.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.deleted_lessons), ('done', 2, 5))
+        self.assertFalse(User.objects.filter(pk=self.instructor.pk).exists())
+
+    def test_running_job_is_only_reclaimed_once_stale(self):
+        job = schedule_account_deletion(self.instructor)
+        AccountDeletion.objects.filter(pk=job.pk).update(status='running')
+        self.assertFalse(run_account_deletion(job.pk))
+        AccountDeletion.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(run_account_deletion(job.pk))
+
+    def test_jobs_over_max_attempts_are_left_alone(self):
+        job = schedule_account_deletion(self.instructor)
+        AccountDeletion.objects.filter(pk=job.pk).update(status='failed', attempts=5)
+        call_command('process_account_deletions', stdout=io.StringIO())
+        self.assertTrue(User.objects.filter(pk=self.instructor.pk).exists())
+
+
+class StudentCepChangeSyncTests(TestCase):
+    """Trocar o CEP remove as aulas em aberto e o /api/sync/ incremental enxerga tudo"""
+
+    def setUp(self):
+        self.student = User.objects.create_user('aluno_cep', email='aluno_cep@teste.com', role='aluno',
+                                                full_name='Aluno Cep')
+        self.instructor = User.objects.create_user('instrutor_cep', role='instrutor')
+        self.profile = StudentProfile(
+            user=self.student, full_name='Aluno Cep', email='aluno_cep@teste.com', phone='11999999999',
+            birth_date=date(2000, 1, 1), cpf='529.982.247-25', rg='111111111', cep='01001-000',
+            address='Rua A', address_number='1',
+        )
+        self.profile.save(validate=False)
+        self.open_lessons = [
+            Lesson.objects.create(student=self.student, instructor=self.instructor, numero='1', status=status,
+                                  date=date(2030, 1, 1), time=dt_time(9))
+            for status in ('pending', 'scheduled')
+        ]
+        self.completed = Lesson.objects.create(student=self.student, instructor=self.instructor, numero='1',
+                                               status='completed', date=date(2024, 1, 1), time=dt_time(9))
+        past = timezone.now() - timedelta(hours=1)
+        Lesson.objects.update(updated_at=past)
+        StudentProfile.objects.update(updated_at=past)
+        self.cursor = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+    def change_cep(self, cep):
+        form = StudentPersonalEditForm(
+            {'full_name': 'Aluno Cep', 'username': 'aluno_cep', 'email': 'aluno_cep@teste.com', 'cep': cep},
+            user=self.student, profile=self.profile,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_sync_returns_tombstones_for_lessons_removed_by_cep_change(self):
+        result = self.change_cep('20040-020')
+        self.assertEqual(result['cancelled_lessons'], 2)
+        self.assertEqual(list(Lesson.objects.values_list('pk', flat=True)), [self.completed.pk])
+        # Tombstone para as duas partes de cada aula
+        self.assertEqual(LessonEvent.objects.filter(user=self.instructor, type='lesson.deleted').count(), 2)
+
+        self.client.force_login(self.student)
+        data = self.client.get('/api/sync/', {'updated_since': self.cursor}).json()
+        self.assertFalse(data['full'])
+        self.assertCountEqual(data['deleted_lessons'], [lesson.pk for lesson in self.open_lessons])
+        self.assertEqual(data['lessons'], [])
+        self.assertEqual(data['profile']['cep'], '20040-020')
+
+    def test_partial_profile_save_bumps_updated_at(self):
+        before = StudentProfile.objects.get(pk=self.profile.pk).updated_at
+        self.profile.gender_identity = self.profile.gender_identity or 'nao_informar'
+        self.profile.save(update_fields=['gender_identity'], validate=False)
+        self.assertGreater(StudentProfile.objects.get(pk=self.profile.pk).updated_at, before)
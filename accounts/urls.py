@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views, api_views
-from .delete_views import delete_account_view
+from .delete_views import delete_account_view, delete_account_status_view
 
 urlpatterns = [
     # Autenticação
@@ -34,4 +34,5 @@ urlpatterns = [
 
     # Exclusão de cadastro
     path('delete-account/', delete_account_view, name='delete_account'),
+    path('delete-account/status/<str:token>/', delete_account_status_view, name='delete_account_status'),
 ]
\ No newline at end of file
@@ -0,0 +1,83 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+
+from .models import User
+
+
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+MAX_ATTEMPTS = 5
+# Sufixos com mais dígitos não cabem num inteiro de 32 bits e não entram no máximo
+MAX_SUFFIX_DIGITS = 9
+
+
+def username_base(base):
+    return (base or 'usuario')[:USERNAME_MAX_LENGTH - 6]
+
+
+def highest_suffix(base):
+    """Retorna (base em uso?, maior sufixo numérico de `<base><n>`) numa consulta agregada"""
+    suffixed = Q(username__regex=rf'^{re.escape(base)}[0-9]{{1,{MAX_SUFFIX_DIGITS}}}$')
+    taken = User.objects.filter(username__startswith=base).aggregate(
+        base_taken=Count('pk', filter=Q(username=base)),
+        highest=Max(Cast(Substr('username', len(base) + 1), IntegerField()), filter=suffixed),
+    )
+    return bool(taken['base_taken']), taken['highest'] or 0
+
+
+def next_free_username(base):
+    """Retorna o próximo username livre para `base` com uma única consulta.
+
+    O banco devolve só se `base` está em uso e o maior sufixo numérico de
+    `<base><n>`; o resultado é `base` se estiver livre, ou `base` + (maior
+    sufixo + 1) caso contrário.
+    """
+    base = username_base(base)
+    base_taken, highest = highest_suffix(base)
+    if not base_taken:
+        return base
+    return f'{base}{highest + 1}'
+
+
+def next_free_usernames(bases):
+    """Usernames livres para várias bases de uma vez, no mesmo esquema de next_free_username.
+
+    Uma consulta para todas as bases e uma por base já em uso (no banco ou
+    repetida na lista); os nomes gerados também não colidem entre si.
+    """
+    bases = [username_base(base) for base in bases]
+    taken = set(User.objects.filter(username__in=set(bases)).values_list('username', flat=True))
+    suffixes = {}
+    usernames = []
+    for base in bases:
+        if base not in taken:
+            username = base
+        else:
+            if base not in suffixes:
+                suffixes[base] = highest_suffix(base)[1]
+            suffixes[base] += 1
+            while f'{base}{suffixes[base]}' in taken:
+                suffixes[base] += 1
+            username = f'{base}{suffixes[base]}'
+        taken.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def create_user_with_unique_username(base, **fields):
+    """Cria o usuário com o próximo username livre a partir de `base`.
+
+    Em cadastros concorrentes dois requests podem calcular o mesmo sufixo;
+    o índice único de `username` rejeita o segundo, que recalcula e tenta de novo.
+    Outras violações (email já cadastrado, por exemplo) sobem na hora.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        username = next_free_username(base)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(username=username, **fields)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not User.objects.filter(username=username).exists():
+                raise
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse 
@@ -25,8 +25,11 @@ from .forms import (
     InstructorVehicleForm,
 )
 from .models import User, StudentProfile, InstructorProfile, EmployeeProfile, InstructorVehicle
+from .ratelimit import ratelimit, client_ip, account_email
 
 
+@ratelimit('login-ip', rate='20/m', key=client_ip, methods=('POST',))
+@ratelimit('login-account', rate='5/m', key=account_email, methods=('POST',))
 def login_view(request):
     """Login view com validações específicas"""
     if request.user.is_authenticated:
@@ -41,26 +44,16 @@ def login_view(request):
     if request.method == 'POST':
         form = UserLoginForm(request.POST)
         if form.is_valid():
-            email = form.cleaned_data['email']
-            password = form.cleaned_data['password']
-            
-            try:
-                user = User.objects.get(email=email)
-                user_auth = authenticate(username=user.username, password=password)
-                
-                if user_auth:
-                    login(request, user_auth)
-                    # Redireciona baseado no role
-                    if user_auth.role == 'instrutor':
-                        return redirect('instrutor_dashboard')
-                    elif user_auth.role == 'funcionario':
-                        return redirect('funcionario_dashboard')
-                    else:
-                        return redirect('aluno_dashboard')
-                
-            except User.DoesNotExist:
-                # Isso já foi tratado no formulário
-                pass
+            # O formulário já buscou o usuário e conferiu a senha
+            user_auth = form.get_user()
+            login(request, user_auth, backend='accounts.backends.EmailBackend')
+            # Redireciona baseado no role
+            if user_auth.role == 'instrutor':
+                return redirect('instrutor_dashboard')
+            elif user_auth.role == 'funcionario':
+                return redirect('funcionario_dashboard')
+            else:
+                return redirect('aluno_dashboard')
     else:
         form = UserLoginForm()
     
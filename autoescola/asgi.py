@@ -3,6 +3,11 @@ ASGI config for autoescola project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Required for the lesson events stream (/api/lesson-events/), which is an async
+view; serve with an ASGI server, e.g. ``uvicorn autoescola.asgi:application``
+or ``daphne autoescola.asgi:application``. Under WSGI the stream answers 204
+and the dashboards poll /api/lesson-events/poll/ instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -12,7 +12,10 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from copy import deepcopy
+from decouple import config, Csv
+
+from .sqlite import sqlite_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     # Local apps
     'core',
     'accounts',
@@ -47,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routers.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'autoescola.urls'
@@ -82,12 +88,83 @@ WSGI_APPLICATION = 'autoescola.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_ENGINE=postgres usa PostgreSQL com as variáveis DB_* (também nos testes:
+# o banco de teste é DB_TEST_NAME); sem ela, SQLite local.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='autoescola'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default=5432, cast=int),
+            # Verifica a conexão reaproveitada antes de usar (ex.: após restart do banco)
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                'sslmode': config('DB_SSLMODE', default='prefer'),
+                'application_name': 'autoescola',
+            },
+            'TEST': {
+                'NAME': config('DB_TEST_NAME', default='test_autoescola'),
+            },
+        }
+    }
+    # Pool embutido do Django (psycopg 3 + psycopg-pool), por processo;
+    # pool e CONN_MAX_AGE são exclusivos, então com pool as conexões voltam ao pool
+    if config('DB_POOL', default=True, cast=bool):
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+    else:
+        # Sem pool: conexão persistente por thread, reaproveitada por até N segundos
+        DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+else:
+    # SQLite com WAL, pragmas e BEGIN IMMEDIATE (ver autoescola/sqlite.py);
+    # SQLITE_PROFILE=default volta ao comportamento padrão do Django
+    SQLITE_PROFILE = config('SQLITE_PROFILE', default='tuned')
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': sqlite_options(
+                SQLITE_PROFILE,
+                busy_timeout=config('SQLITE_BUSY_TIMEOUT_MS', default=None),
+            ),
+        }
+    }
+
+# Réplicas de leitura para as views marcadas com replica_reads (ver core/routers.py).
+# PostgreSQL: DB_REPLICA_HOSTS=host1,host2 cria replica1, replica2... com as mesmas
+# credenciais. SQLite: DB_SIMULATE_REPLICA=True abre o próprio db.sqlite3 como 'replica'
+# somente leitura (uma segunda conexão), para testar o roteamento localmente.
+# Nos testes as réplicas espelham o banco de teste principal (MIRROR).
+DATABASE_REPLICAS = []
+if DB_ENGINE == 'postgres':
+    for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+        replica = deepcopy(DATABASES['default'])
+        replica.update(HOST=host, TEST={'MIRROR': 'default'})
+        DATABASES[f'replica{index}'] = replica
+        DATABASE_REPLICAS.append(f'replica{index}')
+elif config('DB_SIMULATE_REPLICA', default=False, cast=bool):
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'OPTIONS': sqlite_options(SQLITE_PROFILE, read_only=True),
+        'TEST': {'MIRROR': 'default'},
     }
-}
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Segundos em que a sessão lê do principal após um POST (ler as próprias escritas)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
 
 
 # Password validation
@@ -150,6 +227,12 @@ LOGOUT_REDIRECT_URL = '/auth/login/'
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Login por email (case-insensitive); ModelBackend mantém o login por username no admin
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # CSRF Settings
 CSRF_COOKIE_HTTPONLY = False
 CSRF_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -190,6 +273,56 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# API REST (lessons/urls.py)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'lessons.pagination.LessonCursorPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Serialização JSON das APIs: 'auto' usa orjson se instalado, senão a biblioteca padrão
+JSON_BACKEND = config('JSON_BACKEND', default='auto')
+
+# Rate limiting (balde de tokens) para login e APIs de consulta
+# Em produção com vários workers use 'accounts.ratelimit.CacheBackend' com cache compartilhado
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_BACKEND = config('RATELIMIT_BACKEND', default='accounts.ratelimit.LocalMemoryBackend')
+RATELIMIT_USE_X_FORWARDED_FOR = config('RATELIMIT_USE_X_FORWARDED_FOR', default=False, cast=bool)
+RATELIMIT_RATES = {}  # Ex.: {'login-account': '10/m'}
+RATELIMIT_MAX_KEYS = config('RATELIMIT_MAX_KEYS', default=100000, cast=int)  # Baldes por worker no LocalMemoryBackend
+
+# Exclusão de contas em segundo plano (ver accounts/deletion.py)
+# Agende `python manage.py process_account_deletions` no cron para retomar jobs interrompidos
+ACCOUNT_DELETION_RUN_IN_THREAD = config('ACCOUNT_DELETION_RUN_IN_THREAD', default=True, cast=bool)
+ACCOUNT_DELETION_BATCH_SIZE = config('ACCOUNT_DELETION_BATCH_SIZE', default=500, cast=int)
+ACCOUNT_DELETION_STALE_SECONDS = 600
+
+# Eventos de aula em tempo real (SSE, lessons/events.py); o stream exige ASGI
+# Com vários processos, POLL_SECONDS é o atraso máximo para eventos de outro processo
+LESSON_EVENTS_POLL_SECONDS = config('LESSON_EVENTS_POLL_SECONDS', default=5, cast=float)
+# Sob WSGI os dashboards não abrem o stream e consultam /api/lesson-events/poll/ neste intervalo
+LESSON_EVENTS_CLIENT_POLL_SECONDS = config('LESSON_EVENTS_CLIENT_POLL_SECONDS', default=30, cast=int)
+LESSON_EVENTS_MAX_SECONDS = 300
+LESSON_EVENTS_RETENTION_DAYS = 7  # também é a janela máxima do /api/sync/ incremental
+SYNC_CLOCK_SKEW_SECONDS = 5
+BATCH_MAX_REQUESTS = 10  # sub-requisições por chamada ao /api/batch/
+
+# Métricas por requisição (consultas, tempo de banco, Server-Timing, aviso de N+1);
+# em produção use amostragem, ex.: QUERY_INSTRUMENTATION_SAMPLE_RATE=0.05
+QUERY_INSTRUMENTATION_SAMPLE_RATE = config('QUERY_INSTRUMENTATION_SAMPLE_RATE', default=1.0 if DEBUG else 0.05, cast=float)
+# Server-Timing para todos os clientes só em DEBUG; em produção apenas usuários staff o recebem
+QUERY_INSTRUMENTATION_HEADER = config('QUERY_INSTRUMENTATION_HEADER', default=DEBUG, cast=bool)
+QUERY_INSTRUMENTATION_N_PLUS_ONE = 5  # mesma consulta repetida este número de vezes ou mais
+
 # Email Configuration
 _email_host_user = config('EMAIL_HOST_USER', default='')
 _email_host_password = config('EMAIL_HOST_PASSWORD', default='')
@@ -211,3 +344,12 @@ else:
     EMAIL_HOST_PASSWORD = ''
 
 DEFAULT_FROM_EMAIL = 'noreply@autoescola.com'
+
+# Caixa de saída de emails (core/outbox.py); rode o worker com
+# `python manage.py send_outbox --loop`
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+OUTBOX_RETRY_BASE_SECONDS = 60
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_CLAIM_TIMEOUT_SECONDS = 600
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)  # Enviadas/mortas são removidas depois disso
@@ -0,0 +1,58 @@
+"""Perfis de conexão do SQLite.
+
+O perfil 'tuned' é o recomendado em produção:
+
+- journal_mode=WAL: leitores não bloqueiam o escritor (nem o contrário);
+- synchronous=NORMAL: seguro com WAL, sem fsync a cada commit;
+- busy_timeout: espera o lock de escrita em vez de falhar na hora;
+- cache_size/mmap_size/temp_store: menos leituras de disco;
+- BEGIN IMMEDIATE (transaction_mode): a transação pega o lock de escrita
+  no início. Com o BEGIN padrão (DEFERRED) ela começa lendo e, ao tentar
+  escrever, o SQLite devolve "database is locked" sem esperar o timeout
+  se outra conexão já estiver escrevendo.
+
+'default' mantém o comportamento padrão do Django (útil para comparar no
+benchmark_sqlite). Os pragmas são aplicados pelo `init_command` do
+backend do Django a cada nova conexão.
+"""
+
+PROFILES = {
+    'default': {},
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+        'cache_size': -20000,  # negativo = KiB (20 MB por conexão)
+        'mmap_size': 134217728,  # 128 MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+# transaction_mode do Django (BEGIN <modo>) por perfil
+TRANSACTION_MODES = {
+    'default': None,
+    'tuned': 'IMMEDIATE',
+}
+
+
+# Pragmas que gravam no arquivo: não valem para conexões somente leitura
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def pragmas(profile='tuned', exclude=(), **overrides):
+    """Lista de comandos PRAGMA do perfil; `overrides` troca ou acrescenta valores"""
+    if profile not in PROFILES:
+        raise ValueError(f'Perfil SQLite desconhecido: {profile} (use {", ".join(PROFILES)})')
+    values = {**PROFILES[profile], **{name: value for name, value in overrides.items() if value is not None}}
+    return [f'PRAGMA {name}={value}' for name, value in values.items() if name not in exclude]
+
+
+def sqlite_options(profile='tuned', read_only=False, **overrides):
+    """OPTIONS de DATABASES para o perfil (init_command + transaction_mode)"""
+    options = {}
+    commands = pragmas(profile, exclude=WRITE_PRAGMAS if read_only else (), **overrides)
+    if commands:
+        options['init_command'] = '; '.join(commands)
+    if TRANSACTION_MODES[profile] and not read_only:
+        options['transaction_mode'] = TRANSACTION_MODES[profile]
+    return options
@@ -10,6 +10,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('accounts.urls')),
     path('', include('core.urls')),
+    path('', include('lessons.urls')),
 ]
 
 if settings.DEBUG:
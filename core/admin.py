@@ -1,3 +1,22 @@
 from django.contrib import admin
+from django.utils import timezone
 
-# Register your models here.
+from .models import OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to']
+    # O corpo pode conter segredos (token de redefinição de senha): fica fora do admin
+    exclude = ['body', 'html_body', 'claim_token']
+    readonly_fields = ['subject', 'from_email', 'to', 'attempts', 'created_at', 'sent_at', 'claimed_at', 'last_error']
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Reenviar mensagens selecionadas')
+    def requeue(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
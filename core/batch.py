@@ -0,0 +1,135 @@
+"""Requisições em lote (/api/batch/).
+
+Executa várias consultas GET em uma única chamada HTTP: cada sub-requisição
+é resolvida pelo URLconf e chamada diretamente, no mesmo thread (logo, na
+mesma conexão de banco) e com o usuário/sessão da requisição original.
+Decorators das views continuam valendo (login, limite de taxa, ETag).
+
+Só views de consulta listadas em BATCH_VIEWS podem ser chamadas. Um
+parâmetro pode referenciar o resultado de uma sub-requisição anterior com
+"$<id>.<campo>", por exemplo {"bairro": "$cep.bairro"}; se a anterior
+falhou, a dependente não roda e volta com status 424.
+"""
+import json
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+
+# Nomes de URL que podem ser usados em lote (apenas GET, sem efeitos colaterais)
+BATCH_VIEWS = {
+    'lookup_cep', 'filter_instructors', 'filter_vehicles', 'sync', 'lesson-list', 'lesson-detail',
+}
+
+# Cabeçalhos da requisição original que não fazem sentido nas sub-requisições
+DROPPED_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 10)
+
+
+def parse_batch(body):
+    """Valida o corpo {"requests": [{"id", "path", "params"}]}; levanta BatchError"""
+    try:
+        items = json.loads(body).get('requests')
+    except (ValueError, AttributeError):
+        raise BatchError('JSON inválido')
+    if not isinstance(items, list) or not items:
+        raise BatchError('Informe a lista "requests"')
+    if len(items) > max_requests():
+        raise BatchError(f'Máximo de {max_requests()} requisições por lote')
+
+    parsed = []
+    seen = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f'Requisição {index}: informe "path"')
+        request_id = str(item.get('id', index))
+        if request_id in seen:
+            raise BatchError(f'Id repetido: {request_id}')
+        seen.add(request_id)
+        params = item.get('params') or {}
+        if not isinstance(params, dict):
+            raise BatchError(f'Requisição {request_id}: "params" deve ser um objeto')
+        parsed.append((request_id, item['path'], params))
+    return parsed
+
+
+def resolve_params(params, results):
+    """Troca referências "$id.campo" pelo valor correspondente; None se a dependência falhou"""
+    resolved = {}
+    for name, value in params.items():
+        if isinstance(value, str) and value.startswith('$') and '.' in value:
+            request_id, field = value[1:].split('.', 1)
+            if request_id not in results:
+                raise BatchError(f'Referência a requisição inexistente ou posterior: {request_id}')
+            result = results[request_id]
+            if not 200 <= result['status'] < 300 or not isinstance(result['body'], dict):
+                return None
+            value = result['body'].get(field)
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        resolved[name] = '' if value is None else value
+    return resolved
+
+
+def build_subrequest(request, path, params):
+    """Cópia GET da requisição original para `path`, com a mesma autenticação"""
+    query = QueryDict(mutable=True)
+    for name, value in params.items():
+        if isinstance(value, list):
+            query.setlist(name, [str(v) for v in value])
+        else:
+            query[name] = str(value)
+
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.GET = query
+    sub.META = {key: value for key, value in request.META.items() if key not in DROPPED_META}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query.urlencode())
+    sub.COOKIES = request.COOKIES
+    sub.user = request.user
+    sub.session = request.session
+    return sub
+
+
+def run_one(request, path, params):
+    path = urlsplit(path).path
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'status': 404, 'body': {'error': 'Endereço não encontrado'}}
+    if match.url_name not in BATCH_VIEWS:
+        return {'status': 403, 'body': {'error': 'Endereço não permitido em lote'}}
+
+    sub = build_subrequest(request, path, params)
+    sub.resolver_match = match
+    response = match.func(sub, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()  # Response do DRF
+    try:
+        body = json.loads(response.content) if response.content else None
+    except ValueError:
+        body = None  # redirecionamento de login, por exemplo
+    return {'status': response.status_code, 'body': body}
+
+
+def run_batch(request, items):
+    """Executa as sub-requisições em ordem; retorna a lista de resultados"""
+    results = {}
+    for request_id, path, params in items:
+        resolved = resolve_params(params, results)
+        if resolved is None:
+            result = {'status': 424, 'body': {'error': 'Requisição de que esta depende falhou'}}
+        else:
+            result = run_one(request, path, resolved)
+        results[request_id] = result
+    return [{'id': request_id, **result} for request_id, result in results.items()]
@@ -0,0 +1,87 @@
+"""GET condicional (ETag/Last-Modified) para endpoints de consulta.
+
+O estado de uma resposta é calculado com uma consulta agregada barata
+(quantidade de linhas + maior updated_at do mesmo queryset filtrado), sem
+montar nem serializar o corpo. Se o ETag enviado em If-None-Match ainda
+bate, a view nem roda e a resposta é um 304 vazio.
+
+A contagem entra no ETag porque excluir uma linha não muda o maior
+updated_at. Dados de outras tabelas que aparecem no corpo (nomes de
+usuário, veículo) também precisam entrar no estado, senão uma alteração
+neles ainda responderia 304. Pelo mesmo motivo só o ETag decide o 304: Last-Modified vai
+na resposta como informação, mas If-Modified-Since sozinho não basta para
+detectar exclusões e é ignorado.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def queryset_state(queryset, field='updated_at', related=()):
+    """(partes do ETag, maior `field`) do queryset em uma consulta.
+
+    As partes são a quantidade de linhas e o maior `field`; cada relação em
+    `related` (FK cujos dados vão na resposta) acrescenta quantas linhas
+    apontam para ela e o maior `field` do lado relacionado.
+    """
+    aggregates = {'count': Count('pk'), 'last_modified': Max(field)}
+    for name in related:
+        aggregates[f'{name}_count'] = Count(name)
+        aggregates[f'{name}_modified'] = Max(f'{name}__{field}')
+    state = queryset.order_by().aggregate(**aggregates)
+    modified = [value for key, value in state.items() if key.endswith('modified') and value is not None]
+    return tuple(state.values()), max(modified, default=None)
+
+
+def make_etag(*parts):
+    """ETag forte (entre aspas) a partir das partes que definem a resposta"""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag):
+    """Resposta 304 se o cliente já tem a versão `etag`; senão None"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None and response.status_code == 304:
+        response['ETag'] = etag
+    return response
+
+
+def set_conditional_headers(response, etag, last_modified=None):
+    if response.status_code != 200:
+        return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # O cliente guarda a resposta, mas revalida sempre (barato com o 304)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_get(state_func):
+    """Decorator: `state_func(request, *args, **kwargs)` devolve (etag, last_modified) ou None.
+
+    None (parâmetros inválidos, por exemplo) executa a view normalmente,
+    sem cabeçalhos de cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            state = state_func(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = state
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            return set_conditional_headers(view(request, *args, **kwargs), etag, last_modified)
+        return inner
+    return decorator
@@ -0,0 +1,129 @@
+"""Métricas de banco por requisição: consultas, tempo de banco e tempo total.
+
+`QueryInstrumentationMiddleware` registra um execute_wrapper em cada
+conexão apenas nas requisições sorteadas (QUERY_INSTRUMENTATION_SAMPLE_RATE);
+nas demais não há custo algum. Para as sorteadas:
+
+- cabeçalho Server-Timing (db, app e total), visível no DevTools do navegador;
+  só com QUERY_INSTRUMENTATION_HEADER (padrão: DEBUG) ou para usuários staff,
+  para não expor tempos de banco a qualquer cliente;
+- log estruturado em `core.instrumentation` (mensagem chave=valor e os mesmos
+  dados em `extra['request_metrics']` para formatadores JSON);
+- aviso de consultas duplicadas (mesmo SQL e parâmetros) e de possível N+1
+  (mesmo SQL repetido QUERY_INSTRUMENTATION_N_PLUS_ONE vezes ou mais).
+
+Views assíncronas (stream SSE) passam direto, sem instrumentação.
+"""
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCollector:
+    """execute_wrapper que mede cada consulta (também em réplicas)"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+            try:
+                self.executions[(sql, repr(params))] += 1
+            except Exception:  # repr de parâmetros exóticos nunca deve quebrar a requisição
+                pass
+
+    def duplicates(self):
+        return sum(times - 1 for times in self.executions.values() if times > 1)
+
+    def repeated(self, threshold):
+        """[(sql, vezes)] executados `threshold` vezes ou mais, do mais repetido ao menos"""
+        return [(sql, times) for sql, times in self.statements.most_common() if times >= threshold]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if random.random() >= _setting('QUERY_INSTRUMENTATION_SAMPLE_RATE', 1.0):
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        if self.expose_timing(request):
+            response['Server-Timing'] = self.server_timing(collector, total)
+        self.log(request, response, collector, total)
+        return response
+
+    @staticmethod
+    def expose_timing(request):
+        if _setting('QUERY_INSTRUMENTATION_HEADER', False):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    @staticmethod
+    def server_timing(collector, total):
+        db_ms = collector.duration * 1000
+        total_ms = total * 1000
+        return (
+            f'db;dur={db_ms:.1f};desc="{collector.count} consultas", '
+            f'app;dur={max(total_ms - db_ms, 0):.1f}, total;dur={total_ms:.1f}'
+        )
+
+    def log(self, request, response, collector, total):
+        repeated = collector.repeated(_setting('QUERY_INSTRUMENTATION_N_PLUS_ONE', 5))
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'status': response.status_code,
+            'queries': collector.count,
+            'duplicates': collector.duplicates(),
+            'db_ms': round(collector.duration * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        logger.info(
+            'request method=%s path=%s view=%s status=%s queries=%s duplicates=%s db_ms=%s total_ms=%s',
+            *metrics.values(), extra={'request_metrics': metrics},
+        )
+        for sql, times in repeated:
+            logger.warning(
+                'Possível N+1 em %s: mesma consulta %s vezes: %s', metrics['view'] or request.path, times, sql[:300],
+                extra={'request_metrics': {**metrics, 'repeated_sql': sql, 'repeated_times': times}},
+            )
@@ -0,0 +1,365 @@
+import json
+import math
+import platform
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+import django
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+
+from accounts.models import InstructorProfile, User
+from core.instrumentation import QueryCollector
+from lessons.models import Lesson
+
+
+BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks' / 'http'
+# Ordem do relatório: a ordem em que o fluxo passa pelos endpoints
+ENDPOINTS = (
+    'login', 'aluno_dashboard', 'lookup_cep', 'filter_instructors', 'filter_vehicles',
+    'agendamento', 'instrutor_dashboard', 'accept_lesson', 'submit_lesson_rating',
+)
+TIME_SLOTS = ('07:00', '08:00', '09:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00', '17:00', '18:00')
+SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) consultas"')
+
+
+def percentile(values, fraction):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def viacep_stub(url, *args, **kwargs):
+    """Resposta da ViaCEP montada a partir do CEP da URL: nenhum acesso externo no benchmark"""
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {
+        'cep': url.rstrip('/').split('/')[-2], 'logradouro': 'Rua Teste', 'bairro': 'Centro',
+        'localidade': 'São Paulo', 'uf': 'SP',
+    }
+    return response
+
+
+class InProcessSession:
+    """Test client do Django: latência sem rede e consultas medidas em todas as conexões"""
+
+    def __init__(self, base_url=None):
+        self.client = Client()
+
+    def request(self, method, path, data=None, json_body=None):
+        collector = QueryCollector()
+        kwargs = {'data': json.dumps(json_body), 'content_type': 'application/json'} if json_body is not None else {'data': data}
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+            start = time.perf_counter()
+            response = getattr(self.client, method)(path, **kwargs)
+            elapsed = time.perf_counter() - start
+        return response.status_code, response.content, elapsed, collector.count, collector.duration
+
+
+class LiveServerSession:
+    """requests contra um servidor local; consultas lidas do Server-Timing
+    (QUERY_INSTRUMENTATION_SAMPLE_RATE=1 e QUERY_INSTRUMENTATION_HEADER=True)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+
+    def _allow_plain_http(self):
+        # Com DEBUG o cookie do CSRF vem Secure (CSRF_COOKIE_SECURE); o servidor local é http
+        for cookie in self.http.cookies:
+            cookie.secure = False
+
+    def _csrf_token(self):
+        if 'csrftoken' not in self.http.cookies:
+            self.http.get(f'{self.base_url}/auth/login/')
+            self._allow_plain_http()
+        return self.http.cookies.get('csrftoken', '')
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        if method == 'post':
+            headers = {'X-CSRFToken': self._csrf_token(), 'Referer': f'{self.base_url}{path}'}
+        start = time.perf_counter()
+        response = self.http.request(method.upper(), f'{self.base_url}{path}', params=data if method == 'get' else None,
+                                     data=data if method == 'post' else None, json=json_body, headers=headers,
+                                     allow_redirects=False, timeout=30)
+        elapsed = time.perf_counter() - start
+        self._allow_plain_http()  # o login troca o token do CSRF
+        timing = SERVER_TIMING_RE.search(response.headers.get('Server-Timing', ''))
+        queries, db_seconds = (int(timing.group(2)), float(timing.group(1)) / 1000) if timing else (None, None)
+        return response.status_code, response.content, elapsed, queries, db_seconds
+
+
+class Command(BaseCommand):
+    help = ('Benchmark HTTP dos fluxos de agendamento e painéis: login, CEP, busca de instrutores e veículos, '
+            'agendamento, aceite e avaliação. Relata p50/p95/p99, vazão e consultas por endpoint e '
+            'salva/compara baselines em benchmarks/http/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=50, help='Fluxos completos medidos')
+        parser.add_argument('--warmup', type=int, default=5, help='Fluxos executados antes de medir')
+        parser.add_argument('--random-seed', type=int, default=42)
+        parser.add_argument('--prefix', default='carga', help='Prefixo dos usuários de generate_load_data')
+        parser.add_argument('--password', default='senha123')
+        parser.add_argument('--url', help='Servidor local (ex.: http://127.0.0.1:8000); sem isto usa o test client')
+        parser.add_argument('--concurrency', type=int, default=1, help='Fluxos simultâneos (apenas com --url)')
+        parser.add_argument('--save-baseline', nargs='?', const='baseline', metavar='NOME')
+        parser.add_argument('--compare', nargs='?', const='baseline', metavar='NOME')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Piora de p95 tolerada (0.2 = 20%%)')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Piora absoluta de p95 ignorada (ruído em endpoints de poucos ms)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Erro (exit != 0) se houver regressão')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['random_seed'])
+        self.rng_lock = threading.Lock()
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.samples_lock = threading.Lock()
+        self.instructor_sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.recording = False
+
+        # Só alunos em regiões (prefixo do CEP) com instrutor: todo fluxo chega ao agendamento
+        served = {
+            cep[:5] for cep in InstructorProfile.objects.filter(
+                user__username__startswith=f'{options["prefix"]}_instrutor_', status='ativo', vehicles__isnull=False,
+                vehicle_categories__in=('B', 'AB'),
+            ).values_list('cep_base', flat=True)
+        }
+        self.students = [
+            student for student in
+            User.objects.filter(username__startswith=f'{options["prefix"]}_aluno_', is_active=True)
+            .values_list('pk', 'email', 'studentprofile_profile__cep', 'studentprofile_profile__address_number')
+            .order_by('pk')
+            if student[2] and student[2][:5] in served
+        ]
+        if not self.students:
+            raise CommandError(f'Nenhum aluno "{options["prefix"]}_aluno_*" em região atendida. '
+                               'Rode generate_load_data antes.')
+        self.instructor_emails = dict(
+            User.objects.filter(username__startswith=f'{options["prefix"]}_instrutor_').values_list('pk', 'email')
+        )
+
+        if options['url']:
+            session_class = LiveServerSession
+            self.stdout.write(self.style.WARNING(
+                f'Servidor {options["url"]}: as escritas ficam gravadas e lookup_cep consulta a ViaCEP de verdade. '
+                'Rode o servidor com RATELIMIT_ENABLED=False, QUERY_INSTRUMENTATION_SAMPLE_RATE=1 '
+                'e QUERY_INSTRUMENTATION_HEADER=True.'
+            ))
+            wall = self._run(session_class, options['concurrency'])
+        else:
+            session_class = InProcessSession
+            # Tudo numa transação desfeita ao final; CEP sem rede; sem limite de taxa no login repetido
+            with transaction.atomic(), override_settings(RATELIMIT_ENABLED=False, ALLOWED_HOSTS=['*']), \
+                    mock.patch('core.views.requests.get', side_effect=viacep_stub):
+                wall = self._run(session_class, 1)
+                transaction.set_rollback(True)
+
+        report = self._report(wall)
+        self._print(report)
+        if options['compare']:
+            self._compare(report, options['compare'])
+        if options['save_baseline']:
+            path = self._baseline_path(options['save_baseline'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'Baseline salva em {path}'))
+
+    # ==========================
+    # Execução
+    # ==========================
+    def _run(self, session_class, concurrency):
+        self.session_class = session_class
+        for index in range(self.options['warmup']):
+            self._flow(index)
+        self.recording = True
+        flows = range(self.options['warmup'], self.options['warmup'] + self.options['flows'])
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(self._flow, flows))
+        else:
+            for index in flows:
+                self._flow(index)
+        return time.perf_counter() - start
+
+    def _random(self, method, *args):
+        with self.rng_lock:
+            return getattr(self.rng, method)(*args)
+
+    def _call(self, session, name, method, path, data=None, json_body=None, expect=(200,)):
+        status, content, elapsed, queries, db_seconds = session.request(method, path, data=data, json_body=json_body)
+        if self.recording:
+            with self.samples_lock:
+                self.samples[name].append((elapsed, queries, db_seconds, status in expect))
+        if status not in expect:
+            return None
+        return json.loads(content) if content[:1] in (b'{', b'[') else content
+
+    def _login(self, session, email):
+        return self._call(session, 'login', 'post', '/auth/login/',
+                          data={'email': email, 'password': self.options['password']}, expect=(302,))
+
+    def _instructor_session(self, instructor_id):
+        """Uma sessão por instrutor, reaproveitada entre fluxos como num navegador já logado"""
+        with self.sessions_lock:
+            session = self.instructor_sessions.get(instructor_id)
+            if session is None:
+                session = self.instructor_sessions[instructor_id] = self.session_class(self.options['url'])
+                session.lock = threading.Lock()
+                session.logged_in = False
+        return session
+
+    def _flow(self, index):
+        """Aluno entra, busca CEP, instrutor e veículo, agenda; o instrutor aceita; o aluno avalia uma aula"""
+        student_id, email, cep, number = self.students[index % len(self.students)]
+        student = self.session_class(self.options['url'])
+        if self._login(student, email) is None:
+            return
+        self._call(student, 'aluno_dashboard', 'get', '/aluno/')
+        self._call(student, 'lookup_cep', 'get', '/api/lookup-cep/', data={'cep': cep})
+
+        found = self._call(student, 'filter_instructors', 'get', '/api/filter-instructors/',
+                           data={'cep': cep, 'vehicle_type': 'B'})
+        candidates = [item for item in (found or {}).get('instructors', [])
+                      if item['vehicle_id'] and item['id'] in self.instructor_emails]
+        if not candidates:
+            return
+        instructor = self._random('choice', candidates)
+        vehicles = self._call(student, 'filter_vehicles', 'get', '/api/filter-vehicles/',
+                              data={'instructor_id': instructor['id']})
+        vehicle_id = self._random('choice', vehicles['vehicles'])['id'] if vehicles and vehicles['vehicles'] else ''
+
+        booking = {
+            'instructor': instructor['id'], 'vehicle': vehicle_id, 'vehicle_type': 'B',
+            # Depois das aulas futuras de generate_load_data (até 30 dias): sem conflito de horário
+            'date': (date.today() + timedelta(days=self._random('randint', 31, 120))).isoformat(),
+            'time': self._random('choice', TIME_SLOTS), 'cep': cep, 'numero': number,
+        }
+        if self._call(student, 'agendamento', 'post', '/agendamento/', data=booking, expect=(302,)) is None:
+            return
+        lesson_id = (Lesson.objects.filter(student_id=student_id, status='pending')
+                     .order_by('-id').values_list('pk', flat=True).first())
+
+        session = self._instructor_session(instructor['id'])
+        with session.lock:
+            if not session.logged_in:
+                session.logged_in = self._login(session, self.instructor_emails[instructor['id']]) is not None
+            if session.logged_in:
+                self._call(session, 'instrutor_dashboard', 'get', '/')
+                self._call(session, 'accept_lesson', 'post', f'/api/accept-lesson/{lesson_id}/')
+
+        completed = (Lesson.objects.filter(student_id=student_id, status='completed')
+                     .order_by('-date').values_list('pk', flat=True).first())
+        if completed:
+            self._call(student, 'submit_lesson_rating', 'post', '/api/submit-lesson-rating/',
+                       json_body={'lesson_id': completed, 'rating': self._random('randint', 3, 5)})
+
+    # ==========================
+    # Relatório e baselines
+    # ==========================
+    def _report(self, wall):
+        endpoints = {}
+        for name in ENDPOINTS:
+            samples = self.samples[name]
+            if not samples:
+                continue
+            latencies = sorted(elapsed for elapsed, _, _, _ in samples)
+            queries = [count for _, count, _, _ in samples if count is not None]
+            db_times = [seconds for _, _, seconds, _ in samples if seconds is not None]
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': sum(1 for *_, ok in samples if not ok),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+                'throughput_rps': round(len(samples) / wall, 2),
+                'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'queries_max': max(queries) if queries else None,
+                'db_ms_mean': round(sum(db_times) / len(db_times) * 1000, 2) if db_times else None,
+            }
+        total = sum(item['requests'] for item in endpoints.values())
+        return {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': self._git_commit(),
+            'environment': {
+                'mode': 'live-server' if self.options['url'] else 'test-client',
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'flows': self.options['flows'],
+                'concurrency': self.options['concurrency'] if self.options['url'] else 1,
+                'random_seed': self.options['random_seed'],
+            },
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(total / wall, 2) if wall else None,
+            'flows_per_second': round(self.options['flows'] / wall, 2) if wall else None,
+            'endpoints': endpoints,
+        }
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def _print(self, report):
+        env = report['environment']
+        self.stdout.write(f"{env['flows']} fluxos ({env['mode']}, {env['database']}, concorrência {env['concurrency']}) "
+                          f"em {report['wall_seconds']:.1f} s: {report['throughput_rps']} req/s, "
+                          f"{report['flows_per_second']} fluxos/s")
+        self.stdout.write(f"  {'endpoint':<22}{'n':>6}{'erros':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'req/s':>8}{'consultas':>11}{'db ms':>8}")
+        for name, item in report['endpoints'].items():
+            queries = '-' if item['queries_mean'] is None else f"{item['queries_mean']:g}/{item['queries_max']}"
+            db_ms = '-' if item['db_ms_mean'] is None else f"{item['db_ms_mean']:.1f}"
+            line = (f"  {name:<22}{item['requests']:>6}{item['errors']:>7}{item['p50_ms']:>9.1f}{item['p95_ms']:>9.1f}"
+                    f"{item['p99_ms']:>9.1f}{item['throughput_rps']:>8.1f}{queries:>11}{db_ms:>8}")
+            self.stdout.write(self.style.ERROR(line) if item['errors'] else line)
+
+    @staticmethod
+    def _baseline_path(name):
+        return BASELINE_DIR / f'{name}.json'
+
+    def _compare(self, report, name):
+        path = self._baseline_path(name)
+        if not path.exists():
+            raise CommandError(f'Baseline não encontrada: {path} (crie com --save-baseline {name})')
+        baseline = json.loads(path.read_text(encoding='utf-8'))
+        self.stdout.write(f"\nComparação com {path.name} (commit {baseline.get('commit') or '?'}, "
+                          f"{baseline['environment']['mode']}, {baseline['created_at']}):")
+        regressions = []
+        for endpoint, item in report['endpoints'].items():
+            before = baseline['endpoints'].get(endpoint)
+            if not before:
+                continue
+            change = (item['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+            more_queries = (item['queries_max'] or 0) > (before['queries_max'] or 0)
+            line = (f"  {endpoint:<22}p95 {before['p95_ms']:>8.1f} -> {item['p95_ms']:>8.1f} ms ({change:+.0%})"
+                    f"  consultas {before['queries_max']} -> {item['queries_max']}")
+            slower = change > self.options['threshold'] and item['p95_ms'] - before['p95_ms'] > self.options['min_delta_ms']
+            if slower or more_queries:
+                regressions.append(endpoint)
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
+        if regressions and self.options['fail_on_regression']:
+            raise CommandError(f'Regressão em: {", ".join(regressions)}')
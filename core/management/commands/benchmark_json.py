@@ -0,0 +1,75 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core import renderers
+
+
+class Command(BaseCommand):
+    help = 'Compara a serialização JSON de listas grandes de aulas: biblioteca padrão x orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=10000, help='Aulas por resposta')
+        parser.add_argument('--repeat', type=int, default=5, help='Repetições (vale a melhor)')
+        parser.add_argument('--random-seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        payload = {'lessons': self._lessons(random.Random(options['random_seed']), options['lessons'])}
+
+        backends = [('Biblioteca padrão (DjangoJSONEncoder)', renderers._dumps_stdlib)]
+        if renderers.orjson is not None:
+            backends.append(('orjson', renderers._dumps_orjson))
+        else:
+            self.stdout.write(self.style.WARNING('orjson não instalado: medindo só a biblioteca padrão'))
+
+        self.stdout.write(f"{options['lessons']} aulas, melhor de {options['repeat']} execuções "
+                          f"(backend ativo: {renderers.backend()})")
+        baseline = None
+        for label, dumps in backends:
+            elapsed, size = self._measure(dumps, payload, options['repeat'])
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f'  {label:<38} {elapsed * 1000:>8.1f} ms  {size / 1024:>8.0f} KiB  {baseline / elapsed:>5.1f}x'
+            )
+
+    @staticmethod
+    def _measure(dumps, payload, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = dumps(payload)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(content)
+
+    @staticmethod
+    def _lessons(rng, amount):
+        """Linhas no formato da API de aulas: Decimal, data, hora e datetime"""
+        first_day = date(2026, 1, 5)
+        created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        statuses = ['scheduled', 'completed', 'cancelled', 'rescheduled']
+        return [
+            {
+                'id': pk,
+                'student': rng.randint(1, 5000),
+                'student_name': f'Aluno {pk}',
+                'instructor': rng.randint(1, 300),
+                'instructor_name': f'Instrutor {pk % 300}',
+                'vehicle': rng.randint(1, 600),
+                'vehicle_type': rng.choice('AB'),
+                'date': first_day + timedelta(days=pk % 365),
+                'time': dt_time(7 + pk % 12, rng.choice((0, 30))),
+                'duration': 50,
+                'status': rng.choice(statuses),
+                'location': 'Av. Paulista, 1000 - São Paulo',
+                'student_rating': Decimal(rng.randint(10, 50)) / 10,
+                'notes': 'Boa evolução na baliza.' if pk % 3 else '',
+                'lesson_number': pk % 20 + 1,
+                'created_at': created + timedelta(minutes=pk),
+                'updated_at': created + timedelta(minutes=pk, seconds=rng.randint(0, 3600)),
+            }
+            for pk in range(1, amount + 1)
+        ]
@@ -0,0 +1,157 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from autoescola.sqlite import PROFILES, TRANSACTION_MODES, pragmas
+
+
+SCHEMA = """
+CREATE TABLE lesson (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL,
+    instructor_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    student_rating REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX lesson_instructor_idx ON lesson (instructor_id, date, time);
+"""
+
+
+class Command(BaseCommand):
+    help = ('Carga concorrente de leitura/escrita em um SQLite temporário, comparando '
+            'os perfis de autoescola/sqlite.py (padrão x WAL + BEGIN IMMEDIATE)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Threads agendando/avaliando aulas')
+        parser.add_argument('--readers', type=int, default=8, help='Threads lendo painéis')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duração por perfil')
+        parser.add_argument('--rows', type=int, default=20000, help='Aulas pré-existentes')
+        parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{options['writers']} escritores, {options['readers']} leitores, "
+                          f"{options['seconds']:.0f}s por perfil, {options['rows']} aulas")
+        for profile in options['profiles']:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self._seed(path, options['rows'])
+                stats = self._run(path, profile, options)
+            self._report(profile, stats, options['seconds'])
+
+    def _connect(self, path, profile):
+        # Mesmo que o Django faz: autocommit no driver e BEGIN explícito
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for command in pragmas(profile):
+            conn.execute(command)
+        return conn
+
+    def _seed(self, path, rows):
+        rng = random.Random(0)
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        first_day = date(2026, 1, 1)
+        conn.executemany(
+            'INSERT INTO lesson (student_id, instructor_id, date, time, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (rng.randint(1, 2000), rng.randint(1, 100), str(first_day + timedelta(days=rng.randint(0, 365))),
+                 f'{rng.randint(7, 19):02d}:00', 'scheduled', time.time())
+                for _ in range(rows)
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+    def _run(self, path, profile, options):
+        deadline = time.monotonic() + options['seconds']
+        begin = f'BEGIN {TRANSACTION_MODES[profile]}' if TRANSACTION_MODES[profile] else 'BEGIN'
+        results = []
+        threads = [
+            threading.Thread(target=self._writer, args=(path, profile, begin, deadline, results, seed))
+            for seed in range(options['writers'])
+        ] + [
+            threading.Thread(target=self._reader, args=(path, profile, begin, deadline, results, seed))
+            for seed in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+        for result in results:
+            for key in ('writes', 'reads', 'locked'):
+                stats[key] += result[key]
+            stats['latencies'].extend(result['latencies'])
+        return stats
+
+    def _writer(self, path, profile, begin, deadline, results, seed):
+        """Agendamento (checa conflito e insere) e avaliação (UPDATE), como nas views"""
+        rng = random.Random(seed)
+        conn = self._connect(path, profile)
+        result = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+        while time.monotonic() < deadline:
+            instructor = rng.randint(1, 100)
+            day = str(date(2026, 1, 1) + timedelta(days=rng.randint(0, 365)))
+            hour = f'{rng.randint(7, 19):02d}:00'
+            start = time.perf_counter()
+            try:
+                conn.execute(begin)
+                taken = conn.execute(
+                    'SELECT COUNT(*) FROM lesson WHERE instructor_id = ? AND date = ? AND time = ?',
+                    (instructor, day, hour),
+                ).fetchone()[0]
+                if taken:
+                    conn.execute('UPDATE lesson SET student_rating = ?, updated_at = ? WHERE instructor_id = ? '
+                                 'AND date = ? AND time = ?', (rng.randint(1, 5), time.time(), instructor, day, hour))
+                else:
+                    conn.execute('INSERT INTO lesson (student_id, instructor_id, date, time, status, updated_at) '
+                                 'VALUES (?, ?, ?, ?, ?, ?)',
+                                 (rng.randint(1, 2000), instructor, day, hour, 'pending', time.time()))
+                conn.execute('COMMIT')
+                result['writes'] += 1
+                result['latencies'].append(time.perf_counter() - start)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                result['locked'] += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+        conn.close()
+        results.append(result)
+
+    def _reader(self, path, profile, begin, deadline, results, seed):
+        """Painel do instrutor: próximas aulas"""
+        rng = random.Random(1000 + seed)
+        conn = self._connect(path, profile)
+        result = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+        while time.monotonic() < deadline:
+            try:
+                conn.execute(
+                    'SELECT id, date, time, status FROM lesson WHERE instructor_id = ? AND date >= ? '
+                    'ORDER BY date, time LIMIT 50',
+                    (rng.randint(1, 100), str(date(2026, 1, 1) + timedelta(days=rng.randint(0, 365)))),
+                ).fetchall()
+                result['reads'] += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                result['locked'] += 1
+        conn.close()
+        results.append(result)
+
+    def _report(self, profile, stats, seconds):
+        latencies = sorted(stats['latencies'])
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        self.stdout.write(
+            f"  {profile:<8} {stats['writes'] / seconds:>8.0f} escritas/s  {stats['reads'] / seconds:>8.0f} leituras/s  "
+            f"p95 escrita {p95:>7.1f} ms  {stats['locked']:>5} 'database is locked'"
+        )
@@ -0,0 +1,351 @@
+import random
+import time
+from datetime import date, time as dt_time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.bulk_import import chunked
+from accounts.models import User, IdentityDocument, InstructorProfile, InstructorVehicle, StudentProfile
+from lessons.models import Lesson
+
+
+# (bairro, logradouro, prefixo do CEP, peso): a distribuição de alunos e
+# instrutores segue o peso, com mais gente na periferia que no centro
+NEIGHBORHOODS = (
+    ('Sé', 'Praça da Sé', '01001', 2),
+    ('Bela Vista', 'Rua Treze de Maio', '01327', 4),
+    ('Consolação', 'Rua da Consolação', '01301', 3),
+    ('Pinheiros', 'Rua dos Pinheiros', '05422', 4),
+    ('Vila Mariana', 'Rua Domingos de Morais', '04010', 6),
+    ('Moema', 'Avenida Ibirapuera', '04029', 4),
+    ('Lapa', 'Rua Doze de Outubro', '05073', 4),
+    ('Butantã', 'Avenida Vital Brasil', '05503', 5),
+    ('Santana', 'Rua Voluntários da Pátria', '02011', 6),
+    ('Mooca', 'Rua da Mooca', '03104', 5),
+    ('Tatuapé', 'Rua Tuiuti', '03081', 6),
+    ('Ipiranga', 'Rua Silva Bueno', '04208', 6),
+    ('Penha', 'Rua Padre Benedito de Camargo', '03604', 7),
+    ('Jabaquara', 'Avenida Engenheiro Armando de Arruda Pereira', '04309', 7),
+    ('Vila Prudente', 'Avenida Professor Luiz Ignácio Anhaia Mello', '03155', 6),
+    ('Itaquera', 'Avenida Itaquera', '08210', 10),
+    ('Brasilândia', 'Avenida Deputado Cantídio Sampaio', '02860', 9),
+    ('Campo Limpo', 'Estrada do Campo Limpo', '05787', 9),
+    ('Capão Redondo', 'Estrada de Itapecerica', '05863', 11),
+    ('Grajaú', 'Avenida Dona Belmira Marin', '04846', 12),
+)
+FIRST_NAMES = (
+    'Ana', 'Maria', 'Juliana', 'Camila', 'Fernanda', 'Beatriz', 'Larissa', 'Patrícia', 'Aline', 'Bruna',
+    'João', 'José', 'Carlos', 'Lucas', 'Gabriel', 'Rafael', 'Pedro', 'Mateus', 'Felipe', 'Thiago',
+)
+LAST_NAMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Ferreira', 'Rodrigues', 'Almeida',
+    'Nascimento', 'Carvalho', 'Gomes', 'Ribeiro', 'Martins', 'Araújo', 'Rocha', 'Barbosa', 'Mendes', 'Teixeira',
+)
+GENDER_IDENTITIES = ('CF', 'CM', 'CF', 'CM', 'CF', 'CM', 'TW', 'TM')
+CARS = (('Chevrolet', 'Onix'), ('Hyundai', 'HB20'), ('Fiat', 'Argo'), ('Volkswagen', 'Polo'), ('Renault', 'Kwid'))
+MOTORCYCLES = (('Honda', 'CG 160'), ('Yamaha', 'Factor 150'), ('Honda', 'Biz 125'))
+COLORS = ('Branco', 'Prata', 'Preto', 'Cinza', 'Vermelho')
+TIME_SLOTS = tuple(dt_time(hour) for hour in (7, 8, 9, 10, 11, 13, 14, 15, 16, 17, 18))
+# Aulas passadas e futuras: (status, peso)
+PAST_STATUSES = (('completed', 80), ('cancelled', 12), ('rescheduled', 8))
+FUTURE_STATUSES = (('scheduled', 60), ('pending', 35), ('cancelled', 5))
+SCORES = ('Excelente', 'Bom', 'Regular', 'Precisa praticar')
+
+# CPFs gerados começam aqui (9 dígitos base + 2 verificadores)
+CPF_BASE = 700000000
+
+
+def cpf_for(index):
+    """CPF válido e determinístico para o índice"""
+    digits = [int(d) for d in f'{CPF_BASE + index:09d}']
+    for length in (9, 10):
+        total = sum(d * weight for d, weight in zip(digits, range(length + 1, 1, -1)))
+        rest = total % 11
+        digits.append(0 if rest < 2 else 11 - rest)
+    cpf = ''.join(map(str, digits))
+    return f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+
+
+def plate_for(index):
+    """Placa Mercosul (ABC1D23) única por índice"""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    index, tail = divmod(index, 100)
+    index, middle = divmod(index, 26)
+    index, digit = divmod(index, 10)
+    prefix = ''.join(letters[(index // 26 ** power) % 26] for power in (2, 1, 0))
+    return f'{prefix}{digit}{letters[middle]}{tail:02d}'
+
+
+class Command(BaseCommand):
+    help = 'Gera volumes grandes de alunos, instrutores, veículos e aulas sintéticos para testes de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--instructors', type=int, default=50)
+        parser.add_argument('--vehicles', type=int, default=120)
+        parser.add_argument('--lessons', type=int, default=20000)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas por bulk_create')
+        parser.add_argument('--random-seed', type=int, default=42, help='Mesma semente, mesmos dados')
+        parser.add_argument('--prefix', default='carga', help='Prefixo dos usernames gerados')
+        parser.add_argument('--password', default='senha123', help='Senha de todos os usuários gerados')
+        parser.add_argument('--clear', action='store_true', help='Apaga antes os usuários gerados com o mesmo prefixo')
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['instructors'] < 1:
+            raise CommandError('Informe ao menos 1 aluno e 1 instrutor.')
+        self.rng = random.Random(options['random_seed'])
+        self.chunk_size = options['chunk_size']
+        self.prefix = options['prefix']
+        self.today = date.today()
+        # Um hash para todos: PBKDF2 por usuário levaria horas com 100 mil alunos
+        self.password = make_password(options['password'])
+
+        generated = User.objects.filter(username__startswith=f'{self.prefix}_')
+        if options['clear']:
+            self.stdout.write('Apagando dados gerados anteriormente...')
+            generated.delete()
+        elif generated.exists():
+            raise CommandError(f'Já existem usuários "{self.prefix}_*". Use --clear ou outro --prefix.')
+        # CPF, RG e CNH a partir da contagem atual: outro prefixo no mesmo banco não colide
+        self.document_offset = User.objects.count()
+
+        started = time.perf_counter()
+        try:
+            instructors = self._instructors(options['instructors'])
+            vehicles = self._vehicles(instructors, options['vehicles'])
+            students = self._students(options['students'], instructors)
+            self._lessons(options['lessons'], students, instructors, vehicles)
+            self._update_counters(students, instructors)
+        except IntegrityError as e:
+            raise CommandError(f'Conflito com dados já cadastrados (CPF, RG, credencial ou email): {e}')
+        self.stdout.write(self.style.SUCCESS(f'Concluído em {time.perf_counter() - started:.1f} s.'))
+        self.stdout.write(f'Login: {self.prefix}_aluno_{len(instructors)} ou {self.prefix}_instrutor_0 '
+                          f'/ {options["password"]}')
+
+    def _progress(self, label, done, total, started):
+        """Uma linha a cada 10% (e no fim) com a taxa de inserção"""
+        step = max(1, total // 10)
+        if done == total or done // step != (done - self.chunk_size) // step:
+            rate = done / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(f'  {label}: {done:,}/{total:,} ({done * 100 // max(total, 1)}%) {rate:,.0f}/s')
+
+    # ==========================
+    # Pessoas
+    # ==========================
+    def _person(self, index, role):
+        rng = self.rng
+        bairro = rng.choices(range(len(NEIGHBORHOODS)), weights=[n[3] for n in NEIGHBORHOODS])[0]
+        document = self.document_offset + index
+        return {
+            'index': index,
+            'username': f'{self.prefix}_{role}_{index}',
+            'email': f'{self.prefix}.{role}{index}@carga.autoescola.test',
+            'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'phone': f'(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+            'document': document,
+            'cpf': cpf_for(document),
+            'rg': f'{CPF_BASE + document:09d}',
+            'bairro': bairro,
+            'cep': f'{NEIGHBORHOODS[bairro][2]}-{rng.randint(0, 999):03d}',
+            'address_number': str(rng.randint(1, 3000)),
+            'birth_date': date(rng.randint(1960, 2006), rng.randint(1, 12), rng.randint(1, 28)),
+            'gender_identity': rng.choice(GENDER_IDENTITIES),
+        }
+
+    @staticmethod
+    def _profile_fields(user, person):
+        bairro, street = NEIGHBORHOODS[person['bairro']][:2]
+        return {
+            'user': user, 'full_name': person['full_name'], 'email': person['email'], 'phone': person['phone'],
+            'birth_date': person['birth_date'], 'cpf': person['cpf'], 'rg': person['rg'], 'cep': person['cep'],
+            'address': street, 'address_number': person['address_number'], 'address_complement': bairro,
+            'gender_identity': person['gender_identity'],
+        }
+
+    def _create_people(self, label, people, role, model, build_profile):
+        """Usuários, perfis e registro de CPF/RG em blocos; grava user_id e profile_id em cada pessoa"""
+        started = time.perf_counter()
+        done = 0
+        for chunk in chunked(people, self.chunk_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=p['username'], email=p['email'], full_name=p['full_name'], phone=p['phone'],
+                         role=role, password=self.password)
+                    for p in chunk
+                ])
+                profiles = model.objects.bulk_create([build_profile(user, p) for user, p in zip(users, chunk)])
+                IdentityDocument.objects.bulk_create([
+                    IdentityDocument(user=user, kind=kind, number=number)
+                    for user, p in zip(users, chunk)
+                    for kind, number in (('cpf', p['cpf'].replace('.', '').replace('-', '')), ('rg', p['rg']))
+                ])
+            for person, user, profile in zip(chunk, users, profiles):
+                person['user_id'], person['profile_id'] = user.pk, profile.pk
+            done += len(chunk)
+            self._progress(label, done, len(people), started)
+        return people
+
+    def _instructors(self, amount):
+        rng = self.rng
+        people = [self._person(index, 'instrutor') for index in range(amount)]
+        for person in people:
+            # Qualidade média do instrutor: dá forma ao histórico de avaliações
+            person['quality'] = min(5.0, max(2.5, rng.gauss(4.3, 0.4)))
+            person['categories'] = rng.choices(('B', 'AB', 'A'), weights=(75, 20, 5))[0]
+
+        def build_profile(user, person):
+            profile = InstructorProfile(
+                **self._profile_fields(user, person),
+                cnh=f'{CPF_BASE + person["document"]:011d}',
+                cnh_emission_date=person['birth_date'] + timedelta(days=365 * 19),
+                credential=f'{self.prefix.upper()}-{person["index"]:06d}',
+                cep_base=person['cep'],
+                vehicle_categories=person['categories'],
+                status=rng.choices(('ativo', 'inativo', 'pendente'), weights=(90, 5, 5))[0],
+            )
+            profile.set_gender_from_identity()
+            return profile
+
+        return self._create_people('Instrutores', people, 'instrutor', InstructorProfile, build_profile)
+
+    def _students(self, amount, instructors):
+        rng = self.rng
+        nearby = {}
+        for position, person in enumerate(instructors):
+            nearby.setdefault(person['bairro'], []).append(position)
+
+        # Índices depois dos instrutores: CPFs e RGs não colidem
+        people = [self._person(len(instructors) + index, 'aluno') for index in range(amount)]
+        for person in people:
+            # Instrutor principal: quase sempre um do mesmo bairro, se houver
+            same_bairro = nearby.get(person['bairro'])
+            if same_bairro and rng.random() < 0.8:
+                person['instructor'] = rng.choice(same_bairro)
+            else:
+                person['instructor'] = rng.randrange(len(instructors))
+            person['categories'] = rng.choices(('B', 'AB', 'A'), weights=(80, 12, 8))[0]
+            # Número de aulas varia por aluno: a maioria perto da média, alguns com bem mais
+            person['activity'] = min(rng.lognormvariate(0, 0.6), 6)
+
+        def build_profile(user, person):
+            return StudentProfile(
+                **self._profile_fields(user, person),
+                license_categories=person['categories'],
+                status=rng.choices(('ativo', 'inativo', 'pendente'), weights=(85, 10, 5))[0],
+            )
+
+        return self._create_people('Alunos', people, 'aluno', StudentProfile, build_profile)
+
+    # ==========================
+    # Veículos
+    # ==========================
+    def _vehicles(self, instructors, amount):
+        """Um veículo por instrutor enquanto houver; os demais vão para instrutores sorteados.
+
+        Devolve {posição do instrutor: [(id do veículo, categoria)]}.
+        """
+        rng = self.rng
+        owners = list(range(min(amount, len(instructors))))
+        owners += [rng.randrange(len(instructors)) for _ in range(amount - len(owners))]
+        offset = InstructorVehicle.objects.count()  # placas e RENAVAMs novos a cada execução
+        by_owner = {}
+        started = time.perf_counter()
+        done = 0
+        for chunk in chunked(enumerate(owners, start=offset), self.chunk_size):
+            vehicles, categories = [], []
+            for index, owner in chunk:
+                person = instructors[owner]
+                moto = person['categories'] == 'A' or (person['categories'] == 'AB' and rng.random() < 0.3)
+                make, model = rng.choice(MOTORCYCLES if moto else CARS)
+                vehicles.append(InstructorVehicle(
+                    instructor_id=person['profile_id'], plate=plate_for(index), renavam=f'{index:011d}',
+                    make=make, model=model, color=rng.choice(COLORS), year=rng.randint(2012, 2025),
+                    dual_control=not moto and rng.random() < 0.7, adapted_pcd=not moto and rng.random() < 0.1,
+                ))
+                categories.append((owner, 'A' if moto else 'B'))
+            InstructorVehicle.objects.bulk_create(vehicles)
+            for vehicle, (owner, category) in zip(vehicles, categories):
+                by_owner.setdefault(owner, []).append((vehicle.pk, category))
+            done += len(vehicles)
+            self._progress('Veículos', done, amount, started)
+        return by_owner
+
+    # ==========================
+    # Aulas
+    # ==========================
+    def _lessons(self, amount, students, instructors, vehicles):
+        rng = self.rng
+        cum_weights = list(accumulate(person['activity'] for person in students))
+        for person in students:
+            person.update(lessons=0, completed=0)
+        for person in instructors:
+            person.update(lessons=0, rating_sum=0.0, ratings=0)
+
+        started = time.perf_counter()
+        done = 0
+        for chunk in chunked(range(amount), self.chunk_size):
+            picks = rng.choices(students, cum_weights=cum_weights, k=len(chunk))
+            with transaction.atomic():
+                Lesson.objects.bulk_create([self._lesson(student, instructors, vehicles) for student in picks])
+            done += len(chunk)
+            self._progress('Aulas', done, amount, started)
+
+    def _lesson(self, student, instructors, vehicles):
+        rng = self.rng
+        position = student['instructor'] if rng.random() < 0.85 else rng.randrange(len(instructors))
+        instructor = instructors[position]
+
+        if rng.random() < 0.15:
+            day = self.today + timedelta(days=rng.randint(1, 30))
+            statuses = FUTURE_STATUSES
+        else:
+            day = self.today - timedelta(days=rng.randint(0, 365))
+            statuses = PAST_STATUSES
+        status = rng.choices([s for s, _ in statuses], weights=[w for _, w in statuses])[0]
+
+        owned = vehicles.get(position)
+        vehicle_id, vehicle_type = rng.choice(owned) if owned else (None, instructor['categories'][-1])
+
+        rating = None
+        score = ''
+        if status == 'completed':
+            student['completed'] += 1
+            if rng.random() < 0.7:
+                value = min(5.0, max(1.0, round(rng.gauss(instructor['quality'], 0.6) * 2) / 2))
+                rating = Decimal(str(value))
+                instructor['rating_sum'] += value
+                instructor['ratings'] += 1
+                score = SCORES[min(3, int(5 - value))]
+        student['lessons'] += 1
+        instructor['lessons'] += 1
+
+        bairro, street, _, _ = NEIGHBORHOODS[student['bairro']]
+        return Lesson(
+            student_id=student['user_id'], instructor_id=instructor['user_id'], vehicle_id=vehicle_id,
+            vehicle_type=vehicle_type, date=day, time=rng.choice(TIME_SLOTS), status=status,
+            cep=student['cep'], rua=street, numero=student['address_number'], bairro=bairro,
+            cidade='São Paulo', estado='SP', location=f'{bairro} - {street}, {student["address_number"]}',
+            lesson_number=student['lessons'], student_rating=rating, score=score,
+        )
+
+    def _update_counters(self, students, instructors):
+        """Média de avaliações e contadores desnormalizados dos perfis, coerentes com as aulas geradas"""
+        self.stdout.write('Atualizando contadores dos perfis...')
+        InstructorProfile.objects.bulk_update([
+            InstructorProfile(
+                pk=person['profile_id'], total_lessons=person['lessons'],
+                rating=round(person['rating_sum'] / person['ratings'], 1) if person['ratings'] else 0,
+            )
+            for person in instructors
+        ], ['total_lessons', 'rating'], batch_size=self.chunk_size)
+        StudentProfile.objects.bulk_update([
+            StudentProfile(
+                pk=person['profile_id'], total_lessons=person['lessons'], completed_lessons=person['completed'],
+                progress=min(100, person['completed'] * 100 // 24),  # 20 h de aulas de 50 min
+            )
+            for person in students
+        ], ['total_lessons', 'completed_lessons', 'progress'], batch_size=self.chunk_size)
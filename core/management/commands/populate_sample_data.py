@@ -2,7 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import date, time, timedelta
 from accounts.models import User
-from lessons.models import Lesson, StudentProgress
+from lessons.models import Lesson
 
 
 class Command(BaseCommand):
@@ -127,21 +127,6 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(self.style.SUCCESS(f'Aula criada: {lesson.student.full_name} - {lesson.date}'))
         
-        # Create student progress
-        self.stdout.write('Criando progresso dos alunos...')
-        
-        skills = ['baliza', 'estacionamento', 'direcao_via', 'conversoes', 'ladeira']
-        for student in students:
-            for skill in skills:
-                progress_value = 60 + (hash(f"{student.id}{skill}") % 40)  # Random value between 60-100
-                progress, created = StudentProgress.objects.get_or_create(
-                    student=student,
-                    skill=skill,
-                    defaults={'progress': progress_value}
-                )
-                if created:
-                    self.stdout.write(f'  {student.full_name} - {skill}: {progress_value}%')
-        
         self.stdout.write(self.style.SUCCESS('\nDados de exemplo criados com sucesso!'))
         self.stdout.write('\nCredenciais de teste:')
         self.stdout.write('  Instrutor: carlos_mendes / senha123')
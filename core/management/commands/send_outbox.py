@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain_outbox, purge_outbox
+
+
+# Com --loop, a limpeza das mensagens antigas roda no início e depois a cada hora
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails da caixa de saída em lotes (use --loop para rodar como worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Mensagens por conexão SMTP')
+        parser.add_argument('--loop', action='store_true', help='Continua verificando a fila')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos entre verificações com a fila vazia')
+
+    def handle(self, *args, **options):
+        totals = [0, 0, 0]
+        next_purge = 0
+        try:
+            while True:
+                if time.monotonic() >= next_purge:
+                    purged = purge_outbox()
+                    if purged:
+                        self.stdout.write(f'{purged} mensagem(ns) antiga(s) removida(s)')
+                    next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+                result = drain_outbox(options['batch_size'])
+                totals = [total + count for total, count in zip(totals, result)]
+                if any(result):
+                    self.stdout.write('Lote: {} enviado(s), {} reagendado(s), {} descartado(s)'.format(*result))
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            'Total: {} enviado(s), {} reagendado(s), {} descartado(s)'.format(*totals)
+        ))
@@ -1,3 +1,41 @@
 from django.db import models
 
-# Create your models here.
+
+class OutgoingEmail(models.Model):
+    """Caixa de saída de emails (outbox transacional).
+
+    As views só gravam a mensagem, na mesma transação da requisição; o
+    comando `send_outbox` envia em lotes reaproveitando uma conexão SMTP,
+    com novas tentativas espaçadas e dead-letter após o limite.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pendente'),
+        ('sending', 'Enviando'),
+        ('sent', 'Enviado'),
+        ('dead', 'Falhou definitivamente'),
+    )
+
+    subject = models.CharField(max_length=255, verbose_name="Assunto")
+    body = models.TextField(verbose_name="Mensagem")
+    html_body = models.TextField(blank=True, verbose_name="Mensagem HTML")
+    from_email = models.CharField(max_length=255, verbose_name="Remetente")
+    to = models.JSONField(default=list, verbose_name="Destinatários")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(verbose_name="Próxima tentativa")
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Email na Caixa de Saída"
+        verbose_name_plural = "Emails na Caixa de Saída"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoingemail_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.get_status_display()})"
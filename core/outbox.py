@@ -0,0 +1,154 @@
+"""Outbox transacional de emails.
+
+`enqueue_email` apenas grava a mensagem (rápido, sem rede, participa da
+transação da view). `drain_outbox` é chamado pelo comando `send_outbox`:
+reserva um lote, abre uma única conexão com o backend de email para todo o
+lote e marca cada mensagem como enviada, reagendada (backoff exponencial)
+ou morta (dead-letter) após OUTBOX_MAX_ATTEMPTS tentativas.
+
+A entrega é "pelo menos uma vez": se o worker morrer entre o envio e a
+marcação, a mensagem volta para a fila quando a reserva expira.
+
+O corpo das mensagens pode conter segredos (o link de redefinição de senha
+leva um token válido): ele é apagado assim que a mensagem é enviada, e
+`purge_outbox` remove as enviadas e as mortas após OUTBOX_RETENTION_DAYS.
+"""
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, body, to, from_email=None, html_body=''):
+    """Coloca um email na caixa de saída; o envio fica a cargo do worker"""
+    if isinstance(to, str):
+        to = [to]
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        next_attempt_at=timezone.now(),
+    )
+
+
+def enqueue_emails(messages, batch_size=500):
+    """Versão em lote de enqueue_email: `messages` são dicts com subject, body e to"""
+    now = timezone.now()
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(
+            subject=message['subject'],
+            body=message['body'],
+            html_body=message.get('html_body', ''),
+            from_email=message.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            to=[message['to']] if isinstance(message['to'], str) else list(message['to']),
+            next_attempt_at=now,
+        )
+        for message in messages
+    ], batch_size=batch_size)
+
+
+def backoff(attempts):
+    """Espera até a próxima tentativa: base * 2^(n-1), com teto e jitter de até 10%"""
+    base = _setting('OUTBOX_RETRY_BASE_SECONDS', 60)
+    delay = min(base * 2 ** max(attempts - 1, 0), _setting('OUTBOX_RETRY_MAX_SECONDS', 3600))
+    return timedelta(seconds=delay * (1 + random.random() * 0.1))
+
+
+def claim_batch(size):
+    """Reserva até `size` mensagens prontas; seguro com vários workers (UPDATE condicional)"""
+    now = timezone.now()
+    expired = now - timedelta(seconds=_setting('OUTBOX_CLAIM_TIMEOUT_SECONDS', 600))
+    ready = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='sending', claimed_at__lt=expired)
+    )
+    ids = list(OutgoingEmail.objects.filter(ready).order_by('next_attempt_at').values_list('pk', flat=True)[:size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutgoingEmail.objects.filter(ready, pk__in=ids).update(status='sending', claim_token=token, claimed_at=now)
+    return list(OutgoingEmail.objects.filter(claim_token=token, status='sending'))
+
+
+def drain_outbox(batch_size=None, connection=None):
+    """Envia um lote da caixa de saída; retorna (enviados, reagendados, mortos)"""
+    batch = claim_batch(batch_size or _setting('OUTBOX_BATCH_SIZE', 50))
+    if not batch:
+        return 0, 0, 0
+
+    now = timezone.now()
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 5)
+    sent, failed = [], []
+    try:
+        # Uma conexão SMTP para o lote inteiro
+        connection = connection or get_connection(fail_silently=False)
+        connection.open()
+    except Exception as e:
+        logger.warning('Outbox: falha ao conectar no servidor de email: %s', e)
+        failed = [(email, e) for email in batch]
+    else:
+        try:
+            for email in batch:
+                message = EmailMultiAlternatives(
+                    email.subject, email.body, email.from_email, email.to, connection=connection,
+                )
+                if email.html_body:
+                    message.attach_alternative(email.html_body, 'text/html')
+                try:
+                    message.send()
+                    sent.append(email.pk)
+                except Exception as e:
+                    failed.append((email, e))
+        finally:
+            connection.close()
+
+    if sent:
+        OutgoingEmail.objects.filter(pk__in=sent).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='', claim_token='',
+            body='', html_body='',
+        )
+
+    dead = 0
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = f'{type(error).__name__}: {error}'
+        email.claim_token = ''
+        if email.attempts >= max_attempts:
+            email.status = 'dead'
+            dead += 1
+            logger.error('Outbox: email %s descartado após %s tentativas: %s', email.pk, email.attempts, error)
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + backoff(email.attempts)
+    if failed:
+        OutgoingEmail.objects.bulk_update(
+            [email for email, _ in failed],
+            ['attempts', 'last_error', 'claim_token', 'status', 'next_attempt_at'],
+        )
+    return len(sent), len(failed) - dead, dead
+
+
+def purge_outbox(days=None):
+    """Remove mensagens enviadas ou mortas há mais de `days` dias; retorna quantas"""
+    days = _setting('OUTBOX_RETENTION_DAYS', 7) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutgoingEmail.objects.filter(
+        Q(status='sent', sent_at__lt=cutoff) | Q(status='dead', next_attempt_at__lt=cutoff)
+    ).delete()
+    return deleted
@@ -0,0 +1,86 @@
+"""Serialização JSON das respostas da API.
+
+Usa orjson (fixado em requirements.txt) e cai para o `json` da biblioteca
+padrão com o DjangoJSONEncoder em ambientes sem ele. Nos dois
+caminhos Decimal (notas das aulas) vira string e datas/horas viram ISO 8601
+com UTC como "Z"; o orjson só mantém os microssegundos que o
+DjangoJSONEncoder corta. A escolha pode ser forçada com
+settings.JSON_BACKEND ('orjson' ou 'stdlib').
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def _default(value):
+    """Tipos que o orjson não serializa sozinho"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Promise):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f'Objeto do tipo {type(value).__name__} não é serializável em JSON')
+
+
+def backend():
+    name = getattr(settings, 'JSON_BACKEND', 'auto')
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        return 'orjson'
+    return 'stdlib'
+
+
+def _dumps_orjson(data):
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+def _dumps_stdlib(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps(data):
+    """Serializa `data` em bytes UTF-8 com o backend configurado"""
+    if backend() == 'orjson':
+        return _dumps_orjson(data)
+    return _dumps_stdlib(data)
+
+
+class JsonResponse(HttpResponse):
+    """Substituto direto de django.http.JsonResponse usando `dumps`.
+
+    `encoder` ou `json_dumps_params` explícitos mantêm o caminho da
+    biblioteca padrão, com o mesmo comportamento do Django.
+    """
+
+    def __init__(self, data, encoder=None, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        if encoder is None and json_dumps_params is None:
+            content = dumps(data)
+        else:
+            content = json.dumps(data, cls=encoder or DjangoJSONEncoder, **(json_dumps_params or {}))
+        super().__init__(content=content, **kwargs)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Renderer do DRF usando `dumps` (respeita ?indent só no caminho padrão do DRF)"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,85 @@
+"""Leituras em réplicas (DATABASE_REPLICAS) com leitura das próprias escritas.
+
+Só as views marcadas com `replica_reads` leem de uma réplica, e apenas em
+GET/HEAD. Escritas, migrações e qualquer leitura dentro de uma transação
+vão sempre para o banco principal.
+
+Depois de uma requisição que pode ter escrito (POST, PUT, PATCH, DELETE),
+`PrimaryPinMiddleware` fixa a sessão no principal por REPLICA_PIN_SECONDS:
+o painel recarregado logo após aceitar/recusar uma aula não depende do
+atraso de replicação.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_SESSION_KEY = '_db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Alias da réplica escolhida para a requisição atual (None = principal)
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def pin_to_primary(request):
+    request.session[PIN_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Explícito: sem isso o Django usaria o banco da instância relacionada
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def replica_reads(view):
+    """Decorator: as consultas da view (GET/HEAD) vão para uma réplica, salvo sessão fixada"""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        aliases = replicas()
+        if request.method not in ('GET', 'HEAD') or not aliases or is_pinned(request):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(random.choice(aliases))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return inner
+
+
+class PrimaryPinMiddleware:
+    """Fixa a sessão no banco principal após requisições que podem ter escrito"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and replicas() and hasattr(request, 'session'):
+            pin_to_primary(request)
+        return response
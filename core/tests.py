@@ -1,3 +1,923 @@
-from django.test import TestCase
+import importlib.util
+import io
+import itertools
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from accounts.models import InstructorProfile, InstructorVehicle, StudentProfile, User
+from accounts.password_reset_views import password_reset_request
+from lessons.models import Lesson, LessonEvent
+from . import renderers
+from autoescola.sqlite import sqlite_options
+from .models import OutgoingEmail
+from .outbox import claim_batch, drain_outbox, enqueue_email, enqueue_emails
+from .routers import PIN_SESSION_KEY, PrimaryPinMiddleware, ReplicaRouter, pin_to_primary, replica_reads
+
+
+@replica_reads
+def read_alias_view(request):
+    return HttpResponse(router.db_for_read(Lesson))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a'], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, method='get'):
+        request = getattr(self.factory, method)('/')
+        request.session = SessionStore()
+        return request
+
+    def test_reads_use_primary_outside_replica_views(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Lesson), DEFAULT_DB_ALIAS)
+
+    def test_replica_view_reads_from_replica(self):
+        self.assertEqual(read_alias_view(self.request()).content, b'replica_a')
+
+    def test_post_reads_from_primary(self):
+        self.assertEqual(read_alias_view(self.request('post')).content.decode(), DEFAULT_DB_ALIAS)
+
+    def test_pinned_session_reads_from_primary(self):
+        request = self.request()
+        pin_to_primary(request)
+        self.assertEqual(read_alias_view(request).content.decode(), DEFAULT_DB_ALIAS)
+
+    def test_middleware_pins_after_unsafe_methods(self):
+        middleware = PrimaryPinMiddleware(lambda request: HttpResponse())
+        get, post = self.request(), self.request('post')
+        middleware(get)
+        middleware(post)
+        self.assertNotIn(PIN_SESSION_KEY, get.session)
+        self.assertIn(PIN_SESSION_KEY, post.session)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_changes(self):
+        request = self.request('post')
+        PrimaryPinMiddleware(lambda request: HttpResponse())(request)
+        self.assertNotIn(PIN_SESSION_KEY, request.session)
+        self.assertEqual(read_alias_view(self.request()).content.decode(), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_migrations_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_write(Lesson), DEFAULT_DB_ALIAS)
+        self.assertFalse(ReplicaRouter().allow_migrate('replica_a', 'lessons'))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'Sem réplica configurada (DB_SIMULATE_REPLICA=True ou DB_REPLICA_HOSTS)')
+@override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ReplicaReadYourWritesTests(TransactionTestCase):
+    """Réplica simulada (espelho do banco de teste em outra conexão): leitura na réplica e fixação após POST.
+
+    TransactionTestCase: a réplica só enxerga dados commitados, como na replicação real.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self.instructor = User.objects.create_user('instrutor_replica', password='senha123', role='instrutor')
+        student = User.objects.create_user('aluno_replica', password='senha123', role='aluno')
+        self.lesson = Lesson.objects.create(student=student, instructor=self.instructor, numero='1',
+                                            date=date.today() + timedelta(days=1), time=time(9), status='pending')
+        self.client.force_login(self.instructor)
+
+    def dashboard_queries(self):
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+        with CaptureQueriesContext(replica) as on_replica:
+            self.assertEqual(self.client.get('/').status_code, 200)
+        return len(on_replica)
+
+    def test_dashboard_reads_replica_until_a_write(self):
+        self.assertGreater(self.dashboard_queries(), 0)
+
+        response = self.client.post('/api/respond-lessons/', json.dumps({'actions': [
+            {'id': self.lesson.pk, 'action': 'accept'},
+        ]}), content_type='application/json')
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(self.dashboard_queries(), 0)
+
+
+class QueryInstrumentationTests(TestCase):
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1.0, QUERY_INSTRUMENTATION_HEADER=True)
+    def test_server_timing_and_structured_log(self):
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/filter-vehicles/?instructor_id=1')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", app;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertIn('view=filter_vehicles status=200', logs.output[0])
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0.0, QUERY_INSTRUMENTATION_HEADER=True)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get('/api/filter-vehicles/?instructor_id=1')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1.0, QUERY_INSTRUMENTATION_HEADER=False)
+    def test_header_is_only_sent_to_staff_when_disabled(self):
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/filter-vehicles/?instructor_id=1')
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('view=filter_vehicles status=200', logs.output[0])
+
+        self.client.force_login(User.objects.create_user('aluno_timing', role='aluno'))
+        with self.assertLogs('core.instrumentation', 'INFO'):
+            self.assertNotIn('Server-Timing', self.client.get('/api/filter-vehicles/?instructor_id=1'))
+
+        self.client.force_login(User.objects.create_user('staff_timing', is_staff=True))
+        with self.assertLogs('core.instrumentation', 'INFO'):
+            response = self.client.get('/api/filter-vehicles/?instructor_id=1')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+_serial = itertools.count(1)
+
+
+def _profile(model, user, **fields):
+    n = next(_serial)
+    profile = model(
+        user=user, full_name=user.full_name, email=f'{user.username}@teste.com', phone='11999999999',
+        birth_date=date(1990, 1, 1), cpf=f'{n:011d}', rg=f'{n:09d}', cep='01001-000',
+        address='Rua das Flores', address_number=str(n), **fields,
+    )
+    profile.save(validate=False)
+    return profile
+
+
+def _vehicle(profile):
+    n = next(_serial)
+    return InstructorVehicle.objects.create(
+        instructor=profile, plate=f'TST{n:04d}', renavam=f'{n:011d}', model='Onix', make='GM',
+        color='Prata', year=2022,
+    )
+
+
+def seed(instructor, student, size):
+    """Cria `size` instrutores e `size` alunos com perfil e aulas em todos os status
+    com o instrutor e o aluno dos testes (tudo o que os painéis e buscas leem)"""
+    today = date.today()
+    lessons = []
+    _vehicle(instructor.instructorprofile_profile)
+    for _ in range(size):
+        n = next(_serial)
+        other_instructor = User.objects.create_user(f'instrutor_{n}', role='instrutor', full_name=f'Instrutor {n}')
+        profile = _profile(InstructorProfile, other_instructor, cnh=f'{n:09d}', cnh_emission_date=date(2010, 1, 1),
+                           credential=f'CRED{n}', gender='MF'[n % 2], vehicle_categories='AB')
+        vehicle = _vehicle(profile)
+        _vehicle(profile)
+        other_student = User.objects.create_user(f'aluno_{n}', role='aluno', full_name=f'Aluno {n}')
+        _profile(StudentProfile, other_student, gender_identity='CF')
+
+        def lesson(lesson_student, lesson_instructor, status, day=1, rating=None):
+            return Lesson(student=lesson_student, instructor=lesson_instructor, vehicle=vehicle, numero='1',
+                          date=today + timedelta(days=day), time=time(8 + n % 8), status=status,
+                          student_rating=rating)
+
+        lessons += [
+            lesson(other_student, instructor, 'pending'),
+            lesson(other_student, instructor, 'scheduled', day=0),
+            lesson(other_student, instructor, 'scheduled'),
+            lesson(other_student, instructor, 'completed', day=0, rating=5),
+            lesson(student, other_instructor, 'pending'),
+            lesson(student, other_instructor, 'scheduled'),
+            lesson(student, other_instructor, 'cancelled'),
+            lesson(student, other_instructor, 'completed', day=-1, rating=4),
+            lesson(other_student, other_instructor, 'completed', day=-1, rating=3),
+        ]
+    Lesson.objects.bulk_create(lessons)
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ViewQueryBudgetTests(TestCase):
+    """Orçamento de consultas por view, independente do volume de dados.
+
+    Cada requisição é medida, os dados crescem (seed) e ela é medida de novo:
+    o número de consultas tem de ser o mesmo nas duas e caber no orçamento.
+    Um N+1 em painel ou busca quebra estes testes. Os orçamentos incluem
+    sessão e usuário (2 consultas) nas views autenticadas.
+    """
+
+    GROWTH = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instrutor_budget', password='senha123', role='instrutor',
+                                                  full_name='Instrutor Budget')
+        cls.student = User.objects.create_user('aluno_budget', password='senha123', role='aluno',
+                                               full_name='Aluno Budget')
+        _profile(InstructorProfile, cls.instructor, cnh='000000001', cnh_emission_date=date(2010, 1, 1),
+                 credential='CRED-BUDGET', vehicle_categories='AB')
+        _profile(StudentProfile, cls.student)
+        seed(cls.instructor, cls.student, 2)
+
+    def assertQueryBudget(self, budget, request):
+        counts = []
+        for size in (0, self.GROWTH):
+            seed(self.instructor, self.student, size)
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertLess(response.status_code, 400, response.content[:300])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], f'Consultas crescem com os dados: {counts[0]} -> {counts[1]}')
+        self.assertLessEqual(counts[1], budget, '\n'.join(query['sql'] for query in queries.captured_queries))
+        return response
+
+    def test_instrutor_dashboard(self):
+        self.client.force_login(self.instructor)
+        response = self.assertQueryBudget(12, lambda: self.client.get('/'))
+        self.assertContains(response, 'Aluno')
+
+    def test_aluno_dashboard(self):
+        self.client.force_login(self.student)
+        response = self.assertQueryBudget(10, lambda: self.client.get('/aluno/'))
+        self.assertContains(response, 'Instrutor')
+
+    def test_instrutor_aula(self):
+        self.client.force_login(self.instructor)
+        self.assertQueryBudget(3, lambda: self.client.get('/aula/'))
+
+    def test_agendamento(self):
+        self.client.force_login(self.student)
+        self.assertQueryBudget(3, lambda: self.client.get('/agendamento/'))
+
+    def test_filter_instructors(self):
+        response = self.assertQueryBudget(2, lambda: self.client.get('/api/filter-instructors/?cep=01001-000'))
+        instructors = response.json()['instructors']
+        self.assertEqual(len(instructors), User.objects.filter(role='instrutor').count())
+        self.assertTrue(all(item['vehicle_id'] for item in instructors))
+        self.assertTrue(any(item['rating'] for item in instructors))
+
+    def test_filter_vehicles(self):
+        url = f'/api/filter-vehicles/?instructor_id={self.instructor.pk}'
+        response = self.assertQueryBudget(2, lambda: self.client.get(url))
+        self.assertGreater(len(response.json()['vehicles']), 1)
+
+    def test_sync(self):
+        self.client.force_login(self.student)
+        response = self.assertQueryBudget(5, lambda: self.client.get('/api/sync/'))
+        self.assertTrue(response.json()['full'])
+
+    def test_lookup_cep(self):
+        self.client.force_login(self.student)
+        with mock.patch('core.views.requests.get') as get:
+            get.return_value.json.return_value = {'logradouro': 'Praça da Sé', 'bairro': 'Sé', 'localidade': 'São Paulo', 'uf': 'SP'}
+            self.assertQueryBudget(2, lambda: self.client.get('/api/lookup-cep/?cep=01001-000'))
+
+    def test_batch(self):
+        self.client.force_login(self.student)
+        body = json.dumps({'requests': [
+            {'id': 'instrutores', 'path': '/api/filter-instructors/', 'params': {'cep': '01001-000'}},
+            {'id': 'sync', 'path': '/api/sync/'},
+        ]})
+        response = self.assertQueryBudget(
+            7, lambda: self.client.post('/api/batch/', body, content_type='application/json'),
+        )
+        self.assertTrue(all(item['status'] == 200 for item in response.json()['responses']))
+
+    def test_respond_lessons(self):
+        self.client.force_login(self.instructor)
+
+        def respond():
+            pending = Lesson.objects.filter(instructor=self.instructor, status='pending').values_list('pk', flat=True)[:2]
+            return self.client.post('/api/respond-lessons/', json.dumps({'actions': [
+                {'id': pk, 'action': 'accept'} for pk in pending
+            ]}), content_type='application/json')
+
+        self.assertQueryBudget(8, respond)
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class LoadToolsTests(TestCase):
+    """generate_load_data + benchmark_http de ponta a ponta, em volume mínimo"""
+
+    def test_generated_data_drives_every_benchmark_flow(self):
+        call_command('generate_load_data', students=20, instructors=3, vehicles=5, lessons=300, chunk_size=50,
+                     stdout=io.StringIO())
+        self.assertEqual(Lesson.objects.count(), 300)
+        self.assertTrue(Lesson.objects.filter(status='completed', student_rating__isnull=False).exists())
+        self.assertEqual(InstructorVehicle.objects.count(), 5)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('core.management.commands.benchmark_http.BASELINE_DIR', Path(directory)):
+            call_command('benchmark_http', flows=3, warmup=0, save_baseline='ci', stdout=io.StringIO())
+            report = json.loads((Path(directory) / 'ci.json').read_text(encoding='utf-8'))
+
+        endpoints = report['endpoints']
+        self.assertIn('accept_lesson', endpoints)
+        self.assertFalse({name: item['errors'] for name, item in endpoints.items() if item['errors']})
+        self.assertEqual(endpoints['filter_instructors']['queries_max'], 2)
+        # O benchmark desfaz tudo o que gravou
+        self.assertEqual(Lesson.objects.count(), 300)
+
+
+@override_settings(LESSON_EVENTS_MAX_SECONDS=0.3, LESSON_EVENTS_POLL_SECONDS=0.05, STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class LessonEventsTests(TestCase):
+    """Stream SSE sob ASGI, 204 + consulta periódica sob WSGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('aluno_eventos', password='senha123', role='aluno',
+                                               full_name='Aluno Eventos')
+        _profile(StudentProfile, cls.student)
+        cls.other = User.objects.create_user('instrutor_eventos', role='instrutor', full_name='Instrutor Eventos')
+        cls.events = [
+            LessonEvent.objects.create(user=cls.student, type=event_type, payload={'id': n})
+            for n, event_type in enumerate(('lesson.created', 'lesson.updated', 'lesson.deleted'), start=1)
+        ]
+
+    async def read_stream(self, **headers):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get('/api/lesson-events/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = [chunk.decode() if isinstance(chunk, bytes) else chunk async for chunk in response.streaming_content]
+        return ''.join(chunks)
+
+    async def test_stream_replays_events_after_last_event_id(self):
+        body = await self.read_stream(**{'Last-Event-ID': str(self.events[0].pk)})
+        self.assertIn('retry: 3000', body)
+        self.assertNotIn(f'id: {self.events[0].pk}\n', body)
+        self.assertIn(f'id: {self.events[1].pk}\nevent: lesson.updated\ndata: {{"id": 2}}\n\n', body)
+        self.assertIn(f'id: {self.events[2].pk}\nevent: lesson.deleted\n', body)
+        self.assertLess(body.index('lesson.updated'), body.index('lesson.deleted'))
+
+    async def test_stream_without_last_event_id_starts_from_now(self):
+        body = await self.read_stream()
+        self.assertNotIn('event: lesson.', body)
+
+    def test_wsgi_stream_answers_no_content(self):
+        self.client.force_login(self.student)
+        response = self.client.get('/api/lesson-events/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    def test_anonymous_is_rejected(self):
+        self.assertEqual(self.client.get('/api/lesson-events/').status_code, 401)
+        self.assertEqual(self.client.get('/api/lesson-events/poll/').status_code, 401)
+
+    def test_poll_returns_cursor_then_new_events(self):
+        self.client.force_login(self.student)
+        first = self.client.get('/api/lesson-events/poll/').json()
+        self.assertEqual(first, {'events': [], 'last_event_id': self.events[-1].pk})
+
+        event = LessonEvent.objects.create(user=self.student, type='lesson.updated', payload={'id': 9})
+        LessonEvent.objects.create(user=self.other, type='lesson.updated', payload={'id': 10})
+        data = self.client.get(f"/api/lesson-events/poll/?after={first['last_event_id']}").json()
+        self.assertEqual(data['events'], [{'id': event.pk, 'type': 'lesson.updated', 'payload': {'id': 9}}])
+        self.assertEqual(data['last_event_id'], event.pk)
+
+        data = self.client.get(f'/api/lesson-events/poll/?after={event.pk}').json()
+        self.assertEqual(data, {'events': [], 'last_event_id': event.pk})
+
+    def test_dashboard_polls_under_wsgi(self):
+        self.client.force_login(self.student)
+        response = self.client.get('/aluno/')
+        self.assertNotContains(response, 'new EventSource')
+        self.assertContains(response, '/api/lesson-events/poll/')
+        self.assertContains(response, str(settings.LESSON_EVENTS_CLIENT_POLL_SECONDS * 1000))
+
+    def test_both_dashboards_include_the_events_script(self):
+        for user, url in ((self.student, '/aluno/'), (self.other, '/')):
+            self.client.force_login(user)
+            response = self.client.get(url)
+            self.assertTemplateUsed(response, 'core/lesson_events.html')
+            self.assertContains(response, '/api/lesson-events/poll/', count=1)
+
+    async def test_dashboard_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get('/aluno/')
+        self.assertContains(response, "new EventSource('/api/lesson-events/')")
+        self.assertNotContains(response, '/api/lesson-events/poll/')
+
+
+class JsonRendererTests(SimpleTestCase):
+    """orjson e a biblioteca padrão produzem o mesmo JSON para os tipos das APIs"""
+
+    DATA = {
+        'score': Decimal('8.5'),
+        'date': date(2030, 1, 2),
+        'time': time(9, 30),
+        'updated_at': datetime(2030, 1, 2, 12, 0, tzinfo=dt_timezone.utc),
+        'status_display': gettext_lazy('Agendada'),
+        'slots': ('08:00', '09:00'),
+        1: 'chave numérica',
+    }
+
+    @skipUnless(renderers.orjson, 'orjson não instalado')
+    def test_backends_agree(self):
+        with override_settings(JSON_BACKEND='orjson'):
+            fast = renderers.dumps(self.DATA)
+        with override_settings(JSON_BACKEND='stdlib'):
+            fallback = renderers.dumps(self.DATA)
+        self.assertEqual(json.loads(fast), json.loads(fallback))
+        self.assertEqual(json.loads(fast)['updated_at'], '2030-01-02T12:00:00Z')
+
+    @skipUnless(renderers.orjson, 'orjson não instalado')
+    def test_auto_prefers_orjson(self):
+        with override_settings(JSON_BACKEND='auto'):
+            self.assertEqual(renderers.backend(), 'orjson')
+            with mock.patch.object(renderers, '_dumps_orjson', wraps=renderers._dumps_orjson) as dumps:
+                response = renderers.JsonResponse({'ok': True})
+        dumps.assert_called_once()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content), {'ok': True})
+
+    def test_stdlib_fallback_without_orjson(self):
+        with override_settings(JSON_BACKEND='auto'), mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.backend(), 'stdlib')
+            self.assertEqual(json.loads(renderers.dumps({'score': Decimal('7.0')})), {'score': '7.0'})
+
+    def test_unsafe_data_is_rejected(self):
+        with self.assertRaises(TypeError):
+            renderers.JsonResponse([1, 2])
+        self.assertEqual(json.loads(renderers.JsonResponse([1, 2], safe=False).content), [1, 2])
+
+
+class ConditionalGetTests(TestCase):
+    """ETag nas buscas: 304 sem rodar a view enquanto nada mudou"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instrutor_etag', role='instrutor', full_name='Instrutor ETag')
+        cls.profile = _profile(InstructorProfile, cls.instructor, cnh='000000002', cnh_emission_date=date(2010, 1, 1),
+                               credential='CRED-ETAG', vehicle_categories='AB')
+        cls.vehicles = [_vehicle(cls.profile), _vehicle(cls.profile)]
+
+    def setUp(self):
+        self.url = f'/api/filter-vehicles/?instructor_id={self.instructor.pk}'
+
+    def test_unchanged_vehicles_answer_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        # Só o agregado do ETag: a busca e a serialização não rodam
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_deleted_vehicle_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # Excluir não muda o maior updated_at; a contagem no ETag detecta
+        InstructorVehicle.objects.filter(pk=self.vehicles[0].pk).delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['vehicles']), 1)
+
+    def test_if_modified_since_alone_is_ignored(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_rating_changes_the_instructors_etag(self):
+        url = '/api/filter-instructors/?cep=01001-000'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        student = User.objects.create_user('aluno_etag', role='aluno')
+        Lesson.objects.create(student=student, instructor=self.instructor, numero='1', status='completed',
+                              date=date(2024, 1, 1), time=time(9), student_rating=5)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_vehicle_and_name_changes_refresh_the_instructors(self):
+        url = '/api/filter-instructors/?cep=01001-000'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response.json()['instructors'][0]['vehicle_id'], self.vehicles[-1].pk)
+
+        # O veículo mais recente vai na resposta
+        vehicle = _vehicle(self.profile)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['instructors'][0]['vehicle_id'], vehicle.pk)
+        etag = response['ETag']
+
+        vehicle.color = 'Azul'
+        vehicle.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.instructor.full_name = 'Instrutor Renomeado'
+        self.instructor.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['instructors'][0]['name'], 'Instrutor Renomeado')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_invalid_parameters_skip_caching(self):
+        response = self.client.get('/api/filter-vehicles/?instructor_id=abc')
+        self.assertNotIn('ETag', response)
+
+
+class RespondLessonsTests(TestCase):
+    """Aceite/recusa em lote pelo instrutor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instrutor_lote', role='instrutor', full_name='Instrutor Lote')
+        cls.other_instructor = User.objects.create_user('instrutor_outro', role='instrutor')
+        cls.student = User.objects.create_user('aluno_lote', role='aluno', full_name='Aluno Lote')
+
+    def setUp(self):
+        self.lessons = [
+            Lesson.objects.create(student=self.student, instructor=self.instructor, numero='1', status='pending',
+                                  date=date(2030, 1, 1) + timedelta(days=i), time=time(9))
+            for i in range(3)
+        ]
+        self.client.force_login(self.instructor)
+
+    def respond(self, actions):
+        return self.client.post('/api/respond-lessons/', json.dumps({'actions': actions}),
+                                content_type='application/json')
+
+    def test_accepts_and_rejects_in_one_call(self):
+        accept, reject, untouched = self.lessons
+        response = self.respond([{'id': accept.pk, 'action': 'accept'}, {'id': reject.pk, 'action': 'reject'}])
+        data = response.json()
+        self.assertEqual((data['accepted'], data['rejected']), (1, 1))
+        self.assertEqual([item['status'] for item in data['results']], ['scheduled', 'cancelled'])
+
+        statuses = dict(Lesson.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {accept.pk: 'scheduled', reject.pk: 'cancelled', untouched.pk: 'pending'})
+        self.assertIn('Recusada pelo instrutor', Lesson.objects.get(pk=reject.pk).notes)
+        # Eventos para o aluno e o instrutor de cada aula alterada
+        self.assertEqual(LessonEvent.objects.filter(type='lesson.updated', user=self.student).count(), 2)
+        self.assertEqual(LessonEvent.objects.filter(type='lesson.updated', user=self.instructor).count(), 2)
+
+    def test_processed_foreign_and_conflicting_lessons_fail_individually(self):
+        processed, conflicting, pending = self.lessons
+        Lesson.objects.filter(pk=processed.pk).update(status='scheduled')
+        foreign = Lesson.objects.create(student=self.student, instructor=self.other_instructor, numero='1',
+                                        status='pending', date=date(2030, 2, 1), time=time(9))
+        response = self.respond([
+            {'id': processed.pk, 'action': 'reject'},
+            {'id': foreign.pk, 'action': 'accept'},
+            {'id': conflicting.pk, 'action': 'accept'},
+            {'id': conflicting.pk, 'action': 'reject'},
+            {'id': pending.pk, 'action': 'accept'},
+        ])
+        results = {item['id']: item for item in response.json()['results']}
+        self.assertEqual(results[pending.pk]['status'], 'scheduled')
+        self.assertFalse(results[processed.pk]['success'])
+        self.assertFalse(results[foreign.pk]['success'])
+        self.assertEqual(results[conflicting.pk]['error'], 'Ações conflitantes para a mesma aula')
+        self.assertEqual(Lesson.objects.get(pk=foreign.pk).status, 'pending')
+        self.assertEqual(Lesson.objects.get(pk=conflicting.pk).status, 'pending')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/respond-lessons/').status_code, 405)
+        self.assertEqual(self.respond([]).status_code, 400)
+        self.assertEqual(self.respond([{'id': 'x', 'action': 'accept'}]).status_code, 400)
+        self.assertEqual(self.respond([{'id': self.lessons[0].pk, 'action': 'maybe'}]).status_code, 400)
+        with mock.patch('core.views.RESPOND_LESSONS_MAX', 2):
+            self.assertEqual(self.respond([{'id': n, 'action': 'accept'} for n in range(3)]).status_code, 400)
+        self.assertFalse(Lesson.objects.exclude(status='pending').exists())
+
+    def test_only_instructors(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.respond([{'id': self.lessons[0].pk, 'action': 'accept'}]).status_code, 403)
+
+
+class BatchApiTests(TestCase):
+    """/api/batch/: sub-requisições em ordem, com referências e erros por item"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('aluno_batch', role='aluno', full_name='Aluno Batch')
+        cls.instructor = User.objects.create_user('instrutor_batch', role='instrutor', full_name='Instrutor Batch')
+        profile = _profile(InstructorProfile, cls.instructor, cnh='000000003', cnh_emission_date=date(2010, 1, 1),
+                           credential='CRED-BATCH', vehicle_categories='AB')
+        _vehicle(profile)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def batch(self, *requests):
+        return self.client.post('/api/batch/', json.dumps({'requests': list(requests)}),
+                                content_type='application/json')
+
+    def test_references_feed_later_requests(self):
+        viacep = {'logradouro': 'Praça da Sé', 'bairro': 'Sé', 'localidade': 'São Paulo', 'uf': 'SP'}
+        with mock.patch('core.views.requests.get') as get:
+            get.return_value.json.return_value = viacep
+            response = self.batch(
+                {'id': 'cep', 'path': '/api/lookup-cep/', 'params': {'cep': '01001-000'}},
+                {'id': 'instrutores', 'path': '/api/filter-instructors/',
+                 'params': {'bairro': '$cep.bairro', 'cep': '$cep.cep'}},
+                {'id': 'veiculos', 'path': '/api/filter-vehicles/', 'params': {'instructor_id': self.instructor.pk}},
+            )
+        responses = response.json()['responses']
+        self.assertEqual([item['id'] for item in responses], ['cep', 'instrutores', 'veiculos'])
+        self.assertEqual([item['status'] for item in responses], [200, 200, 200])
+        self.assertEqual(responses[0]['body']['bairro'], 'Sé')
+        self.assertEqual(len(responses[2]['body']['vehicles']), 1)
+
+    def test_failed_dependency_is_not_run(self):
+        responses = self.batch(
+            {'id': 'cep', 'path': '/api/lookup-cep/', 'params': {'cep': '1'}},
+            {'id': 'instrutores', 'path': '/api/filter-instructors/', 'params': {'bairro': '$cep.bairro'}},
+        ).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [400, 424])
+
+    def test_only_listed_read_only_views(self):
+        responses = self.batch(
+            {'id': 'escrita', 'path': '/api/respond-lessons/'},
+            {'id': 'nada', 'path': '/api/nao-existe/'},
+        ).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [403, 404])
+
+    def test_subrequests_keep_the_user(self):
+        self.client.logout()
+        responses = self.batch({'id': 'sync', 'path': '/api/sync/'}).json()['responses']
+        self.assertEqual(responses[0]['status'], 302)
+
+        self.client.force_login(self.student)
+        responses = self.batch({'id': 'sync', 'path': '/api/sync/'}).json()['responses']
+        self.assertEqual(responses[0]['status'], 200)
+        self.assertTrue(responses[0]['body']['full'])
+
+    def test_invalid_bodies(self):
+        self.assertEqual(self.client.post('/api/batch/', 'x', content_type='application/json').status_code, 400)
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch({'id': 'a', 'path': '/api/sync/'}, {'id': 'a', 'path': '/api/sync/'}).status_code, 400)
+        self.assertEqual(self.batch({'path': '/api/sync/', 'params': {'x': '$depois.id'}}).status_code, 400)
+        with override_settings(BATCH_MAX_REQUESTS=1):
+            self.assertEqual(self.batch({'path': '/api/sync/'}, {'path': '/api/sync/'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/batch/').status_code, 405)
+
+
+class SqliteProfileTests(SimpleTestCase):
+    """Perfis de conexão do SQLite (autoescola/sqlite.py)"""
+
+    databases = {'default'}
+
+    def test_tuned_profile(self):
+        options = sqlite_options('tuned')
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        for pragma in ('PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL', 'PRAGMA busy_timeout=5000'):
+            self.assertIn(pragma, options['init_command'])
+
+    def test_overrides_replace_profile_values(self):
+        options = sqlite_options('tuned', busy_timeout='250')
+        self.assertIn('PRAGMA busy_timeout=250', options['init_command'])
+        self.assertNotIn('busy_timeout=5000', options['init_command'])
+        self.assertEqual(sqlite_options('tuned', busy_timeout=None), sqlite_options('tuned'))
+
+    def test_read_only_connections_skip_write_pragmas(self):
+        options = sqlite_options('tuned', read_only=True)
+        self.assertNotIn('journal_mode', options['init_command'])
+        self.assertNotIn('synchronous', options['init_command'])
+        self.assertIn('busy_timeout', options['init_command'])
+        self.assertNotIn('transaction_mode', options)
+
+    def test_default_profile_keeps_django_behaviour(self):
+        self.assertEqual(sqlite_options('default'), {})
+        with self.assertRaises(ValueError):
+            sqlite_options('rapido')
+
+    @skipUnless(connection.vendor == 'sqlite' and getattr(settings, 'SQLITE_PROFILE', None) == 'tuned',
+                'só com o perfil tuned do SQLite')
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_benchmark_compares_both_profiles(self):
+        output = io.StringIO()
+        call_command('benchmark_sqlite', writers=1, readers=1, seconds=0.2, rows=20, stdout=output)
+        report = output.getvalue()
+        self.assertRegex(report, r'default .* escritas/s')
+        self.assertRegex(report, r"tuned .* 0 'database is locked'")
+
+
+def load_settings(**env):
+    """Executa autoescola/settings.py de novo com as variáveis de ambiente informadas"""
+    spec = importlib.util.spec_from_file_location(
+        'autoescola.settings_under_test', Path(settings.BASE_DIR) / 'autoescola' / 'settings.py',
+    )
+    module = importlib.util.module_from_spec(spec)
+    names = ('DB_ENGINE', 'DB_POOL', 'DB_CONN_MAX_AGE', 'DB_REPLICA_HOSTS', 'DB_SIMULATE_REPLICA')
+    clean = {name: value for name, value in os.environ.items() if name not in names}
+    with mock.patch.dict(os.environ, {**clean, **env}, clear=True):
+        spec.loader.exec_module(module)
+    return module
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """DATABASES montado a partir do ambiente (DB_ENGINE, DB_POOL, réplicas)"""
+
+    def test_postgres_with_pool(self):
+        module = load_settings(DB_ENGINE='postgres', DB_NAME='escola', DB_HOST='db.interno', DB_PORT='6432',
+                               DB_POOL_MAX_SIZE='20', DB_TEST_NAME='test_escola')
+        default = module.DATABASES['default']
+        self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((default['NAME'], default['HOST'], default['PORT']), ('escola', 'db.interno', 6432))
+        self.assertEqual(default['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10})
+        # O pool e CONN_MAX_AGE são exclusivos
+        self.assertEqual(default['CONN_MAX_AGE'], 0)
+        self.assertTrue(default['CONN_HEALTH_CHECKS'])
+        self.assertEqual(default['TEST']['NAME'], 'test_escola')
+        self.assertEqual(module.DATABASE_REPLICAS, [])
+
+    def test_postgres_persistent_connections_without_pool(self):
+        module = load_settings(DB_ENGINE='postgres', DB_POOL='False', DB_CONN_MAX_AGE='120')
+        default = module.DATABASES['default']
+        self.assertNotIn('pool', default['OPTIONS'])
+        self.assertEqual(default['CONN_MAX_AGE'], 120)
+
+    def test_postgres_replicas_share_credentials(self):
+        module = load_settings(DB_ENGINE='postgres', DB_USER='app', DB_REPLICA_HOSTS='r1.interno,r2.interno')
+        self.assertEqual(module.DATABASE_REPLICAS, ['replica1', 'replica2'])
+        replica = module.DATABASES['replica2']
+        self.assertEqual((replica['HOST'], replica['USER']), ('r2.interno', 'app'))
+        self.assertEqual(replica['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(module.DATABASES['default']['HOST'], 'localhost')
+
+    def test_sqlite_by_default(self):
+        module = load_settings()
+        self.assertEqual(module.DATABASES['default']['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(module.DATABASES['default']['OPTIONS'], sqlite_options(module.SQLITE_PROFILE))
+        self.assertEqual(module.DATABASE_REPLICAS, [])
+
+
+class SyncPagingTests(TestCase):
+    """/api/sync/ paginado: termina sempre e não perde o que muda entre as páginas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('aluno_sync', role='aluno', full_name='Aluno Sync')
+        cls.instructor = User.objects.create_user('instrutor_sync', role='instrutor', full_name='Instrutor Sync')
+        _profile(StudentProfile, cls.student)
+
+    def setUp(self):
+        self.lessons = [
+            Lesson.objects.create(student=self.student, instructor=self.instructor, numero='1', status='scheduled',
+                                  date=date(2030, 1, 1) + timedelta(days=i), time=time(9))
+            for i in range(5)
+        ]
+        self.client.force_login(self.student)
+
+    def pages(self, params, on_page=None):
+        pages = []
+        while True:
+            data = self.client.get('/api/sync/', params).json()
+            pages.append(data)
+            if on_page:
+                on_page(len(pages))
+            if not data['has_more']:
+                return pages
+            self.assertLess(len(pages), 10, 'A paginação não termina')
+            params = {**data['next'], 'limit': params['limit']}
+
+    def test_full_sync_of_old_lessons_pages_to_the_end(self):
+        # Tudo mais antigo que a retenção: o cursor das páginas seguintes também é
+        Lesson.objects.update(updated_at=timezone.now() - timedelta(days=30))
+        pages = self.pages({'limit': 2})
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(all(page['full'] for page in pages))
+        ids = [lesson['id'] for page in pages for lesson in page['lessons']]
+        self.assertEqual(sorted(ids), sorted(lesson.pk for lesson in self.lessons))
+
+    @override_settings(SYNC_CLOCK_SKEW_SECONDS=0)  # sem a margem, só a janela da página 1 cobre as alterações
+    def test_changes_during_paging_reach_the_next_sync(self):
+        cursor = (timezone.now() - timedelta(minutes=1)).isoformat()
+        removed = Lesson.objects.create(student=self.student, instructor=self.instructor, numero='1',
+                                        status='pending', date=date(2030, 2, 1), time=time(9))
+
+        def change_after_first_page(number):
+            if number == 1:
+                # Depois da página 1, que já levou os tombstones e o perfil
+                Lesson.objects.get(pk=removed.pk).delete()
+                profile = self.student.get_profile()
+                profile.cep = '20040-020'
+                profile.save(update_fields=['cep'], validate=False)
+
+        pages = self.pages({'updated_since': cursor, 'limit': 2}, on_page=change_after_first_page)
+        self.assertFalse(any(page['full'] for page in pages))
+        self.assertNotIn(removed.pk, pages[0]['deleted_lessons'])
+
+        data = self.client.get('/api/sync/', {'updated_since': pages[-1]['next']['updated_since']}).json()
+        self.assertIn(removed.pk, data['deleted_lessons'])
+        self.assertEqual(data['profile']['cep'], '20040-020')
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('servidor recusou')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', OUTBOX_MAX_ATTEMPTS=2, STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class OutboxTests(TestCase):
+    def test_enqueue_sends_nothing_until_drained(self):
+        enqueue_email('Redefinição de senha', 'token=segredo', 'ana@teste.com', html_body='<p>token=segredo</p>')
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(drain_outbox(), (1, 0, 0))
+        self.assertEqual(mail.outbox[0].to, ['ana@teste.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>token=segredo</p>')
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), ('sent', 1))
+        # O corpo (com o token) não fica guardado depois do envio
+        self.assertEqual((email.body, email.html_body), ('', ''))
+        self.assertEqual(drain_outbox(), (0, 0, 0))
+
+    def test_one_connection_per_batch(self):
+        enqueue_emails([{'subject': f'Aviso {i}', 'body': '...', 'to': f'aluno{i}@teste.com'} for i in range(5)])
+        with mock.patch('core.outbox.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(drain_outbox(batch_size=3), (3, 0, 0))
+            self.assertEqual(drain_outbox(batch_size=3), (2, 0, 0))
+        self.assertEqual(connect.call_count, 2)
+
+    def test_failures_back_off_then_go_dead(self):
+        email = enqueue_email('Aviso', '...', 'ana@teste.com')
+        failing = FailingBackend()
+        self.assertEqual(drain_outbox(connection=failing), (0, 1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertIn('servidor recusou', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Ainda não chegou a hora da nova tentativa
+        self.assertEqual(drain_outbox(connection=failing), (0, 0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs('core.outbox', 'ERROR'):
+            self.assertEqual(drain_outbox(connection=failing), (0, 0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'dead')
+        self.assertEqual(email.body, '...')
+
+    def test_claims_are_exclusive_until_they_expire(self):
+        enqueue_emails([{'subject': 'Aviso', 'body': '...', 'to': f'aluno{i}@teste.com'} for i in range(3)])
+        first = claim_batch(2)
+        second = claim_batch(2)
+        self.assertEqual(len(first), 2)
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        self.assertEqual(claim_batch(2), [])
+
+        # Worker que morreu no meio do lote: a reserva expira e outro retoma
+        OutgoingEmail.objects.filter(pk=first[0].pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([email.pk for email in claim_batch(2)], [first[0].pk])
+
+    def test_purge_removes_old_sent_and_dead_messages(self):
+        old = timezone.now() - timedelta(days=30)
+        for status in ('sent', 'dead', 'pending'):
+            enqueue_email(status, '...', 'ana@teste.com')
+        OutgoingEmail.objects.update(sent_at=old, next_attempt_at=old)
+        OutgoingEmail.objects.filter(subject='pending').update(sent_at=None)
+        for status in ('sent', 'dead'):
+            OutgoingEmail.objects.filter(subject=status).update(status=status)
+        enqueue_email('recente', '...', 'ana@teste.com')
+        OutgoingEmail.objects.filter(subject='recente').update(status='sent', sent_at=timezone.now())
+
+        call_command('send_outbox', stdout=io.StringIO())
+        self.assertEqual(sorted(OutgoingEmail.objects.values_list('subject', flat=True)), ['pending', 'recente'])
+
+    def test_password_reset_goes_through_the_outbox(self):
+        User.objects.create_user('reset', email='reset@teste.com', password='senha123')
+        request = RequestFactory().post('/auth/password-reset/', json.dumps({'email': 'reset@teste.com'}),
+                                        content_type='application/json')
+        with override_settings(RATELIMIT_ENABLED=False):
+            self.assertTrue(json.loads(password_reset_request(request).content)['success'])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutgoingEmail.objects.filter(to=['reset@teste.com']).count(), 1)
+
+    def test_admin_hides_message_bodies(self):
+        enqueue_email('Redefinição de senha', 'token=segredo', 'ana@teste.com')
+        admin_user = User.objects.create_superuser('admin', 'admin@teste.com', 'senha123')
+        self.client.force_login(admin_user)
+        response = self.client.get(f'/admin/core/outgoingemail/{OutgoingEmail.objects.get().pk}/change/')
+        self.assertContains(response, 'Redefinição de senha')
+        self.assertNotContains(response, 'token=segredo')
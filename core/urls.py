@@ -12,8 +12,13 @@ urlpatterns = [
     path('api/submit-lesson-rating/', views.submit_lesson_rating, name='submit_lesson_rating'),
     path('api/accept-lesson/<int:lesson_id>/', views.accept_lesson, name='accept_lesson'),
     path('api/reject-lesson/<int:lesson_id>/', views.reject_lesson, name='reject_lesson'),
+    path('api/respond-lessons/', views.respond_lessons, name='respond_lessons'),
     path('api/reschedule-lesson/<int:lesson_id>/', views.reschedule_lesson, name='reschedule_lesson'),
     path('api/cancel-rejected-lesson/<int:lesson_id>/', views.cancel_rejected_lesson, name='cancel_rejected_lesson'),
     path('api/cancel-lesson/<int:lesson_id>/', views.cancel_lesson, name='cancel_lesson'),
     path('api/instructor-cancel-lesson/<int:lesson_id>/', views.instructor_cancel_lesson, name='instructor_cancel_lesson'),
+    path('api/lesson-events/', views.lesson_events, name='lesson_events'),
+    path('api/lesson-events/poll/', views.lesson_events_poll, name='lesson_events_poll'),
+    path('api/sync/', views.sync, name='sync'),
+    path('api/batch/', views.batch, name='batch'),
 ]
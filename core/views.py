@@ -1,14 +1,21 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q, Avg, Value
+from django.db.models import Count, Q, Avg, Max, OuterRef, Subquery, Value
 from django.db.models.functions import Replace, Coalesce
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from .conditional import conditional_get, make_etag, queryset_state
+from .renderers import JsonResponse
+from .routers import replica_reads
 from datetime import date, timedelta
 from lessons.models import Lesson
+from lessons.events import event_stream, events_after, latest_event_id, streaming_supported
+from accounts.ratelimit import ratelimit, client_ip
 import requests
 
 
 @login_required
+@replica_reads
 def instrutor_dashboard(request):
     """Instructor dashboard view"""
     if request.user.role != 'instrutor':
@@ -45,13 +52,13 @@ def instrutor_dashboard(request):
         instructor=request.user,
         date__gte=today,
         status__in=['scheduled', 'in-progress']
-    ).select_related('student').order_by('date', 'time')[:3]
+    ).select_related('student__studentprofile_profile').order_by('date', 'time')[:3]
     
     # Get pending lessons (awaiting instructor confirmation)
     pending_lessons = Lesson.objects.filter(
         instructor=request.user,
         status='pending'
-    ).select_related('student').order_by('date', 'time')[:10]
+    ).select_related('student__studentprofile_profile').order_by('date', 'time')[:10]
     
     # Get recent rated lessons (with feedback from students)
     recent_ratings = Lesson.objects.filter(
@@ -77,6 +84,7 @@ def instrutor_dashboard(request):
         'recent_ratings': recent_ratings,
         'vehicles': vehicles,
         'selected_vehicle': selected_vehicle,
+        **lesson_events_context(request),
     }
     
     return render(request, 'core/instrutor.html', context)
@@ -99,6 +107,7 @@ def instrutor_aula(request):
 
 
 @login_required
+@replica_reads
 def aluno_dashboard(request):
     """Student dashboard view"""
     if request.user.role == 'instrutor':
@@ -108,7 +117,7 @@ def aluno_dashboard(request):
     completed_lessons = Lesson.objects.filter(
         student=request.user,
         status='completed'
-    ).order_by('-date')[:4]
+    ).select_related('instructor__instructorprofile_profile').order_by('-date')[:4]
     
     upcoming_lessons = Lesson.objects.filter(
         student=request.user,
@@ -120,13 +129,13 @@ def aluno_dashboard(request):
     rejected_lessons = Lesson.objects.filter(
         student=request.user,
         status='cancelled'
-    ).order_by('-updated_at')[:5]
+    ).select_related('instructor').order_by('-updated_at')[:5]
     
     # Get pending lessons (awaiting instructor confirmation)
     pending_lessons = Lesson.objects.filter(
         student=request.user,
         status='pending'
-    ).order_by('-created_at')[:3]
+    ).select_related('instructor').order_by('-created_at')[:3]
     
     # Calculate progress
     total_hours = completed_lessons.count() * 50 // 60  # Convert to hours
@@ -155,6 +164,7 @@ def aluno_dashboard(request):
         'required_hours': required_hours,
         'progress_percentage': min(100, (total_hours / required_hours) * 100),
         'instructors': instructors,
+        **lesson_events_context(request),
     }
     
     return render(request, 'core/aluno.html', context)
@@ -233,8 +243,8 @@ def lookup_cep(request):
         return JsonResponse({'error': f'Erro ao buscar CEP: {str(e)}'}, status=500)
 
 
-def filter_instructors(request):
-    """API endpoint para filtrar instrutores por bairro/logradouro (ou CEP opcional), gênero e categoria de veículo"""
+def _instructors_queryset(request):
+    """Instrutores que atendem aos filtros da busca; None se faltar bairro, logradouro e CEP"""
     from accounts.models import User
 
     bairro = request.GET.get('bairro', '').strip()
@@ -247,7 +257,7 @@ def filter_instructors(request):
     cep_prefix = cep_digits[:5] if len(cep_digits) >= 5 else ''
 
     if not bairro and not rua and not cep_prefix:
-        return JsonResponse({'error': 'Informe bairro, logradouro ou CEP.'}, status=400)
+        return None
 
     # Filtra instrutores ativos
     instructors_base = User.objects.filter(
@@ -281,17 +291,58 @@ def filter_instructors(request):
 
     if address_filters:
         instructors_base = instructors_base.filter(address_filters)
+    return instructors_base
+
+
+def _instructors_state(request):
+    """ETag da busca em uma consulta: instrutores encontrados (nome), perfis,
+    veículos (o mais recente vai na resposta) e avaliações das suas aulas"""
+    instructors = _instructors_queryset(request)
+    if instructors is None:
+        return None
+    rated = Q(instructor_lessons__student_rating__isnull=False)
+    vehicles = 'instructorprofile_profile__vehicles'
+    # Os JOINs com aulas e veículos multiplicam as linhas: contagens com distinct
+    state = instructors.order_by().aggregate(
+        count=Count('pk', distinct=True),
+        users_modified=Max('updated_at'),
+        profiles_modified=Max('instructorprofile_profile__updated_at'),
+        vehicles=Count(vehicles, distinct=True),
+        last_vehicle=Max(f'{vehicles}__id'),
+        vehicles_modified=Max(f'{vehicles}__updated_at'),
+        ratings=Count('instructor_lessons', filter=rated, distinct=True),
+        ratings_modified=Max('instructor_lessons__updated_at', filter=rated),
+    )
+    last_modified = max(
+        (value for key, value in state.items() if key.endswith('_modified') and value is not None), default=None,
+    )
+    return make_etag(request.get_full_path(), *state.values()), last_modified
+
+
+@replica_reads
+@conditional_get(_instructors_state)
+def filter_instructors(request):
+    """API endpoint para filtrar instrutores por bairro/logradouro (ou CEP opcional), gênero e categoria de veículo"""
+    from accounts.models import InstructorVehicle
+
+    instructors = _instructors_queryset(request)
+    if instructors is None:
+        return JsonResponse({'error': 'Informe bairro, logradouro ou CEP.'}, status=400)
+
+    # Avaliação média e veículo mais recente na mesma consulta (sem uma consulta por instrutor)
+    latest_vehicle = InstructorVehicle.objects.filter(
+        instructor__user=OuterRef('pk')
+    ).order_by('-id').values('id')[:1]
+    instructors = instructors.annotate(
+        avg_rating=Avg('instructor_lessons__student_rating'),
+        vehicle_id=Subquery(latest_vehicle),
+    )
 
-    instructors = instructors_base
-    
     # Serializa resultados
     result = []
     for instructor in instructors[:20]:  # Máximo 20 instrutores
         profile = instructor.instructorprofile_profile
-        # Calcula avaliação média a partir das aulas completadas
-        avg_rating = instructor.instructor_lessons.filter(
-            student_rating__isnull=False
-        ).aggregate(Avg('student_rating'))['student_rating__avg']
+        avg_rating = instructor.avg_rating
         
         result.append({
             'id': instructor.id,
@@ -301,13 +352,25 @@ def filter_instructors(request):
             'gender_identity': profile.gender_identity,
             'gender_identity_label': profile.get_gender_identity_display() if profile.gender_identity else None,
             'rating': round(avg_rating, 1) if avg_rating else None,
-            'vehicle_id': profile.vehicle.id if profile.vehicle else None,
+            'vehicle_id': instructor.vehicle_id,
         })
     
     return JsonResponse({'instructors': result})
 
 
+def _vehicles_state(request):
+    from accounts.models import InstructorVehicle
+
+    instructor_id = request.GET.get('instructor_id')
+    if not instructor_id or not instructor_id.isdigit():
+        return None
+    # Índice (instructor, updated_at): contagem e máximo sem ler as linhas
+    parts, last_modified = queryset_state(InstructorVehicle.objects.filter(instructor__user_id=instructor_id))
+    return make_etag(request.get_full_path(), *parts), last_modified
 
+
+@replica_reads
+@conditional_get(_vehicles_state)
 def filter_vehicles(request):
     """API endpoint para filtrar veículos por instrutor e preferências"""
     from accounts.models import InstructorVehicle
@@ -597,5 +660,252 @@ def reject_lesson(request, lesson_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+LESSON_RESPONSES = {
+    'accept': 'scheduled',
+    'reject': 'cancelled',
+}
+RESPOND_LESSONS_MAX = 200
+
 
+@login_required
+def respond_lessons(request):
+    """Aceita/recusa várias solicitações de uma vez.
+
+    Corpo: {"actions": [{"id": 12, "action": "accept"}, {"id": 13, "action": "reject"}]}.
+    Tudo em uma transação, com um UPDATE condicional (status='pending') por
+    ação; a resposta traz o resultado de cada id.
+    """
+    import json
+    from django.db import transaction
+    from django.utils import timezone
+    from lessons.models import LessonEvent
+
+    if request.user.role != 'instrutor':
+        return JsonResponse({'error': 'Apenas instrutores podem responder aulas'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
 
+    try:
+        actions = json.loads(request.body).get('actions')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(actions, list) or not actions:
+        return JsonResponse({'error': 'Informe a lista "actions"'}, status=400)
+    if len(actions) > RESPOND_LESSONS_MAX:
+        return JsonResponse({'error': f'Máximo de {RESPOND_LESSONS_MAX} aulas por requisição'}, status=400)
+
+    results = {}
+    requested = {}
+    for item in actions:
+        lesson_id = item.get('id') if isinstance(item, dict) else None
+        action = item.get('action') if isinstance(item, dict) else None
+        if not isinstance(lesson_id, int) or action not in LESSON_RESPONSES:
+            return JsonResponse({'error': 'Cada item precisa de "id" numérico e "action" accept/reject'}, status=400)
+        if requested.setdefault(lesson_id, action) != action:
+            results[lesson_id] = {'id': lesson_id, 'success': False, 'error': 'Ações conflitantes para a mesma aula'}
+
+    now = timezone.now()
+    notes = f"Recusada pelo instrutor em {date.today().strftime('%d/%m/%Y')}"
+    with transaction.atomic():
+        # Trava as pendentes do instrutor; o UPDATE abaixo repete a condição
+        pending = {
+            lesson.pk: lesson for lesson in Lesson.objects.select_for_update().filter(
+                id__in=[pk for pk in requested if pk not in results], instructor=request.user, status='pending',
+            )
+        }
+        changed = []
+        for action, status in LESSON_RESPONSES.items():
+            ids = [pk for pk in pending if requested[pk] == action]
+            if not ids:
+                continue
+            fields = {'status': status, 'updated_at': now}
+            if action == 'reject':
+                fields['notes'] = notes
+            Lesson.objects.filter(id__in=ids, instructor=request.user, status='pending').update(**fields)
+            for pk in ids:
+                lesson = pending[pk]
+                for field, value in fields.items():
+                    setattr(lesson, field, value)
+                changed.append(lesson)
+                results[pk] = {'id': pk, 'success': True, 'action': action, 'status': status}
+        # update() não passa por Lesson.save: publica os eventos em lote
+        LessonEvent.publish_many(changed, 'lesson.updated')
+
+    for pk in requested:
+        results.setdefault(pk, {'id': pk, 'success': False, 'error': 'Aula não encontrada ou já foi processada'})
+    return JsonResponse({
+        'success': True,
+        'accepted': sum(1 for r in results.values() if r.get('action') == 'accept'),
+        'rejected': sum(1 for r in results.values() if r.get('action') == 'reject'),
+        'results': [results[pk] for pk in requested],
+    })
+
+
+@ratelimit('batch', rate='60/m', key=client_ip, methods=('POST',))
+def batch(request):
+    """Várias consultas GET em uma chamada (ver core.batch).
+
+    Corpo: {"requests": [{"id": "cep", "path": "/api/lookup-cep/", "params": {"cep": "01001-000"}},
+    {"id": "instrutores", "path": "/api/filter-instructors/", "params": {"bairro": "$cep.bairro"}}]}
+    """
+    from .batch import BatchError, parse_batch, run_batch
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+    try:
+        responses = run_batch(request, parse_batch(request.body))
+    except BatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'responses': responses})
+
+
+def lesson_events_context(request):
+    """Como os dashboards recebem os eventos: stream SSE sob ASGI, consulta periódica sob WSGI"""
+    return {
+        'lesson_events_stream': streaming_supported(request),
+        'lesson_events_poll_ms': settings.LESSON_EVENTS_CLIENT_POLL_SECONDS * 1000,
+    }
+
+
+async def lesson_events(request):
+    """Stream SSE com as alterações das aulas do usuário logado (requer ASGI)"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Não autenticado'}, status=401)
+    if not streaming_supported(request):
+        # Sob WSGI o stream ficaria em buffer e prenderia um worker; 204 faz o
+        # EventSource desistir de reconectar (o cliente usa lesson_events_poll)
+        return HttpResponse(status=204)
+
+    # O navegador reenvia Last-Event-ID ao reconectar; nada se perde entre conexões
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or ''
+    last_id = int(last_id) if last_id.isdigit() else None
+
+    response = StreamingHttpResponse(event_stream(user.pk, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx não deve bufferizar o stream
+    return response
+
+
+def lesson_events_poll(request):
+    """Alternativa ao stream para WSGI: eventos após `after` (sem `after`, só o id atual)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Não autenticado'}, status=401)
+
+    after = request.GET.get('after', '')
+    if not after.isdigit():
+        return JsonResponse({'events': [], 'last_event_id': latest_event_id(request.user.pk)})
+
+    last_id = int(after)
+    events = []
+    for event_id, event_type, payload in events_after(request.user.pk, last_id):
+        last_id = event_id
+        events.append({'id': event_id, 'type': event_type, 'payload': payload})
+    return JsonResponse({'events': events, 'last_event_id': last_id})
+
+
+SYNC_LESSON_FIELDS = (
+    'id', 'student_id', 'student__full_name', 'instructor_id', 'instructor__full_name',
+    'date', 'time', 'duration', 'status', 'cep', 'rua', 'numero', 'bairro', 'cidade', 'estado',
+    'location', 'vehicle_type', 'vehicle_id', 'score', 'notes', 'lesson_number',
+    'student_rating', 'student_feedback', 'updated_at',
+)
+SYNC_VEHICLE_FIELDS = (
+    'id', 'plate', 'make', 'model', 'color', 'year', 'dual_control', 'adapted_pcd', 'updated_at',
+)
+SYNC_PROFILE_FIELDS = (
+    'full_name', 'email', 'phone', 'birth_date', 'cep', 'address', 'address_number',
+    'address_complement', 'status', 'updated_at',
+)
+
+
+def _parse_sync_cursor(value):
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    if not value:
+        return None
+    parsed = parse_datetime(value.replace(' ', '+'))  # '+' do offset chega como espaço na query string
+    if parsed is None:
+        raise ValueError(value)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+@login_required
+def sync(request):
+    """Sincronização incremental para o SPA/app: só o que mudou desde `updated_since`.
+
+    Sem `updated_since` (ou com cursor mais antigo que a retenção dos
+    tombstones) a resposta é completa (`full: true`) e o cliente substitui
+    seus dados locais. Aulas vêm paginadas por (updated_at, id); enquanto
+    `has_more` for verdadeiro, repita a chamada com os parâmetros de `next`.
+    Eles levam o modo (`full`) e o início da sincronização (`started_at`) da
+    primeira página: a retenção só é verificada nela, e o `updated_since`
+    final parte desse início, para que nada alterado durante a paginação
+    (aulas excluídas, veículos, perfil) fique de fora da próxima chamada.
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from accounts.models import InstructorVehicle
+    from lessons.models import LessonEvent
+
+    user = request.user
+    now = timezone.now()
+    try:
+        since = _parse_sync_cursor(request.GET.get('updated_since'))
+        after_id = int(request.GET.get('after_id') or 0)
+        limit = min(int(request.GET.get('limit') or 500), 500)
+        started_at = (_parse_sync_cursor(request.GET.get('started_at')) if after_id else None) or now
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
+
+    if after_id:
+        # Página seguinte: `since` é a posição na paginação, não a última sincronização
+        full = request.GET.get('full', '').lower() in ('true', '1')
+    else:
+        retention = timedelta(days=getattr(settings, 'LESSON_EVENTS_RETENTION_DAYS', 7))
+        full = since is None or since < now - retention
+        if full:
+            since = None
+
+    lessons = Lesson.objects.filter(Q(student=user) | Q(instructor=user))
+    if since is not None:
+        lessons = lessons.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=after_id))
+    lessons = list(lessons.order_by('updated_at', 'id').values(*SYNC_LESSON_FIELDS)[:limit + 1])
+    has_more = len(lessons) > limit
+    lessons = lessons[:limit]
+
+    response = {'full': full, 'lessons': lessons, 'has_more': has_more}
+
+    # Só a primeira página leva tombstones, veículos e perfil
+    if not after_id:
+        if full:
+            response['deleted_lessons'] = []
+        else:
+            response['deleted_lessons'] = list(
+                LessonEvent.objects.filter(user=user, type='lesson.deleted', created_at__gt=since)
+                .values_list('payload__id', flat=True)
+            )
+
+        vehicles = InstructorVehicle.objects.filter(instructor__user=user)
+        if since is not None:
+            vehicles = vehicles.filter(updated_at__gt=since)
+        response['vehicles'] = list(vehicles.order_by('id').values(*SYNC_VEHICLE_FIELDS))
+
+        profile = user.get_profile()
+        response['profile'] = (
+            {field: getattr(profile, field) for field in SYNC_PROFILE_FIELDS}
+            if profile and (since is None or profile.updated_at > since) else None
+        )
+
+    if has_more:
+        last = lessons[-1]
+        response['next'] = {
+            'updated_since': last['updated_at'].isoformat(), 'after_id': last['id'],
+            'full': full, 'started_at': started_at.isoformat(),
+        }
+    else:
+        # Margem para transações que gravaram updated_at antes de commitar
+        skew = timedelta(seconds=getattr(settings, 'SYNC_CLOCK_SKEW_SECONDS', 5))
+        response['next'] = {'updated_since': (started_at - skew).isoformat()}
+    return JsonResponse(response)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Lesson
+from .models import Lesson, LessonReminder
 
 
 @admin.register(Lesson)
@@ -8,3 +8,10 @@ class LessonAdmin(admin.ModelAdmin):
     list_filter = ['status', 'vehicle_type', 'date']
     search_fields = ['student__full_name', 'instructor__full_name', 'location']
     date_hierarchy = 'date'
+
+
+@admin.register(LessonReminder)
+class LessonReminderAdmin(admin.ModelAdmin):
+    list_display = ['lesson', 'kind', 'lesson_date', 'lesson_time', 'created_at']
+    list_filter = ['kind']
+    raw_id_fields = ['lesson']
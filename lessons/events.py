@@ -0,0 +1,105 @@
+"""Eventos de aula em tempo real (Server-Sent Events).
+
+O stream roda como view assíncrona sob ASGI (`autoescola/asgi.py`, por
+exemplo `uvicorn autoescola.asgi:application`): cada conexão aberta é só
+uma corrotina esperando, sem ocupar um worker. Sob WSGI (gunicorn sync,
+runserver) a resposta ficaria em buffer e cada aba prenderia um worker, então
+o stream responde 204 e os dashboards consultam `lesson_events_poll` a cada
+LESSON_EVENTS_CLIENT_POLL_SECONDS.
+
+Os eventos ficam em LessonEvent. Quando uma aula muda neste processo, o
+`broker` acorda na hora os streams do aluno e do instrutor; alterações
+feitas por outros processos são encontradas pela consulta periódica
+(LESSON_EVENTS_POLL_SECONDS), que usa o índice (user, id).
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from .models import LessonEvent
+
+
+class EventBroker:
+    """Pub/sub em memória do processo: acorda os streams de um usuário"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = defaultdict(set)
+
+    def subscribe(self, user_id):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters[user_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, user_id, waiter):
+        with self._lock:
+            self._waiters[user_id].discard(waiter)
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+
+    def notify(self, user_ids):
+        """Pode ser chamado de qualquer thread (ex.: on_commit de uma view síncrona)"""
+        with self._lock:
+            waiters = [waiter for user_id in user_ids for waiter in self._waiters.get(user_id, ())]
+        for loop, event in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+
+
+broker = EventBroker()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def streaming_supported(request):
+    """True quando a requisição chegou por ASGI, o único modo em que o stream não prende um worker"""
+    return isinstance(request, ASGIRequest)
+
+
+def latest_event_id(user_id):
+    return LessonEvent.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def events_after(user_id, last_id, limit=100):
+    return list(
+        LessonEvent.objects.filter(user_id=user_id, id__gt=last_id)
+        .order_by('id').values_list('id', 'type', 'payload')[:limit]
+    )
+
+
+def format_event(event_id, event_type, payload):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n'
+
+
+async def event_stream(user_id, last_id=None):
+    """Gera o stream SSE; encerra após LESSON_EVENTS_MAX_SECONDS (o navegador reconecta)"""
+    poll = _setting('LESSON_EVENTS_POLL_SECONDS', 5)
+    deadline = time.monotonic() + _setting('LESSON_EVENTS_MAX_SECONDS', 300)
+    waiter = broker.subscribe(user_id)
+    wakeup = waiter[1]
+    try:
+        if last_id is None:
+            last_id = await sync_to_async(latest_event_id)(user_id)
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            # Limpa antes de consultar: um aviso chegando durante a consulta não se perde
+            wakeup.clear()
+            for event_id, event_type, payload in await sync_to_async(events_after)(user_id, last_id):
+                last_id = event_id
+                yield format_event(event_id, event_type, payload)
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=poll)
+            except asyncio.TimeoutError:
+                # Comentário SSE mantém a conexão viva em proxies
+                yield ': ping\n\n'
+    finally:
+        broker.unsubscribe(user_id, waiter)
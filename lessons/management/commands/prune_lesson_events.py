@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lessons.models import LessonEvent
+
+
+class Command(BaseCommand):
+    help = 'Remove eventos de aula antigos (já entregues ou expirados) do log do stream SSE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'LESSON_EVENTS_RETENTION_DAYS', 7))
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = LessonEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f'{deleted} evento(s) removido(s)')
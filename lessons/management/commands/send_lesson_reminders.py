@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lessons.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Enfileira lembretes por email para aulas que começam nas próximas N horas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, action='append',
+                            help='Antecedência em horas; repita para vários lembretes (padrão: 24)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Roda continuamente (processo agendador)')
+        parser.add_argument('--interval', type=float, default=300, help='Segundos entre execuções com --loop')
+
+    def handle(self, *args, **options):
+        windows = options['hours'] or [24]
+        try:
+            while True:
+                for hours in windows:
+                    count = send_reminders(hours, options['batch_size'])
+                    self.stdout.write(f'Lembretes de {hours}h: {count} enfileirado(s)')
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_alter_lesson_instructor_alter_lesson_vehicle_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(help_text='Antecedência do lembrete, ex.: 24h', max_length=10)),
+                ('lesson_date', models.DateField()),
+                ('lesson_time', models.TimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lembrete de Aula',
+                'verbose_name_plural': 'Lembretes de Aula',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['date', 'time'], name='lesson_start_idx'),
+        ),
+        migrations.AddField(
+            model_name='lessonreminder',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='lessons.lesson'),
+        ),
+        migrations.AddConstraint(
+            model_name='lessonreminder',
+            constraint=models.UniqueConstraint(fields=('lesson', 'kind', 'lesson_date', 'lesson_time'), name='unique_lesson_reminder'),
+        ),
+    ]
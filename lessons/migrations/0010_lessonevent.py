@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_lesson_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('lesson.created', 'Aula criada'), ('lesson.updated', 'Aula atualizada'), ('lesson.deleted', 'Aula excluída')], max_length=20)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de Aula',
+                'verbose_name_plural': 'Eventos de Aula',
+                'indexes': [models.Index(fields=['user', 'id'], name='lessonevent_user_idx')],
+            },
+        ),
+    ]
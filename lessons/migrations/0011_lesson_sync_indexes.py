@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_instructorvehicle_updated_at'),
+        ('lessons', '0010_lessonevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student', 'updated_at'], name='lesson_student_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['instructor', 'updated_at'], name='lesson_instructor_updated_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
 
@@ -86,6 +86,117 @@ class Lesson(models.Model):
         ordering = ['-date', '-time']
         verbose_name = 'Aula'
         verbose_name_plural = 'Aulas'
+        indexes = [
+            # Consultas por janela de horário (lembretes, agenda do dia)
+            models.Index(fields=['date', 'time'], name='lesson_start_idx'),
+            # Sincronização incremental (updated_since) por participante
+            models.Index(fields=['student', 'updated_at'], name='lesson_student_updated_idx'),
+            models.Index(fields=['instructor', 'updated_at'], name='lesson_instructor_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Aula {self.lesson_number} - {self.student.full_name} com {self.instructor.full_name} em {self.date}"
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Evento gravado junto com a alteração; só é notificado após o commit
+            LessonEvent.publish(self, 'lesson.created' if adding else 'lesson.updated')
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            LessonEvent.publish(self, 'lesson.deleted')
+            return super().delete(*args, **kwargs)
+
+
+
+class LessonReminder(models.Model):
+    """Lembrete já enviado para uma aula.
+
+    A data/hora da aula fazem parte da chave: se a aula for remarcada, um
+    novo lembrete é enviado para o novo horário.
+    """
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=10, help_text="Antecedência do lembrete, ex.: 24h")
+    lesson_date = models.DateField()
+    lesson_time = models.TimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Lembrete de Aula'
+        verbose_name_plural = 'Lembretes de Aula'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lesson', 'kind', 'lesson_date', 'lesson_time'],
+                name='unique_lesson_reminder',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Lembrete {self.kind} da aula {self.lesson_id}"
+
+
+
+class LessonEvent(models.Model):
+    """Log de alterações de aulas por usuário, lido pelo stream SSE.
+
+    Cada alteração gera um evento para o aluno e outro para o instrutor. O id
+    crescente é o `id` do evento SSE, o que permite retomar a conexão com
+    Last-Event-ID e entregar eventos gravados por outros processos. Os
+    eventos `lesson.deleted` também servem de tombstones para /api/sync/.
+    """
+    TYPE_CHOICES = (
+        ('lesson.created', 'Aula criada'),
+        ('lesson.updated', 'Aula atualizada'),
+        ('lesson.deleted', 'Aula excluída'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lesson_events')
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Evento de Aula'
+        verbose_name_plural = 'Eventos de Aula'
+        indexes = [
+            models.Index(fields=['user', 'id'], name='lessonevent_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.payload.get('id')}) para {self.user_id}"
+
+    @staticmethod
+    def payload_for(lesson):
+        return {
+            'id': lesson.pk,
+            'status': lesson.status,
+            'status_display': lesson.get_status_display(),
+            'date': str(lesson.date),
+            'time': str(lesson.time)[:5],
+            'student_id': lesson.student_id,
+            'instructor_id': lesson.instructor_id,
+            'notes': lesson.notes,
+        }
+
+    @classmethod
+    def publish(cls, lesson, event_type):
+        """Grava o evento para os participantes e avisa os streams deste processo"""
+        cls.publish_many([lesson], event_type)
+
+    @classmethod
+    def publish_many(cls, lessons, event_type, exclude_user_id=None):
+        """Versão em lote de publish (um INSERT), usada também em exclusões em massa"""
+        from .events import broker
+
+        events = []
+        for lesson in lessons:
+            payload = cls.payload_for(lesson)
+            for user_id in {lesson.student_id, lesson.instructor_id} - {None, exclude_user_id}:
+                events.append(cls(user_id=user_id, type=event_type, payload=payload))
+        if not events:
+            return
+        cls.objects.bulk_create(events)
+        user_ids = {event.user_id for event in events}
+        transaction.on_commit(lambda: broker.notify(user_ids))
@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LessonCursorPagination(CursorPagination):
+    """Paginação por cursor: custo constante em qualquer página, sem COUNT(*)"""
+    ordering = ('-date', '-time', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,104 @@
+"""Lembretes de aula.
+
+As aulas guardam data e hora separadas, no horário local. A janela
+[agora, agora + N horas] vira uma consulta por faixa no índice
+(date, time), sem varrer a tabela. Aulas já lembradas são excluídas na
+própria consulta (NOT EXISTS em LessonReminder). Lembretes e emails são
+gravados juntos, em lote, na caixa de saída (core.outbox).
+
+Duas execuções sobrepostas do agendador podem selecionar as mesmas aulas:
+o lote trava as aulas, grava ignorando conflitos na chave única e só
+enfileira email para os lembretes que esta execução realmente inseriu.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.outbox import enqueue_emails
+from .models import Lesson, LessonReminder
+
+
+REMINDER_STATUSES = ('scheduled', 'rescheduled')
+
+
+def window_filter(start, end):
+    """Q para aulas com início em [start, end) usando as colunas date/time"""
+    if start.date() == end.date():
+        return Q(date=start.date(), time__gte=start.time(), time__lt=end.time())
+    return (
+        Q(date=start.date(), time__gte=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), time__lt=end.time())
+    )
+
+
+def due_lessons(hours, kind, now=None):
+    now = timezone.localtime(now).replace(tzinfo=None)
+    already_sent = LessonReminder.objects.filter(
+        lesson=OuterRef('pk'), kind=kind,
+        lesson_date=OuterRef('date'), lesson_time=OuterRef('time'),
+    )
+    return (
+        Lesson.objects
+        .filter(window_filter(now, now + timedelta(hours=hours)), status__in=REMINDER_STATUSES)
+        .exclude(Exists(already_sent))
+        .select_related('student', 'instructor')
+    )
+
+
+def reminder_email(lesson):
+    student = lesson.student
+    instructor = lesson.instructor
+    address = ', '.join(part for part in (lesson.rua, lesson.numero, lesson.bairro, lesson.cidade) if part)
+    body = f"""
+Olá {student.full_name or student.username},
+
+Lembrete da sua aula de direção:
+
+Data: {lesson.date:%d/%m/%Y} às {lesson.time:%H:%M}
+Instrutor: {(instructor.full_name or instructor.username) if instructor else 'a definir'}
+Local: {address or lesson.location or 'a combinar com o instrutor'}
+
+Se não puder comparecer, cancele ou remarque pelo sistema com antecedência.
+
+Atenciosamente,
+Equipe AutoEscola
+    """
+    return {'subject': 'Lembrete de Aula - AutoEscola', 'body': body, 'to': student.email}
+
+
+def _reminder_keys(lesson_ids, kind):
+    return set(
+        LessonReminder.objects.filter(lesson_id__in=lesson_ids, kind=kind)
+        .values_list('lesson_id', 'lesson_date', 'lesson_time')
+    )
+
+
+def send_reminders(hours=24, batch_size=500, now=None):
+    """Enfileira lembretes das aulas nas próximas `hours` horas; retorna quantos"""
+    kind = f'{hours}h'
+    queryset = due_lessons(hours, kind, now).order_by('pk')
+    total = 0
+    last_pk = 0
+    while True:
+        # Paginação por chave: cada lote continua do último id processado
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return total
+        last_pk = batch[-1].pk
+        lesson_ids = [lesson.pk for lesson in batch]
+        with transaction.atomic():
+            # Uma execução simultânea espera aqui e depois enxerga os lembretes desta
+            list(Lesson.objects.select_for_update().filter(pk__in=lesson_ids).values_list('pk', flat=True))
+            existing = _reminder_keys(lesson_ids, kind)
+            LessonReminder.objects.bulk_create([
+                LessonReminder(lesson=lesson, kind=kind, lesson_date=lesson.date, lesson_time=lesson.time)
+                for lesson in batch
+            ], ignore_conflicts=True)
+            # ignore_conflicts não informa o que entrou: relê a chave antes de enfileirar
+            inserted = _reminder_keys(lesson_ids, kind) - existing
+            sent = [lesson for lesson in batch if (lesson.pk, lesson.date, lesson.time) in inserted]
+            enqueue_emails([reminder_email(lesson) for lesson in sent if lesson.student.email])
+        total += len(sent)
@@ -3,6 +3,19 @@ from .models import Lesson
 from accounts.models import InstructorVehicle
 
 
+class SparseFieldsMixin:
+    """Permite `?fields=id,date,status` para devolver só os campos pedidos"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            allowed = {name.strip() for name in requested.split(',') if name.strip()}
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
+
+
 class InstructorVehicleSerializer(serializers.ModelSerializer):
     """Serializer para veículos do instrutor"""
     class Meta:
@@ -13,9 +26,9 @@ class InstructorVehicleSerializer(serializers.ModelSerializer):
         ]
 
 
-class LessonSerializer(serializers.ModelSerializer):
-    """Serializer para aulas"""
-    instructor_name = serializers.CharField(source='instructor.full_name', read_only=True)
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer para aulas (use com select_related em student, instructor e vehicle)"""
+    instructor_name = serializers.CharField(source='instructor.full_name', read_only=True, default=None)
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     vehicle_info = InstructorVehicleSerializer(source='vehicle', read_only=True)
     
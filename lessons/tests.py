@@ -1,3 +1,213 @@
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User, InstructorProfile, InstructorVehicle
+from core.models import OutgoingEmail
+from .models import Lesson, LessonReminder
+from .reminders import send_reminders
+
+
+class LessonApiQueryCountTests(TestCase):
+    """O número de consultas da API não pode crescer com o número de aulas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('aluno_api', email='aluno@api.com', password='senha123',
+                                               role='aluno', full_name='Aluno API')
+        cls.instructor = User.objects.create_user('instrutor_api', email='instrutor@api.com', password='senha123',
+                                                  role='instrutor', full_name='Instrutor API')
+        cls.employee = User.objects.create_user('func_api', email='func@api.com', password='senha123',
+                                                role='funcionario')
+        profile = InstructorProfile(
+            user=cls.instructor, full_name='Instrutor API', email='instrutor@api.com', phone='11999999999',
+            birth_date=date(1980, 1, 1), cpf='529.982.247-25', rg='123456789', cep='01001-000',
+            address='Rua A', address_number='1', cnh='123456789', cnh_emission_date=date(2000, 1, 1),
+            credential='CRED1',
+        )
+        profile.save(validate=False)
+        vehicle = InstructorVehicle.objects.create(
+            instructor=profile, plate='ABC1D23', renavam='12345678901', model='Onix', make='GM',
+            color='Prata', year=2022,
+        )
+        Lesson.objects.bulk_create([
+            Lesson(student=cls.student, instructor=cls.instructor, vehicle=vehicle, numero='1',
+                   date=date(2030, 1, 1) + timedelta(days=i), time=time(8 + i % 8),
+                   status='scheduled' if i % 2 else 'pending')
+            for i in range(30)
+        ])
+        cls.lesson = Lesson.objects.first()
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    # Sessão + usuário + agregado do ETag + a consulta da página (com os JOINs)
+    EXPECTED_QUERIES = 4
+
+    def test_list_student(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/lessons/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 30)
+        self.assertEqual(response.json()['results'][0]['vehicle_info']['plate'], 'ABC1D23')
+
+    def test_list_instructor(self):
+        self.client.force_login(self.instructor)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/lessons/')
+        self.assertEqual(len(response.json()['results']), 30)
+
+    def test_list_employee_sees_all(self):
+        self.client.force_login(self.employee)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/lessons/')
+        self.assertEqual(len(response.json()['results']), 30)
+
+    def test_list_cursor_next_page(self):
+        first = self.client.get('/api/lessons/?page_size=10').json()
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 10)
+        self.assertFalse({l['id'] for l in first['results']} & {l['id'] for l in second['results']})
+
+    def test_list_filters(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/lessons/?status=scheduled&date_from=2030-01-05&date_to=2030-01-20')
+        results = response.json()['results']
+        self.assertTrue(results)
+        self.assertTrue(all(l['status'] == 'scheduled' and '2030-01-05' <= l['date'] <= '2030-01-20' for l in results))
+
+    def test_list_invalid_filter(self):
+        response = self.client.get('/api/lessons/?date_from=ontem')
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_sparse_fields(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/lessons/?fields=id,status')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status'})
+
+    def test_retrieve(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(f'/api/lessons/{self.lesson.pk}/')
+        self.assertEqual(response.json()['instructor_name'], 'Instrutor API')
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/lessons/?status=scheduled')['ETag']
+        # Sem a consulta da página nem serialização: só sessão, usuário e agregado
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/lessons/?status=scheduled', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Lesson.objects.filter(status='scheduled').first().delete()
+        response = self.client.get('/api/lessons/?status=scheduled', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_related_changes_invalidate_the_etag(self):
+        etag = self.client.get('/api/lessons/')['ETag']
+
+        self.instructor.full_name = 'Instrutor Renomeado'
+        self.instructor.save()
+        response = self.client.get('/api/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['instructor_name'], 'Instrutor Renomeado')
+        etag = response['ETag']
+
+        vehicle = InstructorVehicle.objects.get()
+        vehicle.color = 'Azul'
+        vehicle.save()
+        response = self.client.get('/api/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['vehicle_info']['color'], 'Azul')
+        etag = response['ETag']
+
+        # SET_NULL apaga o vínculo sem tocar no updated_at das aulas
+        vehicle.delete()
+        response = self.client.get('/api/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['results'][0]['vehicle_info'])
+
+    def test_other_users_lessons_are_hidden(self):
+        other = User.objects.create_user('outro_api', password='senha123', role='aluno')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.lesson.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/lessons/').json()['results'], [])
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/lessons/').status_code, 403)
+
+
+class LessonReminderTests(TestCase):
+    NOW = datetime(2030, 3, 10, 20, 0)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('aluno_lembrete', email='aluno@lembrete.com', role='aluno',
+                                               full_name='Aluno Lembrete')
+        cls.instructor = User.objects.create_user('instrutor_lembrete', role='instrutor', full_name='Instrutor')
+
+    def lesson(self, day, hour, status='scheduled', student=None):
+        return Lesson.objects.create(student=student or self.student, instructor=self.instructor, numero='1',
+                                     date=date(2030, 3, day), time=time(hour), status=status)
+
+    def send(self, hours=24, now=None):
+        return send_reminders(hours, now=timezone.make_aware(now or self.NOW))
+
+    def test_only_lessons_inside_the_window(self):
+        tonight = self.lesson(10, 21)
+        tomorrow = self.lesson(11, 19)
+        self.lesson(10, 19)                       # já começou
+        self.lesson(11, 20)                       # fora das 24h
+        self.lesson(11, 9, status='cancelled')
+        self.lesson(11, 10, status='pending')
+        self.assertEqual(self.send(), 2)
+        self.assertEqual(set(LessonReminder.objects.values_list('lesson_id', flat=True)), {tonight.pk, tomorrow.pk})
+        self.assertEqual(OutgoingEmail.objects.filter(to=['aluno@lembrete.com']).count(), 2)
+
+    def test_second_run_sends_nothing(self):
+        self.lesson(11, 9)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(self.send(now=self.NOW + timedelta(minutes=5)), 0)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_rescheduled_lesson_is_reminded_again(self):
+        lesson = self.lesson(11, 9)
+        self.send()
+        lesson.date, lesson.time, lesson.status = date(2030, 3, 11), time(15), 'rescheduled'
+        lesson.save()
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(lesson.reminders.count(), 2)
+
+    def test_each_advance_is_tracked_separately(self):
+        self.lesson(10, 21)
+        self.assertEqual(self.send(hours=2), 1)
+        self.assertEqual(self.send(hours=24), 1)
+        self.assertEqual(self.send(hours=2), 0)
+
+    def test_students_without_email_are_marked_without_email(self):
+        student = User.objects.create_user('sem_email', role='aluno')
+        self.lesson(11, 9, student=student)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(OutgoingEmail.objects.count(), 0)
+
+    def test_batches(self):
+        for hour in (8, 9, 10, 11, 13):
+            self.lesson(11, hour)
+        self.assertEqual(send_reminders(24, batch_size=2, now=timezone.make_aware(self.NOW)), 5)
+        self.assertEqual(LessonReminder.objects.count(), 5)
 
-# Create your tests here.
+    def test_overlapping_run_skips_reminders_already_inserted(self):
+        taken = self.lesson(11, 9)
+        free = self.lesson(11, 10)
+        # A outra execução gravou o lembrete depois que esta já tinha selecionado a aula
+        LessonReminder.objects.create(lesson=taken, kind='24h', lesson_date=taken.date, lesson_time=taken.time)
+        selected = Lesson.objects.filter(pk__in=[taken.pk, free.pk]).select_related('student', 'instructor')
+        with mock.patch('lessons.reminders.due_lessons', return_value=selected):
+            self.assertEqual(self.send(), 1)
+        self.assertEqual(taken.reminders.count(), 1)
+        self.assertEqual(free.reminders.count(), 1)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
@@ -1,3 +1,70 @@
-from django.shortcuts import render
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 
-# Create your views here.
+from core.conditional import make_etag, not_modified, queryset_state, set_conditional_headers
+from .models import Lesson
+from .serializers import LessonSerializer
+
+
+class LessonViewSet(viewsets.ReadOnlyModelViewSet):
+    """Aulas do usuário logado (aluno e instrutor veem as suas; funcionário vê todas).
+
+    Filtros: ?status=pending,scheduled  ?date_from=AAAA-MM-DD  ?date_to=AAAA-MM-DD
+    ?vehicle_type=A|B  ?instructor=<id>  ?student=<id>. Campos: ?fields=id,date,...
+    As alterações continuam pelos endpoints de aceitar/recusar/cancelar em core.
+
+    Respostas levam ETag; com If-None-Match igual a resposta é 304, decidida
+    por uma consulta agregada antes de buscar e serializar as aulas.
+    """
+    serializer_class = LessonSerializer
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(self.filter_queryset(self.get_queryset()), super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not str(kwargs.get('pk', '')).isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        queryset = self.get_queryset().filter(pk=kwargs.get('pk'))
+        return self._conditional(queryset, super().retrieve, *args, **kwargs)
+
+    def _conditional(self, queryset, action, *args, **kwargs):
+        # Nomes e veículo também vão no corpo: a validade deles entra no ETag
+        parts, last_modified = queryset_state(queryset, related=('student', 'instructor', 'vehicle'))
+        etag = make_etag(self.request.user.pk, self.request.get_full_path(), *parts)
+        response = not_modified(self.request, etag)
+        if response is not None:
+            return response
+        return set_conditional_headers(action(self.request, *args, **kwargs), etag, last_modified)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Lesson.objects.select_related('student', 'instructor', 'vehicle')
+        if user.role == 'aluno':
+            queryset = queryset.filter(student=user)
+        elif user.role == 'instrutor':
+            queryset = queryset.filter(instructor=user)
+        elif not (user.role == 'funcionario' or user.is_staff):
+            return queryset.none()
+        return self.filter_queryset_params(queryset)
+
+    def filter_queryset_params(self, queryset):
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status__in=params['status'].split(','))
+        try:
+            if params.get('date_from'):
+                queryset = queryset.filter(date__gte=params['date_from'])
+            if params.get('date_to'):
+                queryset = queryset.filter(date__lte=params['date_to'])
+        except DjangoValidationError:
+            raise ValidationError({'date': 'Use o formato AAAA-MM-DD.'})
+        if params.get('vehicle_type'):
+            queryset = queryset.filter(vehicle_type=params['vehicle_type'])
+        for field in ('instructor', 'student'):
+            value = params.get(field)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({field: 'Informe o id numérico.'})
+                queryset = queryset.filter(**{f'{field}_id': value})
+        return queryset